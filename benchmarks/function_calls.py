@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Function Call Benchmark
+Times the recursive `fibonacci` from example_programs/08_fibonacci.witcher
+at a larger n on every engine and reports calls/second.
+Usage: python3 benchmarks/function_calls.py [--n N] [--repeat R] [--engine ENGINE] [--memo]
+
+Memoization is off unless --memo is given, so every call really runs.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from witcher_interpreter import (
+    ENGINES, FunctionCall, FunctionDef, Number, Parser, create_interpreter, create_lexer,
+)
+
+EXAMPLE = os.path.join(ROOT, 'example_programs', '08_fibonacci.witcher')
+
+def load_definitions():
+    """Parse the example and keep only its function definitions"""
+    with open(EXAMPLE, 'r') as f:
+        ast = Parser(create_lexer(f.read()).tokenize()).parse()
+    return [node for node in ast if isinstance(node, FunctionDef)]
+
+def call_count(n: int) -> int:
+    """Number of fibonacci() calls made to compute fibonacci(n)"""
+    a, b = 1, 1  # calls for n = 0 and n = 1
+    for _ in range(n - 1):
+        a, b = b, a + b + 1
+    return b if n > 0 else a
+
+def measure(engine: str, n: int, repeat: int, memo: bool) -> float:
+    """Return the best seconds over `repeat` runs of fibonacci(n)"""
+    definitions = load_definitions()
+    best = float('inf')
+    for _ in range(repeat):
+        interpreter = create_interpreter(engine)
+        if not memo:
+            interpreter.memo.size = 0
+        interpreter.interpret(definitions)
+        call = FunctionCall('fibonacci', [Number(float(n))])
+        start = time.perf_counter()
+        interpreter.interpret([call])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--n', type=int, default=22, help='fibonacci argument')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per engine; the best is kept')
+    parser.add_argument('--engine', choices=ENGINES, action='append',
+                        help='engine to time (repeatable; default: all)')
+    parser.add_argument('--memo', action='store_true', help='keep memoization of pure functions on')
+    args = parser.parse_args()
+
+    calls = call_count(args.n)
+    print(f"fibonacci({args.n}): {calls} calls")
+
+    for engine in args.engine or ENGINES:
+        seconds = measure(engine, args.n, args.repeat, args.memo)
+        print(f"{engine:>7}: {seconds * 1000:.1f} ms ({calls / seconds:,.0f} calls/s)")
+
+if __name__ == "__main__":
+    main()
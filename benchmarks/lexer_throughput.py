@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Lexer Throughput Benchmark
+Compares tokens/second of the character lexer and the regex lexer.
+Usage: python3 benchmarks/lexer_throughput.py [--copies N] [--repeat R]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from witcher_interpreter import LEXERS, create_lexer
+
+def load_corpus(copies: int) -> str:
+    """Concatenate every shipped .witcher file, repeated to form a large grimoire"""
+    paths = sorted(glob.glob(os.path.join(ROOT, 'example_programs', '*.witcher')))
+    paths += sorted(glob.glob(os.path.join(ROOT, 'lib', '*.witcher')))
+    chunks = []
+    for path in paths:
+        with open(path, 'r') as f:
+            chunks.append(f.read())
+    return '\n'.join(chunks * copies)
+
+def measure(source: str, mode: str, repeat: int):
+    """Return (token count, best seconds) over `repeat` runs"""
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = len(create_lexer(source, mode).tokenize())
+        best = min(best, time.perf_counter() - start)
+    return count, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--copies', type=int, default=20, help='times the corpus is repeated')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per lexer; the best is kept')
+    args = parser.parse_args()
+
+    source = load_corpus(args.copies)
+    print(f"Corpus: {source.count(chr(10)) + 1} lines, {len(source)} characters")
+
+    results = {}
+    for mode in LEXERS:
+        count, seconds = measure(source, mode, args.repeat)
+        results[mode] = seconds
+        print(f"{mode:>6}: {count} tokens in {seconds * 1000:.1f} ms "
+              f"({count / seconds:,.0f} tokens/s)")
+
+    print(f"Speedup (regex vs char): {results['char'] / results['regex']:.1f}x")
+
+if __name__ == "__main__":
+    main()
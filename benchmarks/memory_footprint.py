@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Memory Footprint Benchmark
+Reports bytes per token and per AST node for a large generated script.
+Usage: python3 benchmarks/memory_footprint.py [--functions N]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from witcher_interpreter import ASTNode, Lexer, Parser
+
+FUNCTION_TEMPLATE = '''
+aard hunt_{i}(level, bestiary) {{
+    contract reward = level * 10 + {i}
+    igni level > 5 and reward != 0 {{
+        yrden monster -> bestiary {{
+            medallion("Hunting " + monster + " for " + reward)
+        }}
+    }} elixir {{
+        reward = -reward % 7
+    }}
+    quen level < 10 {{
+        bestiary[0] = bestiary[1]
+        level = level + 1
+    }}
+    hunt [reward, "{i}", truth]
+}}
+'''
+
+def generate_script(functions: int) -> str:
+    return ''.join(FUNCTION_TEMPLATE.format(i=i) for i in range(functions))
+
+def count_nodes(node) -> int:
+    """Count AST nodes reachable from `node` (a node or a list of nodes)"""
+    if isinstance(node, list):
+        return sum(count_nodes(item) for item in node)
+    if not isinstance(node, ASTNode):
+        return 0
+    names = set(getattr(node, '__dict__', {}))
+    for cls in type(node).__mro__:
+        names.update(getattr(cls, '__slots__', ()))
+    return 1 + sum(count_nodes(getattr(node, name, None)) for name in names)
+
+def measure(build):
+    """Return (result, bytes still allocated by building it)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--functions', type=int, default=2000, help='functions in the generated script')
+    args = parser.parse_args()
+
+    source = generate_script(args.functions)
+    print(f"Script: {source.count(chr(10)) + 1} lines, {len(source)} characters")
+
+    tokens, token_bytes = measure(lambda: Lexer(source).tokenize())
+    print(f"Tokens: {len(tokens)} using {token_bytes / 1024:.0f} KiB "
+          f"({token_bytes / len(tokens):.1f} bytes/token)")
+
+    ast, ast_bytes = measure(lambda: Parser(tokens).parse())
+    nodes = count_nodes(ast)
+    print(f"AST:    {nodes} nodes using {ast_bytes / 1024:.0f} KiB "
+          f"({ast_bytes / nodes:.1f} bytes/node)")
+    del tokens, ast
+
+    # What a cached program costs once the token list is gone
+    _, program_bytes = measure(lambda: Parser(Lexer(source).tokenize()).parse())
+    print(f"Parsed program retained: {program_bytes / 1024:.0f} KiB "
+          f"({program_bytes / nodes:.1f} bytes/node)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Times lexing, parsing and interpretation separately over the example
+programs and synthetic workloads, and saves the results as JSON so that
+a later run can be compared against them.
+Usage: python3 benchmarks/suite.py run [--output FILE] [--scale S] [--repeat R]
+                                       [--engine ENGINE] [--filter TEXT]
+       python3 benchmarks/suite.py compare BASELINE RESULTS [--threshold PERCENT]
+
+Each measurement is the best of `repeat` runs. Memoization is off so
+recursive workloads really recurse. `compare` exits with status 1 when
+any benchmark is slower than the baseline by more than the threshold,
+so it can gate an upgrade.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from witcher_interpreter import ENGINES, Parser, create_interpreter, create_lexer, grimoire_registry
+from witcher_output import MemorySink
+
+RESULTS_VERSION = 1
+
+# Synthetic workloads; {n} is scaled by --scale
+
+FIBONACCI = '''
+aard fibonacci(n) {
+    igni n <= 1 {
+        hunt n
+    }
+    hunt fibonacci(n - 1) + fibonacci(n - 2)
+}
+medallion(fibonacci({n}))
+'''
+
+# Fills `arr` with {n} pseudo-random numbers
+RANDOM_BESTIARY = '''
+contract arr = []
+contract seed = 7
+contract k = 0
+quen k < {n} {
+    seed = (seed * 1103 + 12345) % 65536
+    add_to_bestiary(arr, seed)
+    k = k + 1
+}
+'''
+
+BUBBLE_SORT = RANDOM_BESTIARY + '''
+contract i = 0
+quen i < k {
+    contract j = 0
+    quen j < k - i - 1 {
+        igni arr[j] > arr[j + 1] {
+            contract temp = arr[j]
+            arr[j] = arr[j + 1]
+            arr[j + 1] = temp
+        }
+        j = j + 1
+    }
+    i = i + 1
+}
+medallion(arr[0], arr[k - 1])
+'''
+
+QUICKSORT = RANDOM_BESTIARY + '''
+aard quicksort(arr, low, high) {
+    igni low < high {
+        contract pivot = arr[high]
+        contract i = low - 1
+        contract j = low
+        quen j < high {
+            igni arr[j] < pivot {
+                i = i + 1
+                contract temp = arr[i]
+                arr[i] = arr[j]
+                arr[j] = temp
+            }
+            j = j + 1
+        }
+        contract temp = arr[i + 1]
+        arr[i + 1] = arr[high]
+        arr[high] = temp
+        quicksort(arr, low, i)
+        quicksort(arr, i + 2, high)
+    }
+}
+quicksort(arr, 0, k - 1)
+medallion(arr[0], arr[k - 1])
+'''
+
+STRING_CONCAT = '''
+contract scroll = ""
+contract i = 0
+quen i < {n} {
+    scroll = scroll + "silver" + i
+    i = i + 1
+}
+medallion(monster_count(scroll))
+'''
+
+# name -> (source template, size at scale 1)
+SYNTHETIC = {
+    'fibonacci': (FIBONACCI, 18),
+    'bubble_sort': (BUBBLE_SORT, 150),
+    'quicksort': (QUICKSORT, 2000),
+    'string_concat': (STRING_CONCAT, 5000),
+}
+
+def write_grimoire_graph(directory: str, depth: int, width: int) -> str:
+    """Write `depth` layers of `width` grimoires, each importing the whole next
+    layer, and return a program that imports the first layer"""
+    def path(level: int, index: int) -> str:
+        return os.path.join(directory, f"layer{level}_{index}.witcher")
+
+    for level in range(depth):
+        for index in range(width):
+            imports = [f'grimoire "{path(level + 1, other)}"' for other in range(width)] if level + 1 < depth else []
+            with open(path(level, index), 'w') as f:
+                f.write('\n'.join(imports) + f'''
+aard sign_{level}_{index}(x) {{
+    hunt x * {index + 1} + {level}
+}}
+contract rune_{level}_{index} = sign_{level}_{index}({level})
+''')
+
+    imports = '\n'.join(f'grimoire "{path(0, index)}"' for index in range(width))
+    return imports + f'\nmedallion(sign_{depth - 1}_0(1))\n'
+
+def load_workloads(scale: float, directory: str) -> Dict[str, Tuple[str, bool]]:
+    """name -> (source, runnable)"""
+    workloads = {}
+    for path in sorted(glob.glob(os.path.join(ROOT, 'example_programs', '*.witcher'))):
+        with open(path, 'r') as f:
+            workloads['example/' + os.path.basename(path)[:-len('.witcher')]] = (f.read(), True)
+
+    for name, (template, size) in SYNTHETIC.items():
+        workloads[name] = (template.replace('{n}', str(max(1, int(size * scale)))), True)
+    workloads['grimoire_graph'] = (write_grimoire_graph(directory, max(2, int(6 * scale)), 4), True)
+
+    # Lexer and parser only: every shipped program, repeated
+    corpus = '\n'.join(source for source, _ in workloads.values()) * max(1, int(20 * scale))
+    workloads['corpus'] = (corpus, False)
+    return workloads
+
+def best_of(repeat: int, run: Callable[[], None]) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def interpret(engine: str, ast: List) -> None:
+    grimoire_registry.clear()  # Imports are part of the work being measured
+    interpreter = create_interpreter(engine)
+    interpreter.memo.size = 0
+    interpreter.output = MemorySink()
+    interpreter.interpret(ast)
+
+def run_suite(args) -> Dict[str, Dict[str, float]]:
+    results = {}
+    engines = args.engine or ENGINES
+
+    def record(key: str, seconds: float, **units: int):
+        results[key] = {'seconds': seconds, **units}
+        rates = ''.join(f" ({count / seconds:,.0f} {unit}/s)" for unit, count in units.items())
+        print(f"{key:<48} {seconds * 1000:>10.2f} ms{rates}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, (source, runnable) in load_workloads(args.scale, directory).items():
+            if args.filter and args.filter not in name:
+                continue
+            tokens = create_lexer(source).tokenize()
+            ast = Parser(tokens).parse()
+
+            record(f"lex/{name}", best_of(args.repeat, lambda: create_lexer(source).tokenize()),
+                   chars=len(source))
+            record(f"parse/{name}", best_of(args.repeat, lambda: Parser(tokens).parse()),
+                   tokens=len(tokens))
+            if runnable:
+                for engine in engines:
+                    key = f"interpret/{engine}/{name}"
+                    try:
+                        record(key, best_of(args.repeat, lambda: interpret(engine, ast)))
+                    except RuntimeError as e:
+                        print(f"{key:<48} failed: {e}")  # Not recorded, so never compared
+    return results
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> int:
+    """Print the change for every benchmark in both files; return the number of regressions"""
+    regressions = 0
+    for setting in ('scale', 'repeat'):
+        if baseline[setting] != current[setting]:
+            print(f"Warning: {setting} differs ({baseline[setting]} vs {current[setting]})")
+    shared = [key for key in current['results'] if key in baseline['results']]
+    for key in shared:
+        before = baseline['results'][key]['seconds']
+        after = current['results'][key]['seconds']
+        change = (after - before) / before * 100
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -threshold:
+            flag = '  faster'
+        print(f"{key:<48} {before * 1000:>10.2f} -> {after * 1000:>10.2f} ms {change:>+7.1f}%{flag}")
+
+    missing = len(set(baseline['results']) - set(current['results']))
+    if missing:
+        print(f"{missing} benchmarks in the baseline are not in the new results")
+    print(f"{regressions} of {len(shared)} benchmarks regressed by more than {threshold:g}%")
+    return regressions
+
+def load_results(path: str) -> Dict:
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != RESULTS_VERSION:
+        sys.exit(f"{path}: unsupported results version {data.get('version')}")
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('--output', metavar='FILE', help='write the results to FILE as JSON')
+    run.add_argument('--scale', type=float, default=1.0, help='multiplies every workload size')
+    run.add_argument('--repeat', type=int, default=5, help='runs per measurement; the best is kept')
+    run.add_argument('--engine', choices=ENGINES, action='append',
+                     help='engine to interpret with (repeatable; default: all)')
+    run.add_argument('--filter', metavar='TEXT', help='only workloads whose name contains TEXT')
+
+    diff = commands.add_parser('compare', help='compare two result files')
+    diff.add_argument('baseline')
+    diff.add_argument('results')
+    diff.add_argument('--threshold', type=float, default=10.0,
+                      help='percent slowdown reported as a regression (default: 10)')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        regressions = compare(load_results(args.baseline), load_results(args.results), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    os.chdir(ROOT)  # Examples import grimoires by paths relative to the repository
+    results = run_suite(args)
+    if args.output:
+        data = {
+            'version': RESULTS_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
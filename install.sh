@@ -19,6 +19,23 @@ mkdir -p "$INSTALL_DIR"
 echo "📝 Setting up WitcherScript..."
 cp "$SCRIPT_DIR/witcher" "$INSTALL_DIR/witcher"
 cp "$SCRIPT_DIR/witcher_interpreter.py" "$INSTALL_DIR/witcher_interpreter.py"
+cp "$SCRIPT_DIR/witcher_closure.py" "$INSTALL_DIR/witcher_closure.py"
+cp "$SCRIPT_DIR/witcher_vm.py" "$INSTALL_DIR/witcher_vm.py"
+cp "$SCRIPT_DIR/witcher_resolver.py" "$INSTALL_DIR/witcher_resolver.py"
+cp "$SCRIPT_DIR/witcher_cache.py" "$INSTALL_DIR/witcher_cache.py"
+cp "$SCRIPT_DIR/witcher_optimizer.py" "$INSTALL_DIR/witcher_optimizer.py"
+cp "$SCRIPT_DIR/witcher_purity.py" "$INSTALL_DIR/witcher_purity.py"
+cp "$SCRIPT_DIR/witcher_output.py" "$INSTALL_DIR/witcher_output.py"
+cp "$SCRIPT_DIR/witcher_numeric.py" "$INSTALL_DIR/witcher_numeric.py"
+cp "$SCRIPT_DIR/witcher_std.py" "$INSTALL_DIR/witcher_std.py"
+cp "$SCRIPT_DIR/witcher_builtins.py" "$INSTALL_DIR/witcher_builtins.py"
+cp "$SCRIPT_DIR/witcher_profiler.py" "$INSTALL_DIR/witcher_profiler.py"
+cp "$SCRIPT_DIR/witcher_repl.py" "$INSTALL_DIR/witcher_repl.py"
+cp "$SCRIPT_DIR/witcher_batch.py" "$INSTALL_DIR/witcher_batch.py"
+cp "$SCRIPT_DIR/witcher_program.py" "$INSTALL_DIR/witcher_program.py"
+cp "$SCRIPT_DIR/witcher_budget.py" "$INSTALL_DIR/witcher_budget.py"
+cp "$SCRIPT_DIR/witcher_text.py" "$INSTALL_DIR/witcher_text.py"
+cp "$SCRIPT_DIR/witcher_artifact.py" "$INSTALL_DIR/witcher_artifact.py"
 
 chmod +x "$INSTALL_DIR/witcher"
 
@@ -43,4 +60,4 @@ echo "  witcher program.witcher"
 echo "  witcher example_programs/01_hello_world.witcher"
 echo ""
 echo "To uninstall:"
-echo "  rm $INSTALL_DIR/witcher $INSTALL_DIR/witcher_interpreter.py"
+echo "  rm $INSTALL_DIR/witcher $INSTALL_DIR/witcher_interpreter.py $INSTALL_DIR/witcher_closure.py $INSTALL_DIR/witcher_vm.py $INSTALL_DIR/witcher_resolver.py $INSTALL_DIR/witcher_cache.py $INSTALL_DIR/witcher_optimizer.py $INSTALL_DIR/witcher_purity.py $INSTALL_DIR/witcher_output.py $INSTALL_DIR/witcher_numeric.py $INSTALL_DIR/witcher_std.py $INSTALL_DIR/witcher_builtins.py $INSTALL_DIR/witcher_profiler.py $INSTALL_DIR/witcher_repl.py $INSTALL_DIR/witcher_batch.py $INSTALL_DIR/witcher_program.py $INSTALL_DIR/witcher_budget.py $INSTALL_DIR/witcher_text.py $INSTALL_DIR/witcher_artifact.py"
@@ -24,7 +24,12 @@ setup(
         "Documentation": "https://github.com/rwnicholas/WitcherScript/blob/main/README.md",
         "Source Code": "https://github.com/rwnicholas/WitcherScript",
     },
-    py_modules=["witcher", "witcher_interpreter"],
+    py_modules=["witcher", "witcher_interpreter", "witcher_closure", "witcher_vm",
+                "witcher_resolver", "witcher_cache", "witcher_optimizer",
+                "witcher_purity", "witcher_output", "witcher_numeric",
+                "witcher_std", "witcher_builtins", "witcher_profiler",
+                "witcher_repl", "witcher_batch", "witcher_program",
+                "witcher_budget", "witcher_text", "witcher_artifact"],
     entry_points={
         "console_scripts": [
             "witcher=witcher:main",
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Engine Agreement Tests
+Every engine must print exactly what the tree-walker prints. Runs the
+example programs, and programs for the cases the compiled engines
+handle separately, on each engine and compares the output.
+Usage: python3 -m unittest discover tests
+"""
+
+import contextlib
+import glob
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from typing import Dict, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from witcher_budget import Budget
+from witcher_interpreter import ENGINES, run_witcher_script
+from witcher_output import MemorySink
+
+# A nested function reading a local of the function that defined it
+NESTED_FUNCTION = '''
+aard outer(x) {
+    aard inner() {
+        hunt x
+    }
+    hunt inner() * 2
+}
+medallion(outer(3))
+'''
+
+# A callee reading a local of its caller, across a normal and a tail call
+CALLER_LOCAL = '''
+aard g() {
+    hunt y
+}
+aard f() {
+    contract y = 42
+    hunt g()
+}
+aard h() {
+    contract y = 7
+    contract result = g() + 1
+    hunt result
+}
+medallion(f())
+medallion(h())
+'''
+
+# Locals of tail callers stay visible, however long the chain of tail calls
+TAIL_CALL_CHAIN = '''
+aard report() {
+    hunt total + " " + n
+}
+aard count_down(n, acc) {
+    igni n == 0 {
+        hunt report()
+    }
+    contract total = acc + n
+    hunt count_down(n - 1, total)
+}
+medallion(count_down(3000, 0))
+'''
+
+# A local read before it is assigned comes from the caller, then the globals
+UNASSIGNED_LOCAL = '''
+aard maybe() {
+    igni falsehood {
+        contract y = 1
+    }
+    hunt y
+}
+aard caller() {
+    contract y = 7
+    hunt maybe() + 1
+}
+medallion(caller())
+contract y = 100
+medallion(maybe())
+'''
+
+# A function found through a caller's local, called directly and passed along
+CALLER_FUNCTION = '''
+aard apply(k) {
+    hunt k()
+}
+aard use_helper() {
+    hunt helper()
+}
+aard outer() {
+    contract z = 9
+    aard helper() {
+        hunt z * 2
+    }
+    contract passed = apply(helper)
+    contract found = use_helper()
+    hunt passed + found
+}
+medallion(outer())
+medallion(helper())
+'''
+
+# User functions named like builtins that are not the language's own
+SHADOWED_BUILTIN = '''
+aard total(b) {
+    hunt bestiary_sum(b)
+}
+medallion(total([1, 2]))
+aard bestiary_sum(b) {
+    hunt "user sum"
+}
+medallion(total([1, 2]))
+aard local_max(b) {
+    aard bestiary_max(x) {
+        hunt "local max"
+    }
+    hunt bestiary_max(b)
+}
+medallion(local_max([4, 5]))
+medallion(bestiary_max([4, 5]))
+'''
+
+# Arguments a std function refuses, each reported as a script error
+POW_ERRORS = '''
+grimoire "std"
+medallion(pow(-8, 2) + " " + pow(2, -1))
+medallion(pow(0, -1))
+'''
+
+# Repeating and joining a numeric bestiary keeps it a bestiary
+NUMERIC_OPERATORS = '''
+contract b = numeric_bestiary(2) * 2
+b[1] = 4
+medallion(hunter_instinct(b) + " " + hunter_instinct(3 * b))
+yrden v -> b {
+    medallion(v)
+}
+medallion(b + [1.5])
+medallion([1] + b)
+medallion(b + ["a"])
+'''
+
+# A grimoire, and a program importing it that test_grimoire_per_run runs twice
+LIBRARY = '''
+medallion("lib loaded")
+contract items = [1]
+aard get_x() {
+    hunt x
+}
+aard say(message) {
+    medallion(message)
+}
+aard with_z(callback) {
+    contract z = 4
+    hunt callback() + 0
+}
+aard read_y() {
+    hunt y
+}
+'''
+
+# Follows a `grimoire` line importing LIBRARY
+IMPORTER = '''
+add_to_bestiary(items, 2)
+medallion(items)
+contract x = 5
+medallion(get_x())
+say("hi")
+aard read_z() {
+    hunt z
+}
+aard with_y() {
+    contract y = 3
+    hunt read_y() + 0
+}
+medallion(with_z(read_z) + with_y())
+'''
+
+# Operators that would build a text or bestiary past a size budget
+OVERSIZED = [
+    'contract s = "ab" * 500000',
+    'contract s = 500000 * "ab"',
+    'contract c = [0] * 300000',
+    'contract c = [0] * 600 + [1] * 600',
+    'contract b = numeric_bestiary(1000000000)',
+    'grimoire "std"\ncontract r = range(0, 1000000000)',
+]
+
+def run_source(source: str, engine: str, budget: Optional[Budget] = None) -> str:
+    """Everything a program prints, errors included"""
+    output = MemorySink()
+    printed = io.StringIO()
+    with contextlib.redirect_stdout(printed):
+        run_witcher_script(source, engine=engine, cache=False, output=output, budget=budget)
+    return output.getvalue() + printed.getvalue()
+
+def run_file(path: str, engine: str) -> str:
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'witcher.py'), '--engine', engine, path],
+                            cwd=ROOT, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=120)
+    return result.stdout
+
+class EngineAgreementTest(unittest.TestCase):
+
+    def assertEnginesAgree(self, outputs: Dict[str, str]):
+        for engine in ENGINES:
+            self.assertEqual(outputs[engine], outputs['tree'], f"{engine} differs from tree")
+
+    def check_source(self, source: str, expected: str):
+        outputs = {engine: run_source(source, engine) for engine in ENGINES}
+        self.assertEqual(outputs['tree'], expected)
+        self.assertEnginesAgree(outputs)
+
+    def test_nested_function(self):
+        self.check_source(NESTED_FUNCTION, "6\n")
+
+    def test_caller_local(self):
+        self.check_source(CALLER_LOCAL, "42\n8\n")
+
+    def test_tail_call_chain(self):
+        self.check_source(TAIL_CALL_CHAIN, "4501500 0\n")
+
+    def test_unassigned_local(self):
+        self.check_source(UNASSIGNED_LOCAL, "8\n100\n")
+
+    def test_caller_function(self):
+        self.check_source(CALLER_FUNCTION, "36\nError: Undefined variable: helper\n")
+
+    def test_shadowed_builtin(self):
+        self.check_source(SHADOWED_BUILTIN, "3\nuser sum\nlocal max\n5\n")
+
+    def test_pow_errors(self):
+        self.check_source(POW_ERRORS, "64 0.5\nError: pow of zero to a negative power\n")
+
+    def test_numeric_operators(self):
+        self.check_source(NUMERIC_OPERATORS, "bestiary bestiary\n0.0\n4.0\n0.0\n0.0\n"
+                          "[0.0, 4.0, 0.0, 0.0, 1.5]\n[1, 0.0, 4.0, 0.0, 0.0]\n"
+                          "Error: A numeric bestiary can only hold numbers\n")
+
+    def test_grimoire_per_run(self):
+        # Each run loads its grimoires afresh, and never sees another run's.
+        # Grimoire functions read the importer's globals and print to its output,
+        # and locals are visible across the grimoire boundary both ways.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'lib.witcher')
+            with open(path, 'w') as f:
+                f.write(LIBRARY)
+            source = f'grimoire "{path}"' + IMPORTER
+            for engine in ENGINES:
+                with self.subTest(engine=engine):
+                    for run in range(2):
+                        self.assertEqual(run_source(source, engine), "lib loaded\n[1, 2]\n5\nhi\n7\n")
+
+    def test_size_budget(self):
+        for source in OVERSIZED:
+            with self.subTest(source=source):
+                for engine in ENGINES:
+                    output = run_source(source, engine, Budget(max_size=1000))
+                    self.assertTrue(output.startswith("Error: Size budget exceeded"), f"{engine}: {output!r}")
+
+    def test_example_programs(self):
+        paths = sorted(glob.glob(os.path.join(ROOT, 'example_programs', '*.witcher')))
+        paths.append(os.path.join(ROOT, 'SHOWCASE.witcher'))
+        for path in paths:
+            with self.subTest(program=os.path.basename(path)):
+                self.assertEnginesAgree({engine: run_file(path, engine) for engine in ENGINES})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,68 +1,126 @@
 #!/usr/bin/env python3
 """
 WitcherScript Command-Line Interface
-Usage: witcher [file.witcher]
+Usage: witcher [--engine ENGINE] [--lexer LEXER] [--stream] [--no-cache] [-O]
+               [--memo-size N] [--flush POLICY] [--typed-bestiaries]
+               [--profile] [--profile-stacks FILE] [--max-steps N] [--timeout SECONDS]
+               [--max-size N] [--max-depth N] [file.witcher]
+       witcher batch [--manifest FILE] [--workers N] [--preload GRIMOIRE]
+                     [--summary FILE] [options] [file.witcher ...]
+       witcher compile [-O] [--lexer LEXER] [-o OUTPUT] file.witcher ...
 - witcher                    : Start interactive mode
-- witcher program.witcher    : Run a .witcher file
+- witcher program.witcher    : Run a .witcher file (through program.witcherc if it is up to date)
+- witcher program.witcherc   : Run a compiled program
+- witcher batch a.witcher b.witcher : Run many files in parallel and print a JSON summary
+- witcher compile a.witcher b.witcher : Write a.witcherc and b.witcherc, parsed ahead of time
+- --engine closure           : Run on the closure-compiling engine (default: tree)
+- --lexer regex              : Tokenize with the regex-driven lexer (default: char)
+- --stream                   : Run each statement as soon as it is parsed
+- --no-cache                 : Don't read or write __witchercache__ for grimoires
+- -O                         : Optimize the AST first and report the nodes eliminated
+- --memo-size 0              : Turn off memoization of pure functions (default: 4096 results)
+- --flush size               : Write output in large chunks even on a terminal
+- --typed-bestiaries         : Store all-float bestiary literals as unboxed arrays
+- --profile                  : Report time per function and hits per line on stderr
+- --profile-stacks out.txt   : Also write collapsed stacks for flame graph tools
+- --max-steps 1000000        : Stop after this many loop iterations and function calls
+- --timeout 5                : Stop after this many seconds
+- --max-size 100000          : Refuse bestiaries and texts longer than this
+- --max-depth 200            : Refuse calls nested deeper than this (tail calls don't nest)
 """
 
+import argparse
+import json
 import sys
 import os
 
 # Add current directory to path to import witcher_interpreter
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from witcher_interpreter import run_witcher_script
+from witcher_artifact import artifact_for, source_path
+from witcher_budget import Budget
+from witcher_interpreter import ENGINES, LEXERS, run_witcher_script
+from witcher_output import FLUSH_POLICIES, OutputSink
+from witcher_profiler import Profiler
+from witcher_repl import ReplSession
 
-def interactive_mode():
+def interactive_mode(engine='tree', lexer_mode='char', cache=True):
     """Start interactive REPL"""
     print("=== WitcherScript Interpreter ===")
     print("Type your Witcher code. Type 'quit' to exit.")
     print()
 
-    lines = []
+    # The REPL shows each line as soon as it is written
+    session = ReplSession(engine, lexer_mode, cache, OutputSink(flush='line'))
+    more = False
     while True:
         try:
-            line = input("witcher> " if not lines else "       > ")
+            line = input("       > " if more else "witcher> ")
             if line.lower() == "quit":
                 break
 
-            lines.append(line)
-            source = '\n'.join(lines)
-
             try:
-                from witcher_interpreter import Lexer, Parser, Interpreter
-                lexer = Lexer(source)
-                tokens = lexer.tokenize()
-                parser = Parser(tokens)
-                ast = parser.parse()
-                interpreter = Interpreter()
-                interpreter.interpret(ast)
-                lines = []  # Reset after successful execution
-            except SyntaxError:
-                # Continue reading for incomplete input
-                continue
+                more = session.push(line)
+            except RecursionError:
+                more = False
+                print("Error: Recursion too deep for this engine; the vm engine keeps its call stack on the heap")
             except Exception as e:
+                more = False
                 print(f"Error: {e}")
-                lines = []
 
-        except (KeyboardInterrupt, EOFError):
+        except KeyboardInterrupt:
+            # Abandon the entry being typed, keep the session
+            session.reset()
+            more = False
+            print()
+        except EOFError:
             print("\nGoodbye, Witcher!")
             break
 
-def run_file(file_path):
+def add_budget_arguments(parser):
+    parser.add_argument('--max-steps', type=int, metavar='N',
+                        help='stop after N loop iterations and function calls')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS',
+                        help='stop after this much wall-clock time')
+    parser.add_argument('--max-size', type=int, metavar='N',
+                        help='refuse to build a bestiary or text longer than N')
+    parser.add_argument('--max-depth', type=int, metavar='N',
+                        help='refuse function calls nested more than N deep; tail calls '
+                             'do not nest, so bound tail recursion with --max-steps or --timeout')
+
+def budget_from_args(args):
+    limits = (args.max_steps, args.timeout, args.max_size, args.max_depth)
+    if all(limit is None for limit in limits):
+        return None
+    return Budget(*limits)
+
+def run_file(file_path, engine='tree', lexer='char', stream=False, cache=True, optimize=False,
+             memo_size=None, flush='auto', typed_bestiaries=False, profile=False,
+             profile_stacks=None, budget=None):
     """Run a .witcher file"""
     if not os.path.exists(file_path):
         print(f"Error: File not found: {file_path}", file=sys.stderr)
         sys.exit(1)
 
-    if not file_path.endswith('.witcher'):
+    if not file_path.endswith(('.witcher', '.witcherc')):
         print(f"Warning: File doesn't have .witcher extension: {file_path}", file=sys.stderr)
 
     try:
-        with open(file_path, 'r') as f:
-            source = f.read()
-        run_witcher_script(source)
+        artifact = artifact_for(file_path)
+        if artifact is not None:
+            source = artifact.ast
+        else:
+            with open(source_path(file_path), 'r') as f:
+                source = f.read()
+        profiler = Profiler(file_path) if profile or profile_stacks else None
+        run_witcher_script(source, engine=engine, lexer=lexer, stream=stream, cache=cache,
+                           optimize=optimize, memo_size=memo_size, output=OutputSink(flush=flush),
+                           typed_bestiaries=typed_bestiaries, profiler=profiler, budget=budget)
+        if profiler:
+            print(profiler.report(), file=sys.stderr)
+            if profile_stacks:
+                with open(profile_stacks, 'w') as f:
+                    f.write(profiler.collapsed_stacks())
     except FileNotFoundError:
         print(f"Error: Cannot read file: {file_path}", file=sys.stderr)
         sys.exit(1)
@@ -70,14 +128,132 @@ def run_file(file_path):
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
+def batch_main(argv):
+    """`witcher batch`: run many files across a process pool"""
+    parser = argparse.ArgumentParser(prog='witcher batch',
+                                     description='Run many WitcherScript programs in parallel')
+    parser.add_argument('files', nargs='*', help='.witcher files to run')
+    parser.add_argument('--manifest', metavar='FILE',
+                        help='file listing scripts to run, one path per line')
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--preload', action='append', default=[], metavar='GRIMOIRE',
+                        help='grimoire each worker parses before its first script (repeatable)')
+    parser.add_argument('--summary', metavar='FILE',
+                        help='write the JSON summary to FILE instead of stdout')
+    parser.add_argument('--engine', choices=ENGINES, default='tree',
+                        help='execution engine (default: tree)')
+    parser.add_argument('--lexer', choices=LEXERS, default='char',
+                        help='tokenizer (default: char)')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='parse grimoires from source without using __witchercache__')
+    parser.add_argument('-O', dest='optimize', action='store_true',
+                        help='fold constants and remove dead branches before running')
+    parser.add_argument('--memo-size', type=int, metavar='N',
+                        help='results cached for pure functions on the tree engine; 0 disables')
+    parser.add_argument('--typed-bestiaries', action='store_true',
+                        help='store bestiary literals that hold only floats as unboxed arrays')
+    add_budget_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from witcher_batch import read_manifest, run_batch
+    paths = list(args.files)
+    if args.manifest:
+        paths += read_manifest(args.manifest)
+    if not paths:
+        parser.error('no scripts given')
+    if args.workers is not None and args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    try:
+        summary = run_batch(paths, args.workers, args.engine, args.lexer, args.cache, args.optimize,
+                            args.memo_size, args.typed_bestiaries, args.preload, budget_from_args(args))
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"{summary['scripts']} scripts, {summary['failed']} failed, "
+              f"{summary['seconds']:.2f} s on {summary['workers']} workers", file=sys.stderr)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    sys.exit(1 if summary['failed'] else 0)
+
+def compile_main(argv):
+    """`witcher compile`: parse files ahead of time into .witcherc artifacts"""
+    parser = argparse.ArgumentParser(prog='witcher compile',
+                                     description='Compile WitcherScript programs to .witcherc files')
+    parser.add_argument('files', nargs='+', help='.witcher files to compile')
+    parser.add_argument('-o', dest='output', metavar='OUTPUT',
+                        help='artifact to write (one input only; default: FILE.witcherc beside FILE)')
+    parser.add_argument('-O', dest='optimize', action='store_true',
+                        help='fold constants and remove dead branches before saving')
+    parser.add_argument('--lexer', choices=LEXERS, default='char',
+                        help='tokenizer (default: char)')
+    args = parser.parse_args(argv)
+    if args.output and len(args.files) > 1:
+        parser.error('-o needs exactly one input file')
+
+    from witcher_artifact import compile_file
+    failed = 0
+    for path in args.files:
+        try:
+            compile_file(path, args.output, args.lexer, args.optimize)
+        except (SyntaxError, OSError, UnicodeDecodeError) as e:
+            print(f"Error: {path}: {e}", file=sys.stderr)
+            failed += 1
+    print(f"{len(args.files) - failed} compiled, {failed} failed", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
 def main():
     """Main entry point for WitcherScript CLI"""
-    if len(sys.argv) < 2:
-        # No arguments: interactive mode
-        interactive_mode()
+    if sys.argv[1:2] == ['batch']:
+        batch_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ['compile']:
+        compile_main(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(prog='witcher', description='Run WitcherScript programs')
+    parser.add_argument('file', nargs='?', help='.witcher file to run (omit for interactive mode)')
+    parser.add_argument('--engine', choices=ENGINES, default='tree',
+                        help='execution engine (default: tree)')
+    parser.add_argument('--lexer', choices=LEXERS, default='char',
+                        help='tokenizer (default: char)')
+    parser.add_argument('--stream', action='store_true',
+                        help='execute statements while the file is still being parsed')
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help='parse grimoires from source without using __witchercache__')
+    parser.add_argument('-O', dest='optimize', action='store_true',
+                        help='fold constants and remove dead branches before running')
+    parser.add_argument('--memo-size', type=int, metavar='N',
+                        help='results cached for pure functions on the tree engine; 0 disables')
+    parser.add_argument('--flush', choices=FLUSH_POLICIES[:3], default='auto',
+                        help='when output is written: per line, in large chunks, or auto '
+                             '(line on a terminal, chunks otherwise)')
+    parser.add_argument('--typed-bestiaries', action='store_true',
+                        help='store bestiary literals that hold only floats as unboxed arrays')
+    parser.add_argument('--profile', action='store_true',
+                        help='report calls, time per function and hits per line on stderr (tree engine)')
+    parser.add_argument('--profile-stacks', metavar='FILE',
+                        help='profile, and write collapsed call stacks for flame graph tools to FILE')
+    add_budget_arguments(parser)
+    args = parser.parse_args()
+
+    if (args.profile or args.profile_stacks) and args.engine != 'tree':
+        parser.error('profiling needs --engine tree')
+
+    if args.file is None:
+        # No file: interactive mode
+        interactive_mode(args.engine, args.lexer, args.cache)
     else:
-        # With arguments: run file
-        run_file(sys.argv[1])
+        # With a file: run it
+        run_file(args.file, args.engine, args.lexer, args.stream, args.cache, args.optimize,
+                 args.memo_size, args.flush, args.typed_bestiaries, args.profile,
+                 args.profile_stacks, budget_from_args(args))
 
 if __name__ == "__main__":
     main()
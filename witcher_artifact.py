@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Compiled Artifacts
+`witcher compile program.witcher` writes program.witcherc: the parsed,
+and optionally optimized, program in the same encoding as the grimoire
+cache (see witcher_cache). Loading one is a single read plus unmarshal,
+with no lexing or parsing, and an artifact can be shipped without its
+source.
+
+A .witcherc file starts with a fixed header:
+
+    magic b'WSCX', AST format version, flags, source size, source
+    mtime (ns), SHA-256 of the source
+
+Unlike a cache entry it records no path, so it can be copied anywhere.
+
+Running or importing foo.witcher uses foo.witcherc beside it when the
+artifact matches the source: the same size and mtime, or, once either
+has changed (as copying often does), the same SHA-256. Naming foo.witcherc
+directly uses the artifact as it is. Either way, an artifact from an
+older format is ignored in favour of the source, and is an error only
+when there is no source to fall back to.
+"""
+
+import os
+import struct
+from typing import List, Optional
+
+from witcher_cache import (
+    FORMAT_VERSION, decode_program, encode_program, read_source, source_digest, write_atomic,
+)
+from witcher_interpreter import ASTNode, Parser, create_lexer
+
+MAGIC = b'WSCX'
+SOURCE_SUFFIX = '.witcher'
+ARTIFACT_SUFFIX = '.witcherc'
+
+# magic, AST format version, flags, source size, source mtime (ns), SHA-256
+HEADER = struct.Struct('<4sHHQQ32s')
+
+# Flags
+OPTIMIZED = 1
+
+class ArtifactError(SyntaxError):
+    """A .witcherc file that can't be used: damaged, or from another format version"""
+
+class Artifact:
+    """A loaded .witcherc file"""
+    __slots__ = ('ast', 'optimized', 'size', 'mtime_ns', 'digest')
+
+    def __init__(self, ast: List[ASTNode], optimized: bool, size: int, mtime_ns: int, digest: bytes):
+        self.ast = ast
+        self.optimized = optimized  # Already run through witcher_optimizer
+        self.size = size  # Of the source it was compiled from
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+
+    def matches(self, source_path: str) -> bool:
+        """Whether this was compiled from the current contents of source_path"""
+        try:
+            stat = os.stat(source_path)
+            if stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns:
+                return True
+            return source_digest(read_source(source_path)) == self.digest
+        except (OSError, UnicodeDecodeError):
+            return False
+
+def artifact_path(source_path: str) -> str:
+    """foo.witcher -> foo.witcherc"""
+    if source_path.endswith(SOURCE_SUFFIX):
+        return source_path + 'c'
+    return source_path + ARTIFACT_SUFFIX
+
+def source_path(path: str) -> str:
+    """The source for `path`: foo.witcherc -> foo.witcher; a source path is its own"""
+    if path.endswith(ARTIFACT_SUFFIX):
+        return path[:-len(ARTIFACT_SUFFIX)] + SOURCE_SUFFIX
+    return path
+
+def read_artifact(path: str) -> Artifact:
+    """Load a .witcherc file in one read; raises ArtifactError, or OSError"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        magic, version, flags, size, mtime_ns, digest = HEADER.unpack_from(data)
+    except struct.error:
+        raise ArtifactError(f"{path}: not a compiled WitcherScript file")
+    if magic != MAGIC:
+        raise ArtifactError(f"{path}: not a compiled WitcherScript file")
+    if version != FORMAT_VERSION:
+        raise ArtifactError(f"{path}: compiled with format version {version}, "
+                            f"this WitcherScript reads version {FORMAT_VERSION}; recompile it")
+    try:
+        ast = decode_program(memoryview(data)[HEADER.size:])
+    except (ValueError, EOFError, TypeError, IndexError, KeyError):
+        raise ArtifactError(f"{path}: damaged compiled file; recompile it")
+    return Artifact(ast, bool(flags & OPTIMIZED), size, mtime_ns, digest)
+
+def artifact_for(path: str) -> Optional[Artifact]:
+    """The artifact to run for `path`, or None to parse source_path(path)
+
+    For foo.witcherc that is the file itself, unless it can't be used
+    and foo.witcher exists. For foo.witcher it is a matching foo.witcherc.
+    """
+    if path.endswith(ARTIFACT_SUFFIX):
+        try:
+            return read_artifact(path)
+        except ArtifactError:
+            if os.path.exists(source_path(path)):
+                return None
+            raise
+
+    compiled = artifact_path(path)
+    if not os.path.exists(compiled):
+        return None
+    try:
+        artifact = read_artifact(compiled)
+    except (ArtifactError, OSError):
+        return None
+    return artifact if artifact.matches(path) else None
+
+def compile_file(path: str, output: Optional[str] = None, lexer_mode: str = 'char',
+                 optimize: bool = False) -> str:
+    """Parse a .witcher file and write its artifact; return the artifact's path
+
+    Raises SyntaxError for an invalid program and OSError when a file
+    can't be read or written.
+    """
+    stat = os.stat(path)
+    source = read_source(path)
+    ast = Parser(create_lexer(source, lexer_mode).tokenize()).parse()
+    if optimize:
+        from witcher_optimizer import optimize as optimize_ast
+        ast = optimize_ast(ast)
+
+    output = output or artifact_path(path)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, OPTIMIZED if optimize else 0,
+                         stat.st_size, stat.st_mtime_ns, source_digest(source))
+    write_atomic(output, header + encode_program(ast))
+    return output
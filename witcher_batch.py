@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Batch Runner
+Runs many scripts across a pool of worker processes. Each worker starts
+once: it imports every engine and parses the grimoires it is asked to
+preload, so a script pays only for its own parsing and execution, not
+for starting Python.
+
+Scripts stay independent of each other. Each one gets a fresh
+interpreter and grimoire registry, so grimoires run again for every
+script that imports them. Only the parsed grimoires are shared, within
+a worker. Output and errors are captured per script, never printed.
+A script with an up-to-date .witcherc artifact (see witcher_artifact)
+is loaded from it without parsing.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from witcher_artifact import artifact_for, source_path
+from witcher_budget import Budget
+from witcher_interpreter import (
+    GrimoireRegistry, Parser, create_interpreter, create_lexer,
+)
+from witcher_output import MemorySink
+
+# Version of the summary layout returned by run_batch
+SUMMARY_VERSION = 1
+
+# Worker state, set by warm_worker in each process of the pool
+worker_options: Dict[str, Any] = {}
+parsed_grimoires: Dict = {}
+
+def read_manifest(path: str) -> List[str]:
+    """Script paths listed one per line; relative paths are relative to the manifest"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, 'r') as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+def configure(options: Dict[str, Any]) -> Any:
+    interpreter = create_interpreter(options['engine'])
+    interpreter.lexer_mode = options['lexer']
+    interpreter.grimoire_cache = options['cache']
+    interpreter.optimize = options['optimize']
+    interpreter.typed_bestiaries = options['typed_bestiaries']
+    if options['memo_size'] is not None:
+        interpreter.memo.size = options['memo_size']
+    interpreter.registry = GrimoireRegistry(parsed_grimoires)
+    return interpreter
+
+def warm_worker(options: Dict[str, Any], preload: List[str]):
+    """Pool initializer: load the engines and parse the preloaded grimoires"""
+    # Imported here rather than on a script's first use
+    import witcher_cache, witcher_closure, witcher_optimizer, witcher_vm
+
+    worker_options.update(options)
+    interpreter = configure(options)
+    for path in preload:
+        try:
+            interpreter.registry.parse(interpreter.create_module_interpreter(), path)
+        except SyntaxError:
+            pass  # Reported by the scripts that import it
+
+def run_script(path: str) -> Dict[str, Any]:
+    """Run one script in this worker and describe how it went"""
+    options = worker_options
+    result = {'path': path, 'status': 'ok', 'error': None, 'worker': os.getpid()}
+    interpreter = configure(options)
+    interpreter.output = output = MemorySink()
+    if options['budget'] is not None:
+        interpreter.budget = options['budget'].copy()
+
+    start = time.perf_counter()
+    parse_seconds = None
+    try:
+        artifact = artifact_for(path)
+        if artifact is not None:
+            ast = artifact.ast
+        else:
+            with open(source_path(path), 'r') as f:
+                source = f.read()
+            ast = Parser(create_lexer(source, options['lexer']).tokenize()).parse()
+        if options['optimize'] and not (artifact and artifact.optimized):
+            from witcher_optimizer import optimize
+            ast = optimize(ast)
+        parse_seconds = time.perf_counter() - start
+        interpreter.interpret(ast)
+    except RecursionError:
+        result['status'] = 'error'
+        result['error'] = "Recursion too deep for this engine; the vm engine keeps its call stack on the heap"
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    seconds = time.perf_counter() - start
+
+    result['output'] = output.getvalue()
+    result['seconds'] = seconds
+    if parse_seconds is None:  # Failed before it could run
+        parse_seconds = seconds
+    result['parse_seconds'] = parse_seconds
+    result['run_seconds'] = seconds - parse_seconds
+    return result
+
+def run_batch(paths: Iterable[str], workers: Optional[int] = None, engine: str = 'tree',
+              lexer: str = 'char', cache: bool = True, optimize: bool = False,
+              memo_size: Optional[int] = None, typed_bestiaries: bool = False,
+              preload: Iterable[str] = (), budget: Optional[Budget] = None) -> Dict[str, Any]:
+    """Run every script in a process pool and return the summary
+
+    `workers` defaults to the number of CPUs. `preload` names grimoires
+    each worker parses before its first script. Each script gets its own
+    copy of `budget`'s limits (see witcher_budget). The summary lists a
+    result per script, in the order given, with its status, error,
+    captured output and timings.
+    """
+    paths = list(paths)
+    preload = [os.path.abspath(path) for path in preload]
+    for path in preload:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Grimoire file not found: {path}")
+    workers = workers or os.cpu_count() or 1
+    options = {
+        'engine': engine,
+        'lexer': lexer,
+        'cache': cache,
+        'optimize': optimize,
+        'memo_size': memo_size,
+        'typed_bestiaries': typed_bestiaries,
+        'budget': budget,
+    }
+    # Send scripts in chunks so thousands of small ones don't each pay a round trip
+    chunksize = max(1, len(paths) // (workers * 4))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=warm_worker, initargs=(options, preload)) as pool:
+        results = list(pool.map(run_script, paths, chunksize=chunksize))
+    return {
+        'version': SUMMARY_VERSION,
+        'engine': engine,
+        'workers': workers,
+        'scripts': len(results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'seconds': time.perf_counter() - start,
+        'script_seconds': sum(result['seconds'] for result in results),
+        'results': results,
+    }
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Execution Budgets
+A Budget caps how much a single run may do:
+
+- max_steps: completed loop iterations plus function calls. Code
+  without loops or calls runs in time bounded by its length, so these
+  are the only steps that need counting.
+- timeout: wall-clock seconds, read from the clock every CLOCK_INTERVAL
+  steps rather than on every one
+- max_size: elements in a bestiary, or characters in a text, that an
+  operation may produce
+- max_depth: nested user function calls. A tail call (`hunt f(...)`)
+  takes over its caller's frame and doesn't nest, so this never stops
+  tail recursion, however long it runs; bound that with max_steps or
+  timeout, which count every call.
+
+Going past any limit raises BudgetExceeded, a RuntimeError, so the error
+reaches the same handlers as any other runtime error. Each engine counts
+steps where its loops jump back and where it calls functions. Without a
+budget the engines skip all of this.
+"""
+
+import time
+from typing import Any, Optional
+
+from witcher_numeric import BESTIARY_TYPES
+from witcher_text import TEXT_TYPES
+
+# Steps between two readings of the clock
+CLOCK_INTERVAL = 1024
+
+# Values max_size applies to
+SIZED_TYPES = (*TEXT_TYPES, *BESTIARY_TYPES)
+
+class BudgetExceeded(RuntimeError):
+    """A run went past one of its Budget's limits"""
+
+    def __init__(self, message: str, limit: str):
+        super().__init__(message)
+        self.limit = limit  # 'steps', 'timeout', 'size' or 'depth'
+
+class Budget:
+    """Limits for one run, and what has been used of them so far"""
+
+    def __init__(self, max_steps: Optional[int] = None, timeout: Optional[float] = None,
+                 max_size: Optional[int] = None, max_depth: Optional[int] = None):
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_size = max_size
+        self.max_depth = max_depth
+        self.start()
+
+    def start(self):
+        """Reset the counters and start the clock; call as the run begins"""
+        self.steps = 0
+        self.depth = 0  # Call depth, for engines that don't keep a call stack
+        self.deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        self.checkpoint = 0
+        self.check()
+
+    def copy(self) -> 'Budget':
+        """A fresh budget with the same limits"""
+        return Budget(self.max_steps, self.timeout, self.max_size, self.max_depth)
+
+    def step(self):
+        # Engines inline these two lines where a call would cost too much
+        self.steps += 1
+        if self.steps >= self.checkpoint:
+            self.check()
+
+    def check(self):
+        """Enforce the step and time limits, then set the next checkpoint"""
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise BudgetExceeded(f"Step budget exceeded: more than {self.max_steps} steps", 'steps')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise BudgetExceeded(f"Time budget exceeded: ran longer than {self.timeout:g} s", 'timeout')
+
+        checkpoint = float('inf') if self.deadline is None else self.steps + CLOCK_INTERVAL
+        if self.max_steps is not None:
+            checkpoint = min(checkpoint, self.max_steps + 1)
+        self.checkpoint = checkpoint
+
+    def enter(self, depth: int):
+        """A user function call that makes the call stack `depth` deep"""
+        if self.max_depth is not None and depth > self.max_depth:
+            raise BudgetExceeded(f"Call depth budget exceeded: more than {self.max_depth} nested calls",
+                                 'depth')
+        self.steps += 1
+        if self.steps >= self.checkpoint:
+            self.check()
+
+    def check_size(self, value: Any) -> Any:
+        """Return value, unless it is a bestiary or text over the size limit"""
+        if self.max_size is not None and isinstance(value, SIZED_TYPES):
+            self.check_length(len(value), isinstance(value, TEXT_TYPES))
+        return value
+
+    def check_repeat(self, left: Any, right: Any):
+        """Refuse `left * right` when it would repeat a text or bestiary past the size limit"""
+        if self.max_size is None:
+            return
+        if isinstance(left, SIZED_TYPES) and isinstance(right, int):
+            self.check_length(len(left) * right, isinstance(left, TEXT_TYPES))
+        elif isinstance(right, SIZED_TYPES) and isinstance(left, int):
+            self.check_length(len(right) * left, isinstance(right, TEXT_TYPES))
+
+    def check_join(self, left: Any, right: Any):
+        """Refuse `left + right` when it would join two bestiaries past the size limit"""
+        if (self.max_size is not None and isinstance(left, BESTIARY_TYPES)
+                and isinstance(right, BESTIARY_TYPES)):
+            self.check_length(len(left) + len(right), False)
+
+    def check_length(self, length: int, text: bool):
+        """Refuse to build a text (or bestiary) of `length` characters (or elements)"""
+        if self.max_size is not None and length > self.max_size:
+            what = f"text of {length} characters" if text else f"bestiary of {length} elements"
+            raise BudgetExceeded(f"Size budget exceeded: {what}, more than {self.max_size}", 'size')
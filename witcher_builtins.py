@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Builtin Registry
+Every builtin, for every engine, is an entry in BUILTINS, so a call is
+dispatched with one dict lookup. A builtin's function receives the
+interpreter and the list of evaluated arguments. The language's own
+builtins (LANGUAGE_BUILTINS) always take precedence over user functions
+of the same name. Any other builtin gives way to a user function or
+variable of its name, so a script that defines its own bestiary_sum
+keeps calling it.
+
+Host applications add their own functions with register_builtin:
+
+    from witcher_builtins import register_builtin
+
+    def tax(price, rate):
+        return price * (1 + rate)
+
+    register_builtin('tax', tax, pure=True)
+
+The function is called with the WitcherScript values as plain Python
+arguments, and a call with the wrong number of arguments is a
+RuntimeError. A function with a keyword-only `budget` parameter also
+receives the run's Budget, or None, so it can check the size of what it
+is about to build (see witcher_budget). Register before running a
+script: the compiled engines decide what is a builtin when they compile.
+"""
+
+import inspect
+from typing import Any, Callable, Dict, List, Optional
+
+from witcher_numeric import BESTIARY_TYPES, NUMERIC_BUILTINS
+from witcher_text import TEXT_TYPES, Text, plain
+
+class NativeFunction:
+    """A Python function called with WitcherScript values as its arguments
+
+    Calling it follows the builtin convention: the interpreter and the
+    list of evaluated arguments.
+    """
+    __slots__ = ('name', 'function', 'min_args', 'max_args', 'takes_budget')
+
+    def __init__(self, name: str, function: Callable[..., Any]):
+        self.name = name
+        self.function = function
+        self.min_args = 0
+        self.max_args: Optional[int] = None  # None: any number
+        self.takes_budget = False
+        try:
+            parameters = inspect.signature(function).parameters.values()
+        except (TypeError, ValueError):
+            return  # Some builtins don't describe their signature
+        positional = [p for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+        self.min_args = sum(p.default is p.empty for p in positional)
+        if not any(p.kind is p.VAR_POSITIONAL for p in parameters):
+            self.max_args = len(positional)
+        self.takes_budget = any(p.name == 'budget' and p.kind is p.KEYWORD_ONLY for p in parameters)
+
+    def __call__(self, interpreter: Any, args: List[Any]) -> Any:
+        if len(args) < self.min_args or (self.max_args is not None and len(args) > self.max_args):
+            if self.max_args is None:
+                expected = f"at least {self.min_args}"
+            elif self.min_args == self.max_args:
+                expected = str(self.max_args)
+            else:
+                expected = f"{self.min_args} to {self.max_args}"
+            raise RuntimeError(f"Function '{self.name}' expects {expected} arguments, got {len(args)}")
+        for arg in args:
+            if arg.__class__ is Text:  # Python code gets plain strings
+                args = [plain(arg) for arg in args]
+                break
+        try:
+            if self.takes_budget:
+                result = self.function(*args, budget=interpreter.budget)
+            else:
+                result = self.function(*args)
+        except (TypeError, ValueError, ArithmeticError) as e:
+            raise RuntimeError(f"{self.name}: {e}")
+        if interpreter.budget is not None:
+            interpreter.budget.check_size(result)
+        return result
+
+    def __repr__(self) -> str:
+        return f"<native function {self.name}>"
+
+class Builtin:
+    """One registry entry"""
+    __slots__ = ('name', 'function', 'arity', 'pure')
+
+    def __init__(self, name: str, function: Callable[[Any, List[Any]], Any],
+                 arity: Optional[int] = None, pure: bool = False):
+        self.name = name
+        self.function = function
+        # Arguments beyond this are not evaluated; None passes them all
+        self.arity = arity
+        # Neither performs I/O nor mutates its arguments (see witcher_purity)
+        self.pure = pure
+
+BUILTINS: Dict[str, Builtin] = {}
+
+def register_builtin(name: str, function: Callable[..., Any], pure: bool = False) -> Builtin:
+    """Make a Python function callable from WitcherScript as `name(...)`
+
+    Pass pure=True only if the function has no side effects and its
+    result depends on nothing but its arguments; user functions that
+    call it can then be memoized.
+    """
+    if not name.isidentifier():
+        raise ValueError(f"Invalid builtin name: {name!r}")
+    if not callable(function):
+        raise TypeError(f"Builtin {name!r} must be callable")
+    builtin = Builtin(name, NativeFunction(name, function), None, pure)
+    BUILTINS[name] = builtin
+    return builtin
+
+def unregister_builtin(name: str):
+    """Remove a builtin, including one of the core ones"""
+    del BUILTINS[name]
+
+# Core builtins
+
+def builtin_medallion(interpreter: Any, args: List[Any]) -> Any:
+    interpreter.output.write_line(' '.join([str(value) for value in args]))
+
+def builtin_sigh(interpreter: Any, args: List[Any]) -> Any:
+    interpreter.output.flush()  # Show pending output before waiting
+    return input(args[0] if args else "")
+
+def builtin_witcher_speed(interpreter: Any, args: List[Any]) -> Any:
+    text, times = str(args[0]), int(args[1])
+    if interpreter.budget is not None:
+        interpreter.budget.check_length(len(text) * times, True)
+    return text * times
+
+def builtin_monster_count(interpreter: Any, args: List[Any]) -> Any:
+    return len(args[0])
+
+def builtin_add_to_bestiary(interpreter: Any, args: List[Any]) -> Any:
+    bestiary = args[0]
+    bestiary.append(args[1])
+    if interpreter.budget is not None:
+        interpreter.budget.check_size(bestiary)
+    return bestiary
+
+def builtin_hunter_instinct(interpreter: Any, args: List[Any]) -> Any:
+    value = args[0]
+    if isinstance(value, bool):
+        return "truth" if value else "falsehood"
+    elif isinstance(value, (int, float)):
+        return "number"
+    elif isinstance(value, TEXT_TYPES):
+        return "text"
+    elif isinstance(value, BESTIARY_TYPES):
+        return "bestiary"
+    else:
+        return "unknown"
+
+def builtin_potion_effect(interpreter: Any, args: List[Any]) -> Any:
+    result = plain(args[0]) + plain(args[1])
+    if interpreter.budget is not None:
+        interpreter.budget.check_size(result)
+    return result
+
+BUILTINS.update((builtin.name, builtin) for builtin in (
+    Builtin('medallion', builtin_medallion),
+    Builtin('sigh', builtin_sigh, 1),
+    Builtin('witcher_speed', builtin_witcher_speed, 2, pure=True),
+    Builtin('monster_count', builtin_monster_count, 1, pure=True),
+    Builtin('add_to_bestiary', builtin_add_to_bestiary, 2),
+    Builtin('hunter_instinct', builtin_hunter_instinct, 1, pure=True),
+    Builtin('potion_effect', builtin_potion_effect, 2, pure=True),
+))
+
+# bestiary_sort sorts in place; the other numeric builtins build new values
+BUILTINS.update({name: Builtin(name, NativeFunction(name, function), None, name != 'bestiary_sort')
+                 for name, function in NUMERIC_BUILTINS.items()})
+
+# The builtins as shipped, before any host registrations; engines may
+# specialize these
+CORE_BUILTINS: Dict[str, Builtin] = dict(BUILTINS)
+
+# Builtins the language has always had: a call by one of these names runs
+# the builtin even where a user definition of the name is visible
+LANGUAGE_BUILTINS = frozenset((
+    'medallion', 'sigh', 'witcher_speed', 'monster_count', 'add_to_bestiary',
+    'hunter_instinct', 'potion_effect',
+))
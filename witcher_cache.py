@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Grimoire Cache
+Stores parsed grimoires in a __witchercache__ directory next to the source,
+so unchanged libraries skip lexing and parsing on later imports.
+
+A cache file holds a header (format version, source size, mtime, SHA-256
+of the source and its absolute path) followed by the AST encoded as nested
+marshal tuples. It is used only when the header still matches the source;
+otherwise the grimoire is re-parsed and the cache rewritten. Each grimoire
+has a single cache file whatever the format version, so an entry from an
+older version is rejected by its header and then overwritten.
+"""
+
+import hashlib
+import marshal
+import os
+import struct
+import tempfile
+from typing import Any, List, Optional
+
+from witcher_interpreter import (
+    ASTNode, Number, String, Boolean, Identifier, BinaryOp, UnaryOp,
+    Assignment, ArrayAssignment, VarDeclaration, FunctionCall, IfStatement,
+    WhileLoop, ForLoop, FunctionDef, ReturnStatement, Array, IndexAccess,
+    Grimoire, TokenType, Parser, create_lexer,
+)
+
+MAGIC = b'WSAC'
+FORMAT_VERSION = 3
+CACHE_DIR = '__witchercache__'
+CACHE_SUFFIX = '.wast'
+
+# magic, format version, source size, source mtime (ns), SHA-256, path length
+HEADER = struct.Struct('<4sHQQ32sH')
+
+# A node's code is its position here; append only, and bump FORMAT_VERSION
+# whenever this table or any node's fields change.
+NODE_TYPES = (
+    Number, String, Boolean, Identifier, BinaryOp, UnaryOp, Assignment,
+    ArrayAssignment, VarDeclaration, FunctionCall, IfStatement, WhileLoop,
+    ForLoop, FunctionDef, ReturnStatement, Array, IndexAccess, Grimoire,
+)
+NODE_CODES = {node_type: code for code, node_type in enumerate(NODE_TYPES)}
+
+# Operators are stored as (OPERATOR_CODE, TokenType name)
+OPERATOR_CODE = -1
+
+def encode(value: Any) -> Any:
+    """Turn an AST value into nested tuples/lists of marshal-able primitives"""
+    if isinstance(value, ASTNode):
+        encoded = (NODE_CODES[type(value)],) + tuple(encode(getattr(value, field)) for field in value.__slots__)
+        line = getattr(value, 'line', None)
+        # A statement's line follows its fields
+        return encoded if line is None else encoded + (line,)
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, TokenType):
+        return (OPERATOR_CODE, value.name)
+    return value
+
+def decode(value: Any) -> Any:
+    """Rebuild the AST value produced by encode"""
+    if isinstance(value, tuple):
+        code = value[0]
+        if code == OPERATOR_CODE:
+            return TokenType[value[1]]
+        node_type = NODE_TYPES[code]
+        fields = len(node_type.__slots__)
+        node = node_type(*[decode(field) for field in value[1:fields + 1]])
+        if len(value) > fields + 1:
+            node.line = value[-1]
+        return node
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+def encode_program(ast: List[ASTNode]) -> bytes:
+    return marshal.dumps(encode(ast))
+
+def decode_program(data: bytes) -> List[ASTNode]:
+    return decode(marshal.loads(data))
+
+def cache_path(source_path: str) -> str:
+    directory, filename = os.path.split(os.path.abspath(source_path))
+    return os.path.join(directory, CACHE_DIR, filename + CACHE_SUFFIX)
+
+def read_source(source_path: str) -> str:
+    with open(source_path, 'r') as f:
+        return f.read()
+
+def source_digest(source: str) -> bytes:
+    return hashlib.sha256(source.encode('utf-8')).digest()
+
+def read_cache(source_path: str, stat: os.stat_result) -> Optional[List[ASTNode]]:
+    """Return the cached AST for `source_path`, or None when missing or stale"""
+    try:
+        with open(cache_path(source_path), 'rb') as f:
+            data = f.read()
+        magic, version, size, mtime_ns, digest, path_length = HEADER.unpack_from(data)
+    except (OSError, struct.error):
+        return None
+
+    path_end = HEADER.size + path_length
+    if (magic != MAGIC or version != FORMAT_VERSION
+            or data[HEADER.size:path_end].decode('utf-8', 'replace') != source_path):
+        return None
+
+    touched = size != stat.st_size or mtime_ns != stat.st_mtime_ns
+    if touched:
+        # Touched since caching; still valid if the content is unchanged
+        try:
+            source = read_source(source_path)
+        except (OSError, UnicodeDecodeError):
+            return None
+        if source_digest(source) != digest:
+            return None
+
+    try:
+        ast = decode_program(data[path_end:])
+    except (ValueError, EOFError, TypeError, IndexError, KeyError):
+        return None
+
+    if touched:
+        # Record the new size and mtime so later loads take the fast path
+        write_cache(source_path, source, stat, ast)
+    return ast
+
+def write_atomic(path: str, data: bytes):
+    """Replace `path` with `data` so readers see the old file or the new one, never a part"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def write_cache(source_path: str, source: str, stat: os.stat_result, ast: List[ASTNode]):
+    """Write the cache file atomically; an unwritable directory just skips caching"""
+    path = cache_path(source_path)
+    encoded_path = source_path.encode('utf-8')
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, stat.st_size, stat.st_mtime_ns,
+                         source_digest(source), len(encoded_path))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, header + encoded_path + encode_program(ast))
+    except OSError:
+        pass
+
+def load_grimoire(source_path: str, lexer_mode: str = 'char') -> List[ASTNode]:
+    """Parse a grimoire, going through its on-disk cache"""
+    source_path = os.path.abspath(source_path)
+    stat = os.stat(source_path)
+
+    ast = read_cache(source_path, stat)
+    if ast is not None:
+        return ast
+
+    source = read_source(source_path)
+    tokens = create_lexer(source, lexer_mode).tokenize()
+    ast = Parser(tokens).parse()
+
+    write_cache(source_path, source, stat, ast)
+    return ast
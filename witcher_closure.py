@@ -0,0 +1,695 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Closure Engine
+Compiles the resolved AST once into a tree of specialized Python closures.
+Every closure takes the current call frame, a list indexed by the slots
+assigned in witcher_resolver and ending with the entries that link it to
+its caller's.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List, Set
+
+from witcher_interpreter import (
+    ASTNode, Number, String, Boolean, BinaryOp, UnaryOp, ArrayAssignment,
+    IfStatement, WhileLoop, ReturnStatement, Array, IndexAccess, Grimoire,
+    TokenType, Interpreter, ReturnValue,
+)
+from witcher_builtins import BUILTINS, CORE_BUILTINS, Builtin, NativeFunction
+from witcher_numeric import BESTIARY_TYPES, divide as exact_divide, float_index, from_literal
+from witcher_resolver import (
+    LocalVariable, FreeVariable, GlobalVariable, LocalStore, GlobalStore, BuiltinCall,
+    ResolvedCall, ResolvedForLoop, ResolvedFunctionDef, UNSET,
+    frame_padding, lookup, resolve, tail_scope,
+)
+from witcher_text import ROPE_MIN, TEXT_TYPES, concat, plain, type_name
+
+# Operators that map directly onto a Python binary operator
+SIMPLE_OPERATORS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.PERCENT: operator.mod,
+    TokenType.EQEQ: operator.eq,
+    TokenType.NEQ: operator.ne,
+    TokenType.LT: operator.lt,
+    TokenType.GT: operator.gt,
+    TokenType.LTEQ: operator.le,
+    TokenType.GTEQ: operator.ge,
+}
+
+# Arguments the specialized core builtins index into
+BUILTIN_ARITY = {
+    'sigh': 0,
+    'witcher_speed': 2,
+    'monster_count': 1,
+    'add_to_bestiary': 2,
+    'hunter_instinct': 1,
+    'potion_effect': 2,
+}
+
+# Statements signal `hunt` by returning a 1-tuple holding the value;
+# every other statement returns None.
+NO_VALUE = (None,)
+
+class TailCall:
+    """Returned by `hunt f(...)` inside a function: the caller's call loop
+    runs `function` on `frame` instead of growing the Python stack"""
+    __slots__ = ('function', 'frame')
+
+    def __init__(self, function: 'CompiledFunction', frame: List[Any]):
+        self.function = function
+        self.frame = frame
+
+class CompiledFunction:
+    """A user function whose body has already been compiled to closures
+
+    The closures are bound to the interpreter that compiled them, so
+    `definition` is kept to compile the function again for another one.
+    """
+    __slots__ = ('name', 'params', 'body', 'padding', 'definition')
+
+    def __init__(self, definition: ResolvedFunctionDef, body: Callable):
+        self.name = definition.name
+        self.params = definition.params
+        self.body = body
+        # Appended to the arguments to make a fresh frame
+        self.padding = frame_padding(definition.params, definition.frame_size, definition.slots)
+        self.definition = definition
+
+def missing_argument(frame):
+    # Builtins index their argument list, so a short call fails the same way
+    raise IndexError("list index out of range")
+
+class ClosureCompiler:
+    """Turns resolved AST nodes into closures with all dispatch decided up front"""
+
+    def __init__(self, interpreter: 'ClosureInterpreter'):
+        self.interpreter = interpreter
+        self.in_function = False  # `hunt f(...)` only becomes a TailCall inside a function
+        self.budgeted = False
+        self.expressions: Dict[type, Callable[[Any], Callable]] = {
+            Number: self.compile_literal,
+            String: self.compile_literal,
+            Boolean: self.compile_literal,
+            LocalVariable: self.compile_local,
+            FreeVariable: self.compile_free,
+            GlobalVariable: self.compile_global,
+            Array: self.compile_array,
+            BinaryOp: self.compile_binary_op,
+            UnaryOp: self.compile_unary_op,
+            LocalStore: self.compile_local_store,
+            GlobalStore: self.compile_global_store,
+            ArrayAssignment: self.compile_array_assignment,
+            BuiltinCall: self.compile_builtin_call,
+            ResolvedCall: self.compile_user_call,
+            IndexAccess: self.compile_index_access,
+        }
+        self.statements: Dict[type, Callable[[Any], Callable]] = {
+            IfStatement: self.compile_if,
+            WhileLoop: self.compile_while,
+            ResolvedForLoop: self.compile_for,
+            ResolvedFunctionDef: self.compile_function_def,
+            ReturnStatement: self.compile_return,
+            Grimoire: self.compile_grimoire,
+            LocalStore: self.compile_local_store_statement,
+            GlobalStore: self.compile_global_store_statement,
+        }
+
+    def compile_program(self, ast: List[ASTNode]) -> Callable:
+        # Budget checks are compiled in only when the interpreter has a budget
+        self.budgeted = self.interpreter.budget is not None
+        statements, bound_names = resolve(ast)
+        self.interpreter.bound_names.update(bound_names)
+        return self.compile_block(statements)
+
+    def compile_block(self, statements: List[ASTNode]) -> Callable:
+        compiled = tuple(self.compile_statement(stmt) for stmt in statements)
+
+        if not compiled:
+            return lambda frame: None
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def block(frame):
+            for stmt in compiled:
+                result = stmt(frame)
+                if result is not None:
+                    return result
+        return block
+
+    def compile_statement(self, node: ASTNode) -> Callable:
+        compiler = self.statements.get(type(node))
+        if compiler:
+            return compiler(node)
+
+        # Expression used as a statement: evaluate and discard the value
+        expr = self.compile_expression(node)
+
+        def statement(frame):
+            expr(frame)
+        return statement
+
+    def compile_expression(self, node: ASTNode) -> Callable:
+        compiler = self.expressions.get(type(node))
+        if compiler:
+            return compiler(node)
+
+        # Statement nodes used as expressions evaluate to nothing
+        stmt = self.compile_statement(node)
+
+        def expression(frame):
+            result = stmt(frame)
+            if result is not None:
+                raise ReturnValue(result[0])
+        return expression
+
+    # Variables
+
+    # `builtin`, if given, is the value of a name nothing binds: the
+    # builtin a call by that name runs when no user binding shadows it
+
+    def compile_global(self, node: GlobalVariable, builtin: Any = None) -> Callable:
+        name = node.name
+        globals_ = self.interpreter.globals
+        error = self.interpreter.error
+
+        def load_global(frame):
+            if name in globals_:
+                return globals_[name]
+            if builtin is not None:
+                return builtin
+            error(f"Undefined variable: {name}")
+        return load_global
+
+    def compile_free(self, node: FreeVariable, builtin: Any = None) -> Callable:
+        name = node.name
+        globals_ = self.interpreter.globals
+        bound_names = self.interpreter.bound_names
+        error = self.interpreter.error
+
+        def load_free(frame):
+            if name in bound_names:
+                value = lookup(frame[-1], name)
+                if value is not UNSET:
+                    return value
+            if name in globals_:
+                return globals_[name]
+            if builtin is not None:
+                return builtin
+            error(f"Undefined variable: {name}")
+        return load_free
+
+    def compile_local(self, node: LocalVariable, builtin: Any = None) -> Callable:
+        slot = node.slot
+        load_free = self.compile_free(FreeVariable(node.name), builtin)
+
+        def load_local(frame):
+            value = frame[slot]
+            if value is UNSET:
+                # Not assigned yet in this call: read it from the callers or the globals
+                return load_free(frame)
+            return value
+        return load_local
+
+    def compile_local_store(self, node: LocalStore) -> Callable:
+        slot = node.slot
+        value_fn = self.compile_expression(node.value)
+
+        def store_local(frame):
+            frame[slot] = value = value_fn(frame)
+            return value
+        return store_local
+
+    def compile_global_store(self, node: GlobalStore) -> Callable:
+        name = node.name
+        value_fn = self.compile_expression(node.value)
+        globals_ = self.interpreter.globals
+
+        def store_global(frame):
+            globals_[name] = value = value_fn(frame)
+            return value
+        return store_global
+
+    def compile_local_store_statement(self, node: LocalStore) -> Callable:
+        slot = node.slot
+        value_fn = self.compile_expression(node.value)
+
+        def store_local(frame):
+            frame[slot] = value_fn(frame)
+        return store_local
+
+    def compile_global_store_statement(self, node: GlobalStore) -> Callable:
+        name = node.name
+        value_fn = self.compile_expression(node.value)
+        globals_ = self.interpreter.globals
+
+        def store_global(frame):
+            globals_[name] = value_fn(frame)
+        return store_global
+
+    def compile_binding(self, target: ASTNode) -> Callable[[Any, Any], None]:
+        """Return a setter(frame, value) for a resolved variable"""
+        if isinstance(target, LocalVariable):
+            slot = target.slot
+
+            def set_local(frame, value):
+                frame[slot] = value
+            return set_local
+
+        name = target.name
+        globals_ = self.interpreter.globals
+
+        def set_global(frame, value):
+            globals_[name] = value
+        return set_global
+
+    # Expressions
+
+    def compile_literal(self, node: ASTNode) -> Callable:
+        value = node.value
+        return lambda frame: value
+
+    def compile_array(self, node: Array) -> Callable:
+        elements = tuple(self.compile_expression(elem) for elem in node.elements)
+        if self.interpreter.typed_bestiaries:
+            return lambda frame: from_literal([elem(frame) for elem in elements])
+        return lambda frame: [elem(frame) for elem in elements]
+
+    def compile_binary_op(self, node: BinaryOp) -> Callable:
+        left = self.compile_expression(node.left)
+        right = self.compile_expression(node.right)
+        op_type = node.op
+        error = self.interpreter.error
+
+        if op_type == TokenType.STAR and self.budgeted:
+            interpreter = self.interpreter
+
+            def budgeted_multiply(frame):
+                l, r = left(frame), right(frame)
+                interpreter.budget.check_repeat(l, r)
+                return l * r
+            return budgeted_multiply
+
+        if op_type in SIMPLE_OPERATORS:
+            op = SIMPLE_OPERATORS[op_type]
+            if isinstance(node.right, Number):
+                constant = node.right.value
+                return lambda frame: op(left(frame), constant)
+            return lambda frame: op(left(frame), right(frame))
+
+        if op_type == TokenType.PLUS:
+            if self.budgeted:
+                interpreter = self.interpreter
+
+                def budgeted_add(frame):
+                    l, r = left(frame), right(frame)
+                    if isinstance(l, str) or isinstance(r, str):
+                        return concat(l, r, interpreter.budget)
+                    interpreter.budget.check_join(l, r)
+                    return l + r
+                return budgeted_add
+
+            def add(frame):
+                l, r = left(frame), right(frame)
+                # Allow string concatenation with type conversion
+                if isinstance(l, str) or isinstance(r, str):
+                    if l.__class__ is str and len(l) < ROPE_MIN:
+                        return l + str(r)
+                    return concat(l, r)
+                return l + r
+            return add
+
+        if op_type == TokenType.SLASH:
+            def divide(frame):
+                l, r = left(frame), right(frame)
+                if r == 0:
+                    error("Division by zero!")
+                return exact_divide(l, r)
+            return divide
+
+        # Both operands are always evaluated, matching the tree-walker
+        if op_type == TokenType.AND:
+            def logical_and(frame):
+                l, r = left(frame), right(frame)
+                return l and r
+            return logical_and
+
+        if op_type == TokenType.OR:
+            def logical_or(frame):
+                l, r = left(frame), right(frame)
+                return l or r
+            return logical_or
+
+        def unknown(frame):
+            left(frame)
+            right(frame)
+        return unknown
+
+    def compile_unary_op(self, node: UnaryOp) -> Callable:
+        operand = self.compile_expression(node.operand)
+
+        if node.op == TokenType.MINUS:
+            return lambda frame: -operand(frame)
+        if node.op == TokenType.NOT:
+            return lambda frame: not operand(frame)
+
+        def unknown(frame):
+            operand(frame)
+        return unknown
+
+    def compile_index_access(self, node: IndexAccess) -> Callable:
+        obj_fn = self.compile_expression(node.obj)
+        index_fn = self.compile_expression(node.index)
+        error = self.interpreter.error
+
+        def index_access(frame):
+            obj = obj_fn(frame)
+            index = index_fn(frame)
+            try:
+                return obj[index]
+            except (IndexError, KeyError, TypeError):
+                try:
+                    return float_index(obj, index)
+                except (IndexError, KeyError, TypeError):
+                    error("Invalid index access")
+        return index_access
+
+    def compile_array_assignment(self, node: ArrayAssignment) -> Callable:
+        obj_fn = self.compile_expression(node.obj)
+        index_fn = self.compile_expression(node.index)
+        value_fn = self.compile_expression(node.value)
+        error = self.interpreter.error
+
+        def array_assignment(frame):
+            obj = obj_fn(frame)
+            index = index_fn(frame)
+            value = value_fn(frame)
+            if isinstance(obj, BESTIARY_TYPES):
+                try:
+                    obj[index] = value
+                except TypeError:
+                    if not isinstance(index, float):
+                        raise
+                    obj[int(index)] = value
+            else:
+                error(f"Cannot index {type_name(obj)}")
+            return value
+        return array_assignment
+
+    # Function calls
+
+    def compile_builtin_call(self, node: BuiltinCall) -> Callable:
+        builtin = BUILTINS[node.name]
+        args = [self.compile_expression(arg) for arg in node.args[:builtin.arity]]
+        specialized = getattr(self, f"compile_builtin_{node.name}", None)
+        # The registered functions check the budget; the specializations don't
+        if specialized is None or builtin is not CORE_BUILTINS.get(node.name) or self.budgeted:
+            return self.compile_registered_builtin(builtin, args)
+        if len(args) < BUILTIN_ARITY.get(node.name, 0):
+            args += [missing_argument] * (BUILTIN_ARITY[node.name] - len(args))
+        return specialized(args)
+
+    def compile_callee(self, node: ResolvedCall) -> Callable:
+        builtin = BUILTINS.get(node.name)
+        if builtin is None:
+            return self.compile_expression(node.function)
+        return self.expressions[type(node.function)](node.function, builtin.function)
+
+    def compile_user_call(self, node: ResolvedCall) -> Callable:
+        name = node.name
+        load = self.compile_callee(node)
+        args = tuple(self.compile_expression(arg) for arg in node.args)
+        arg_count = len(args)
+        interpreter = self.interpreter
+        error = interpreter.error
+
+        def call(frame):
+            func = load(frame)
+            if func.__class__ is not CompiledFunction:
+                if func.__class__ is NativeFunction:
+                    return func(interpreter, [arg(frame) for arg in args])
+                error(f"'{name}' is not a function")
+            if len(func.params) != arg_count:
+                error(f"Function '{name}' expects {len(func.params)} arguments, got {arg_count}")
+
+            # Arguments fill the first slots of the new frame
+            new_frame = [arg(frame) for arg in args]
+            new_frame += func.padding
+            new_frame[-1] = frame
+
+            result = func.body(new_frame)
+            while result.__class__ is TailCall:
+                result = result.function.body(result.frame)
+            return result[0] if result is not None else None
+        return call
+
+    def compile_tail_call(self, node: ResolvedCall) -> Callable:
+        name = node.name
+        load = self.compile_callee(node)
+        args = tuple(self.compile_expression(arg) for arg in node.args)
+        arg_count = len(args)
+        interpreter = self.interpreter
+        error = interpreter.error
+
+        def tail_call(frame):
+            func = load(frame)
+            if func.__class__ is not CompiledFunction:
+                if func.__class__ is NativeFunction:
+                    return (func(interpreter, [arg(frame) for arg in args]),)
+                error(f"'{name}' is not a function")
+            if len(func.params) != arg_count:
+                error(f"Function '{name}' expects {len(func.params)} arguments, got {arg_count}")
+
+            new_frame = [arg(frame) for arg in args]
+            new_frame += func.padding
+            new_frame[-1] = tail_scope(frame)
+            return TailCall(func, new_frame)
+        return tail_call
+
+    def compile_registered_builtin(self, builtin: Builtin, args: List[Callable]) -> Callable:
+        function = builtin.function
+        interpreter = self.interpreter
+
+        def registered_builtin(frame):
+            return function(interpreter, [arg(frame) for arg in args])
+        return registered_builtin
+
+    def compile_builtin_medallion(self, args: List[Callable]) -> Callable:
+        interpreter = self.interpreter
+
+        def medallion(frame):
+            interpreter.output.write_line(' '.join([str(arg(frame)) for arg in args]))
+        return medallion
+
+    def compile_builtin_sigh(self, args: List[Callable]) -> Callable:
+        interpreter = self.interpreter
+        prompt_fn = args[0] if args else (lambda frame: "")
+
+        def sigh(frame):
+            prompt = prompt_fn(frame)
+            interpreter.output.flush()  # Show pending output before waiting
+            return input(prompt)
+        return sigh
+
+    def compile_builtin_witcher_speed(self, args: List[Callable]) -> Callable:
+        text_fn, times_fn = args[0], args[1]
+
+        def witcher_speed(frame):
+            text = str(text_fn(frame))
+            return text * int(times_fn(frame))
+        return witcher_speed
+
+    def compile_builtin_monster_count(self, args: List[Callable]) -> Callable:
+        obj_fn = args[0]
+        return lambda frame: len(obj_fn(frame))
+
+    def compile_builtin_add_to_bestiary(self, args: List[Callable]) -> Callable:
+        bestiary_fn, value_fn = args[0], args[1]
+
+        def add_to_bestiary(frame):
+            bestiary = bestiary_fn(frame)
+            bestiary.append(value_fn(frame))
+            return bestiary
+        return add_to_bestiary
+
+    def compile_builtin_hunter_instinct(self, args: List[Callable]) -> Callable:
+        value_fn = args[0]
+
+        def hunter_instinct(frame):
+            value = value_fn(frame)
+            if isinstance(value, bool):
+                return "truth" if value else "falsehood"
+            elif isinstance(value, (int, float)):
+                return "number"
+            elif isinstance(value, TEXT_TYPES):
+                return "text"
+            elif isinstance(value, BESTIARY_TYPES):
+                return "bestiary"
+            else:
+                return "unknown"
+        return hunter_instinct
+
+    def compile_builtin_potion_effect(self, args: List[Callable]) -> Callable:
+        a_fn, b_fn = args[0], args[1]
+
+        def potion_effect(frame):
+            a = plain(a_fn(frame))
+            return a + plain(b_fn(frame))
+        return potion_effect
+
+    # Statements
+
+    def compile_if(self, node: IfStatement) -> Callable:
+        condition = self.compile_expression(node.condition)
+        then_body = self.compile_block(node.then_body)
+
+        if not node.else_body:
+            def if_statement(frame):
+                if condition(frame):
+                    return then_body(frame)
+            return if_statement
+
+        else_body = self.compile_block(node.else_body)
+
+        def if_else_statement(frame):
+            if condition(frame):
+                return then_body(frame)
+            return else_body(frame)
+        return if_else_statement
+
+    def compile_while(self, node: WhileLoop) -> Callable:
+        condition = self.compile_expression(node.condition)
+        body = self.compile_block(node.body)
+
+        if self.budgeted:
+            interpreter = self.interpreter
+
+            def budgeted_while_loop(frame):
+                budget = interpreter.budget
+                while condition(frame):
+                    result = body(frame)
+                    if result is not None:
+                        return result
+                    budget.step()
+            return budgeted_while_loop
+
+        def while_loop(frame):
+            while condition(frame):
+                result = body(frame)
+                if result is not None:
+                    return result
+        return while_loop
+
+    def compile_for(self, node: ResolvedForLoop) -> Callable:
+        bind = self.compile_binding(node.var)
+        iterable_fn = self.compile_expression(node.iterable)
+        body = self.compile_block(node.body)
+        error = self.interpreter.error
+
+        if self.budgeted:
+            interpreter = self.interpreter
+
+            def budgeted_for_loop(frame):
+                iterable = iterable_fn(frame)
+                if not isinstance(iterable, BESTIARY_TYPES):
+                    error(f"Cannot iterate over {type_name(iterable)}")
+
+                budget = interpreter.budget
+                for item in iterable:
+                    bind(frame, item)
+                    result = body(frame)
+                    if result is not None:
+                        return result
+                    budget.step()
+            return budgeted_for_loop
+
+        def for_loop(frame):
+            iterable = iterable_fn(frame)
+            if not isinstance(iterable, BESTIARY_TYPES):
+                error(f"Cannot iterate over {type_name(iterable)}")
+
+            for item in iterable:
+                bind(frame, item)
+                result = body(frame)
+                if result is not None:
+                    return result
+        return for_loop
+
+    def compile_function_def(self, node: ResolvedFunctionDef) -> Callable:
+        function = self.compile_function(node)
+        bind = self.compile_binding(node.target)
+
+        def function_def(frame):
+            bind(frame, function)
+        return function_def
+
+    def compile_function(self, node: ResolvedFunctionDef) -> CompiledFunction:
+        outer = self.in_function
+        self.in_function = True
+        body = self.compile_block(node.body)
+        self.in_function = outer
+        if self.budgeted:
+            body = self.compile_budgeted_body(body)
+        return CompiledFunction(node, body)
+
+    def compile_budgeted_body(self, body: Callable) -> Callable:
+        # Closures keep no call stack, so the budget counts the depth. An
+        # error ends the whole run, so a failed call needs no unwinding.
+        interpreter = self.interpreter
+
+        def budgeted_body(frame):
+            budget = interpreter.budget
+            budget.depth += 1
+            budget.enter(budget.depth)
+            result = body(frame)
+            budget.depth -= 1
+            return result
+        return budgeted_body
+
+    def compile_return(self, node: ReturnStatement) -> Callable:
+        if not node.value:
+            return lambda frame: NO_VALUE
+        if self.in_function and isinstance(node.value, ResolvedCall):
+            return self.compile_tail_call(node.value)
+        value_fn = self.compile_expression(node.value)
+        return lambda frame: (value_fn(frame),)
+
+    def compile_grimoire(self, node: Grimoire) -> Callable:
+        path = node.path
+        import_grimoire = self.interpreter.import_grimoire
+
+        def grimoire(frame):
+            import_grimoire(path)
+        return grimoire
+
+class ClosureInterpreter(Interpreter):
+    """Interpreter that runs closure-compiled programs instead of walking the AST"""
+
+    def __init__(self):
+        super().__init__()
+        # Names a function compiled here binds as a local, see witcher_resolver
+        self.bound_names: Set[str] = set()
+        self.compiler = ClosureCompiler(self)
+
+    def interpret(self, ast: List[ASTNode]):
+        self.run(self.compiler.compile_program(ast))
+
+    def evaluate(self, node: ASTNode) -> Any:
+        # Streamed statements arrive one at a time through here
+        self.run(self.compiler.compile_program([node]))
+
+    def adopt(self, module: Interpreter):
+        # Functions compiled for the grimoire would read its globals and
+        # write to its output, so they are compiled again for this interpreter
+        self.bound_names.update(module.bound_names)
+        for name, value in module.globals.items():
+            if value.__class__ is CompiledFunction:
+                value = self.compiler.compile_function(value.definition)
+            self.globals[name] = value
+
+    def run(self, program: Callable):
+        # The top level has no locals, so it runs without a frame
+        result = program(None)
+        if result is not None:
+            # `hunt` outside a function behaves as in the tree-walker
+            raise ReturnValue(result[0])
@@ -5,9 +5,18 @@ A programming language inspired by The Witcher 3
 """
 
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import sys
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from collections import OrderedDict, deque
 from enum import Enum
 
+from witcher_budget import Budget, BudgetExceeded
+from witcher_builtins import BUILTINS, LANGUAGE_BUILTINS, Builtin, NativeFunction
+from witcher_numeric import BESTIARY_TYPES, divide, float_index, from_literal
+from witcher_output import OutputSink
+from witcher_std import STD_GLOBALS, STD_GRIMOIRE
+from witcher_text import ROPE_MIN, concat, type_name
+
 class TokenType(Enum):
     # Literals
     NUMBER = "NUMBER"
@@ -61,6 +70,8 @@ class TokenType(Enum):
     EOF = "EOF"
 
 class Token:
+    __slots__ = ('type', 'value', 'line', 'col')
+
     def __init__(self, type_: TokenType, value: Any, line: int, col: int):
         self.type = type_
         self.value = value
@@ -164,7 +175,7 @@ class Lexer:
 
         if '.' in num_str:
             return float(num_str)
-        return float(num_str)
+        return int(num_str)
 
     def read_identifier(self) -> str:
         ident = ""
@@ -174,6 +185,11 @@ class Lexer:
         return ident
 
     def tokenize(self) -> List[Token]:
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self) -> Iterator[Token]:
+        """Yield tokens lazily, one at a time"""
         while self.pos < len(self.source):
             self.skip_whitespace()
 
@@ -189,7 +205,7 @@ class Lexer:
 
             # Newline
             if self.current_char() == '\n':
-                self.tokens.append(Token(TokenType.NEWLINE, '\n', line, col))
+                yield Token(TokenType.NEWLINE, '\n', line, col)
                 self.advance()
                 continue
 
@@ -197,194 +213,370 @@ class Lexer:
             if self.current_char() in '"\'':
                 quote = self.current_char()
                 value = self.read_string(quote)
-                self.tokens.append(Token(TokenType.TEXT, value, line, col))
+                yield Token(TokenType.TEXT, value, line, col)
                 continue
 
             # Numbers
             if self.current_char().isdigit():
                 value = self.read_number()
-                self.tokens.append(Token(TokenType.NUMBER, value, line, col))
+                yield Token(TokenType.NUMBER, value, line, col)
                 continue
 
             # Identifiers and keywords
             if self.current_char().isalpha() or self.current_char() == '_':
-                ident = self.read_identifier()
+                # Interned so repeated names share one string
+                ident = sys.intern(self.read_identifier())
                 token_type = self.KEYWORDS.get(ident, TokenType.IDENTIFIER)
-                self.tokens.append(Token(token_type, ident, line, col))
+                yield Token(token_type, ident, line, col)
                 continue
 
             # Operators and delimiters
             ch = self.current_char()
 
             if ch == '+':
-                self.tokens.append(Token(TokenType.PLUS, '+', line, col))
+                yield Token(TokenType.PLUS, '+', line, col)
                 self.advance()
             elif ch == '-':
                 if self.peek_char() == '>':
-                    self.tokens.append(Token(TokenType.ARROW, '->', line, col))
+                    yield Token(TokenType.ARROW, '->', line, col)
                     self.advance()
                     self.advance()
                 else:
-                    self.tokens.append(Token(TokenType.MINUS, '-', line, col))
+                    yield Token(TokenType.MINUS, '-', line, col)
                     self.advance()
             elif ch == '*':
-                self.tokens.append(Token(TokenType.STAR, '*', line, col))
+                yield Token(TokenType.STAR, '*', line, col)
                 self.advance()
             elif ch == '/':
-                self.tokens.append(Token(TokenType.SLASH, '/', line, col))
+                yield Token(TokenType.SLASH, '/', line, col)
                 self.advance()
             elif ch == '%':
-                self.tokens.append(Token(TokenType.PERCENT, '%', line, col))
+                yield Token(TokenType.PERCENT, '%', line, col)
                 self.advance()
             elif ch == '=':
                 if self.peek_char() == '=':
-                    self.tokens.append(Token(TokenType.EQEQ, '==', line, col))
+                    yield Token(TokenType.EQEQ, '==', line, col)
                     self.advance()
                     self.advance()
                 else:
-                    self.tokens.append(Token(TokenType.EQ, '=', line, col))
+                    yield Token(TokenType.EQ, '=', line, col)
                     self.advance()
             elif ch == '!':
                 if self.peek_char() == '=':
-                    self.tokens.append(Token(TokenType.NEQ, '!=', line, col))
+                    yield Token(TokenType.NEQ, '!=', line, col)
                     self.advance()
                     self.advance()
                 else:
-                    self.tokens.append(Token(TokenType.NOT, '!', line, col))
+                    yield Token(TokenType.NOT, '!', line, col)
                     self.advance()
             elif ch == '<':
                 if self.peek_char() == '=':
-                    self.tokens.append(Token(TokenType.LTEQ, '<=', line, col))
+                    yield Token(TokenType.LTEQ, '<=', line, col)
                     self.advance()
                     self.advance()
                 else:
-                    self.tokens.append(Token(TokenType.LT, '<', line, col))
+                    yield Token(TokenType.LT, '<', line, col)
                     self.advance()
             elif ch == '>':
                 if self.peek_char() == '=':
-                    self.tokens.append(Token(TokenType.GTEQ, '>=', line, col))
+                    yield Token(TokenType.GTEQ, '>=', line, col)
                     self.advance()
                     self.advance()
                 else:
-                    self.tokens.append(Token(TokenType.GT, '>', line, col))
+                    yield Token(TokenType.GT, '>', line, col)
                     self.advance()
             elif ch == '(':
-                self.tokens.append(Token(TokenType.LPAREN, '(', line, col))
+                yield Token(TokenType.LPAREN, '(', line, col)
                 self.advance()
             elif ch == ')':
-                self.tokens.append(Token(TokenType.RPAREN, ')', line, col))
+                yield Token(TokenType.RPAREN, ')', line, col)
                 self.advance()
             elif ch == '{':
-                self.tokens.append(Token(TokenType.LBRACE, '{', line, col))
+                yield Token(TokenType.LBRACE, '{', line, col)
                 self.advance()
             elif ch == '}':
-                self.tokens.append(Token(TokenType.RBRACE, '}', line, col))
+                yield Token(TokenType.RBRACE, '}', line, col)
                 self.advance()
             elif ch == '[':
-                self.tokens.append(Token(TokenType.LBRACKET, '[', line, col))
+                yield Token(TokenType.LBRACKET, '[', line, col)
                 self.advance()
             elif ch == ']':
-                self.tokens.append(Token(TokenType.RBRACKET, ']', line, col))
+                yield Token(TokenType.RBRACKET, ']', line, col)
                 self.advance()
             elif ch == ',':
-                self.tokens.append(Token(TokenType.COMMA, ',', line, col))
+                yield Token(TokenType.COMMA, ',', line, col)
                 self.advance()
             else:
                 self.error(f"Unexpected character: {ch}")
 
-        self.tokens.append(Token(TokenType.EOF, None, self.line, self.col))
-        return self.tokens
+        yield Token(TokenType.EOF, None, self.line, self.col)
+
+class RegexLexer(Lexer):
+    """Single-pass lexer driven by one compiled master regular expression.
+
+    Produces the same Token stream as Lexer, matching whole tokens at a
+    time instead of advancing character by character.
+    """
+
+    OPERATORS = {
+        '->': TokenType.ARROW,
+        '==': TokenType.EQEQ,
+        '!=': TokenType.NEQ,
+        '<=': TokenType.LTEQ,
+        '>=': TokenType.GTEQ,
+        '+': TokenType.PLUS,
+        '-': TokenType.MINUS,
+        '*': TokenType.STAR,
+        '/': TokenType.SLASH,
+        '%': TokenType.PERCENT,
+        '=': TokenType.EQ,
+        '!': TokenType.NOT,
+        '<': TokenType.LT,
+        '>': TokenType.GT,
+        '(': TokenType.LPAREN,
+        ')': TokenType.RPAREN,
+        '{': TokenType.LBRACE,
+        '}': TokenType.RBRACE,
+        '[': TokenType.LBRACKET,
+        ']': TokenType.RBRACKET,
+        ',': TokenType.COMMA,
+    }
+
+    TOKEN_PATTERN = re.compile(r'''
+        (?P<NEWLINE>\n)
+      | (?P<SKIP>[ \t\r]+|\#[^\n]*)
+      | (?P<NUMBER>\d[\d.]*)
+      | (?P<NAME>[^\W\d]\w*)
+      | (?P<TEXT>"(?:[^"\\]|\\[\s\S])*"|'(?:[^'\\]|\\[\s\S])*')
+      | (?P<UNTERMINATED>["'])
+      | (?P<OPERATOR>->|==|!=|<=|>=|[-+*/%=!<>(){}\[\],])
+      | (?P<MISMATCH>.)
+    ''', re.VERBOSE)
+
+    ESCAPE_PATTERN = re.compile(r'\\([\s\S])')
+    ESCAPES = {'n': '\n', 't': '\t'}
+
+    def unescape(self, match) -> str:
+        ch = match.group(1)
+        return self.ESCAPES.get(ch, ch)
+
+    def iter_tokens(self) -> Iterator[Token]:
+        intern = sys.intern
+        keywords = self.KEYWORDS
+        operators = self.OPERATORS
+        line = 1
+        line_start = 0
+
+        for match in self.TOKEN_PATTERN.finditer(self.source):
+            kind = match.lastgroup
+            value = match.group()
+            start = match.start()
+
+            if kind == 'SKIP':
+                continue
+            elif kind == 'NAME':
+                yield Token(keywords.get(value, TokenType.IDENTIFIER), intern(value), line, start - line_start + 1)
+            elif kind == 'OPERATOR':
+                yield Token(operators[value], value, line, start - line_start + 1)
+            elif kind == 'NEWLINE':
+                yield Token(TokenType.NEWLINE, value, line, start - line_start + 1)
+                line += 1
+                line_start = start + 1
+            elif kind == 'NUMBER':
+                yield Token(TokenType.NUMBER, float(value) if '.' in value else int(value),
+                            line, start - line_start + 1)
+            elif kind == 'TEXT':
+                text = value[1:-1]
+                if '\\' in text:
+                    text = self.ESCAPE_PATTERN.sub(self.unescape, text)
+                yield Token(TokenType.TEXT, text, line, start - line_start + 1)
+                # Strings may span lines
+                newlines = value.count('\n')
+                if newlines:
+                    line += newlines
+                    line_start = start + value.rindex('\n') + 1
+            else:
+                if kind == 'UNTERMINATED':
+                    # The character lexer reports this at the end of the source
+                    start = len(self.source)
+                    line += self.source.count('\n', line_start, start)
+                    line_start = self.source.rfind('\n', 0, start) + 1
+                    message = "Unterminated string"
+                else:
+                    message = f"Unexpected character: {value}"
+                self.line, self.col = line, start - line_start + 1
+                self.error(message)
+
+        self.line = line
+        self.col = len(self.source) - line_start + 1
+        yield Token(TokenType.EOF, None, self.line, self.col)
+
+LEXERS = ('char', 'regex')
+
+def create_lexer(source: str, mode: str = 'char') -> Lexer:
+    """Create a lexer for the given mode"""
+    if mode == 'char':
+        return Lexer(source)
+    elif mode == 'regex':
+        return RegexLexer(source)
+    raise ValueError(f"Unknown lexer: {mode}")
+
+class TokenStream:
+    """Pulls tokens lazily from an iterator, buffering only the lookahead asked for"""
+
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = iter(tokens)
+        self.buffer: Deque[Token] = deque()
+        self.last: Optional[Token] = None
+        self.eof: Optional[Token] = None
+
+    def peek(self, offset: int = 0) -> Token:
+        while len(self.buffer) <= offset:
+            if self.eof:
+                return self.eof
+            token = next(self.tokens, None)
+            if token is None:
+                # Source ended without an EOF token; supply one
+                line, col = (self.last.line, self.last.col) if self.last else (1, 1)
+                token = Token(TokenType.EOF, None, line, col)
+            if token.type == TokenType.EOF:
+                self.eof = token
+            self.last = token
+            self.buffer.append(token)
+        return self.buffer[offset]
+
+    def advance(self):
+        # EOF stays current once reached
+        if self.peek().type != TokenType.EOF:
+            self.buffer.popleft()
 
 # AST Nodes
 class ASTNode:
-    pass
+    # Statements record the source line they start on; other nodes leave it unset
+    __slots__ = ('line',)
 
 class Number(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value: float):
         self.value = value
 
 class String(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value: str):
         self.value = value
 
 class Boolean(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value: bool):
         self.value = value
 
 class Identifier(ASTNode):
+    __slots__ = ('name',)
+
     def __init__(self, name: str):
         self.name = name
 
 class BinaryOp(ASTNode):
-    def __init__(self, left: ASTNode, op: Token, right: ASTNode):
+    __slots__ = ('left', 'op', 'right')
+
+    def __init__(self, left: ASTNode, op: TokenType, right: ASTNode):
         self.left = left
-        self.op = op
+        self.op = op  # The operator's TokenType, not the whole token
         self.right = right
 
 class UnaryOp(ASTNode):
-    def __init__(self, op: Token, operand: ASTNode):
+    __slots__ = ('op', 'operand')
+
+    def __init__(self, op: TokenType, operand: ASTNode):
         self.op = op
         self.operand = operand
 
 class Assignment(ASTNode):
+    __slots__ = ('name', 'value')
+
     def __init__(self, name: str, value: ASTNode):
         self.name = name
         self.value = value
 
 class ArrayAssignment(ASTNode):
+    __slots__ = ('obj', 'index', 'value')
+
     def __init__(self, obj: ASTNode, index: ASTNode, value: ASTNode):
         self.obj = obj
         self.index = index
         self.value = value
 
 class VarDeclaration(ASTNode):
+    __slots__ = ('name', 'value', 'is_constant')
+
     def __init__(self, name: str, value: ASTNode, is_constant: bool = False):
         self.name = name
         self.value = value
         self.is_constant = is_constant
 
 class FunctionCall(ASTNode):
+    __slots__ = ('name', 'args')
+
     def __init__(self, name: str, args: List[ASTNode]):
         self.name = name
         self.args = args
 
 class IfStatement(ASTNode):
+    __slots__ = ('condition', 'then_body', 'else_body')
+
     def __init__(self, condition: ASTNode, then_body: List[ASTNode], else_body: Optional[List[ASTNode]] = None):
         self.condition = condition
         self.then_body = then_body
         self.else_body = else_body
 
 class WhileLoop(ASTNode):
+    __slots__ = ('condition', 'body')
+
     def __init__(self, condition: ASTNode, body: List[ASTNode]):
         self.condition = condition
         self.body = body
 
 class ForLoop(ASTNode):
+    __slots__ = ('var', 'iterable', 'body')
+
     def __init__(self, var: str, iterable: ASTNode, body: List[ASTNode]):
         self.var = var
         self.iterable = iterable
         self.body = body
 
 class FunctionDef(ASTNode):
+    __slots__ = ('name', 'params', 'body')
+
     def __init__(self, name: str, params: List[str], body: List[ASTNode]):
         self.name = name
         self.params = params
         self.body = body
 
 class ReturnStatement(ASTNode):
+    __slots__ = ('value',)
+
     def __init__(self, value: Optional[ASTNode] = None):
         self.value = value
 
 class Array(ASTNode):
+    __slots__ = ('elements',)
+
     def __init__(self, elements: List[ASTNode]):
         self.elements = elements
 
 class IndexAccess(ASTNode):
+    __slots__ = ('obj', 'index')
+
     def __init__(self, obj: ASTNode, index: ASTNode):
         self.obj = obj
         self.index = index
 
 class Grimoire(ASTNode):
+    __slots__ = ('path',)
+
     def __init__(self, path: str):
         self.path = path
 
@@ -423,41 +615,46 @@ class Parser:
         return token
 
     def parse(self) -> List[ASTNode]:
-        statements = []
+        return list(self.parse_statements())
+
+    def parse_statements(self) -> Iterator[ASTNode]:
+        """Yield top-level statements as soon as each one is parsed"""
         self.skip_newlines()
 
         while self.current_token().type != TokenType.EOF:
             stmt = self.parse_statement()
             if stmt:
-                statements.append(stmt)
+                yield stmt
             self.skip_newlines()
 
-        return statements
-
     def parse_statement(self) -> Optional[ASTNode]:
         self.skip_newlines()
         token = self.current_token()
 
         if token.type == TokenType.CONTRACT:
-            return self.parse_var_declaration(is_constant=False)
+            stmt = self.parse_var_declaration(is_constant=False)
         elif token.type == TokenType.MUTATION:
-            return self.parse_var_declaration(is_constant=True)
+            stmt = self.parse_var_declaration(is_constant=True)
         elif token.type == TokenType.IGNI:
-            return self.parse_if_statement()
+            stmt = self.parse_if_statement()
         elif token.type == TokenType.QUEN:
-            return self.parse_while_loop()
+            stmt = self.parse_while_loop()
         elif token.type == TokenType.YRDEN:
-            return self.parse_for_loop()
+            stmt = self.parse_for_loop()
         elif token.type == TokenType.AARD:
-            return self.parse_function_def()
+            stmt = self.parse_function_def()
         elif token.type == TokenType.HUNT:
-            return self.parse_return_statement()
+            stmt = self.parse_return_statement()
         elif token.type == TokenType.MEDALLION:
-            return self.parse_print_statement()
+            stmt = self.parse_print_statement()
         elif token.type == TokenType.GRIMOIRE:
-            return self.parse_grimoire_statement()
+            stmt = self.parse_grimoire_statement()
         else:
-            return self.parse_expression_statement()
+            stmt = self.parse_expression_statement()
+
+        if stmt:
+            stmt.line = token.line
+        return stmt
 
     def parse_var_declaration(self, is_constant: bool = False) -> VarDeclaration:
         keyword_token = self.current_token()
@@ -618,7 +815,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             right = self.parse_and_expression()
-            left = BinaryOp(left, op, right)
+            left = BinaryOp(left, op.type, right)
 
         return left
 
@@ -629,7 +826,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             right = self.parse_equality()
-            left = BinaryOp(left, op, right)
+            left = BinaryOp(left, op.type, right)
 
         return left
 
@@ -640,7 +837,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             right = self.parse_comparison()
-            left = BinaryOp(left, op, right)
+            left = BinaryOp(left, op.type, right)
 
         return left
 
@@ -651,7 +848,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             right = self.parse_additive()
-            left = BinaryOp(left, op, right)
+            left = BinaryOp(left, op.type, right)
 
         return left
 
@@ -662,7 +859,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             right = self.parse_multiplicative()
-            left = BinaryOp(left, op, right)
+            left = BinaryOp(left, op.type, right)
 
         return left
 
@@ -673,7 +870,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             right = self.parse_unary()
-            left = BinaryOp(left, op, right)
+            left = BinaryOp(left, op.type, right)
 
         return left
 
@@ -682,7 +879,7 @@ class Parser:
             op = self.current_token()
             self.advance()
             operand = self.parse_unary()
-            return UnaryOp(op, operand)
+            return UnaryOp(op.type, operand)
 
         return self.parse_postfix()
 
@@ -771,15 +968,166 @@ class Parser:
         else:
             self.error(f"Unexpected token: {token.type.name}")
 
+class StreamingParser(Parser):
+    """Parser that reads from a lazy TokenStream instead of a token list"""
+
+    def __init__(self, tokens: Iterable[Token]):
+        self.stream = tokens if isinstance(tokens, TokenStream) else TokenStream(tokens)
+
+    def current_token(self) -> Token:
+        return self.stream.peek()
+
+    def peek_token(self, offset: int = 1) -> Token:
+        return self.stream.peek(offset)
+
+    def advance(self):
+        self.stream.advance()
+
 class ReturnValue(Exception):
     def __init__(self, value: Any):
         self.value = value
 
+class Return:
+    """What a `hunt` statement evaluates to. Blocks stop at it and hand it up
+    to call_function. `call` is the bound (function, locals) of a tail call
+    still to run, or None."""
+    __slots__ = ('value', 'call')
+
+    def __init__(self, value: Any, call: Optional[Tuple['FunctionDef', Dict[str, Any]]] = None):
+        self.value = value
+        self.call = call
+
+class MemoCache:
+    """Bounded LRU of user function results, keyed by function and arguments"""
+
+    # Returned by get() when the key is not cached
+    MISSING = object()
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: 'OrderedDict[Tuple[Any, ...], Any]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Tuple[Any, ...]) -> Any:
+        entries = self.entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return MemoCache.MISSING
+
+    def put(self, key: Tuple[Any, ...], value: Any):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+# Values of these types are immutable, so a cached result can be handed out again
+MEMO_TYPES = (float, int, str, bool, type(None))
+
+class GrimoireRegistry:
+    """Grimoires loaded by one top-level interpreter and its grimoires
+
+    A grimoire runs once per registry, in its own global scope, and each
+    importer receives a copy of the globals it ended up with. Every
+    top-level interpreter starts with a registry of its own, so separate
+    runs never share a grimoire's globals. `loading` is the stack of
+    grimoires whose import is still in progress; finding a path on it
+    again means the imports form a cycle.
+
+    `parsed`, when given, keeps parsed grimoires in memory and can be
+    shared by several registries, so a process that runs many programs,
+    each with a fresh registry, parses every grimoire only once.
+    """
+
+    def __init__(self, parsed: Optional[Dict[Tuple[str, str, bool], Tuple[Tuple[int, int], List[ASTNode]]]] = None):
+        self.modules: Dict[str, 'Interpreter'] = {}
+        self.loading: List[str] = []
+        self.parsed = parsed
+
+    def load(self, interpreter: 'Interpreter', abs_path: str, path: str) -> 'Interpreter':
+        """Return the interpreter a grimoire ran in, running it on first use"""
+        if abs_path in self.modules:
+            return self.modules[abs_path]
+
+        if abs_path in self.loading:
+            cycle = self.loading[self.loading.index(abs_path):] + [abs_path]
+            interpreter.error("Circular import detected: " + " -> ".join(cycle))
+
+        self.loading.append(abs_path)
+        try:
+            module = interpreter.create_module_interpreter()
+            module.interpret(self.parse(module, abs_path))
+        except BudgetExceeded:
+            raise  # Belongs to the whole run, not to this import
+        except (SyntaxError, RuntimeError) as e:
+            interpreter.error(f"Error importing {path}: {e}")
+        finally:
+            self.loading.pop()
+
+        self.modules[abs_path] = module
+        return module
+
+    def parse(self, module: 'Interpreter', abs_path: str) -> List[ASTNode]:
+        """Parsed grimoire, from `parsed` while the file's size and mtime match"""
+        if self.parsed is None:
+            return module.parse_grimoire(abs_path)
+
+        import os
+        stat = os.stat(abs_path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        key = (abs_path, module.lexer_mode, module.optimize)
+        entry = self.parsed.get(key)
+        if entry is None or entry[0] != stamp:
+            entry = self.parsed[key] = (stamp, module.parse_grimoire(abs_path))
+        return entry[1]
+
+    def clear(self):
+        """Forget every loaded grimoire so the next import re-reads it"""
+        self.modules.clear()
+        if self.parsed is not None:
+            self.parsed.clear()
+
+# Parsed grimoires, shared by the registries of every interpreter in the process
+parsed_grimoires: Dict[Tuple[str, str, bool], Tuple[Tuple[int, int], List[ASTNode]]] = {}
+
 class Interpreter:
+    # Lexer used for grimoire imports, see create_lexer
+    lexer_mode = 'char'
+    # Keep parsed grimoires in __witchercache__ directories, see witcher_cache
+    grimoire_cache = True
+    # Run imported grimoires through witcher_optimizer
+    optimize = False
+    # Results kept for pure user functions (see witcher_purity); 0 disables memoization
+    memo_size = 4096
+    # Store all-number bestiary literals unboxed, see witcher_numeric
+    typed_bestiaries = False
+    # Limits on steps, time, sizes and call depth, see witcher_budget; None checks nothing
+    budget: Optional[Budget] = None
+
     def __init__(self):
         self.globals: Dict[str, Any] = {}
         self.locals_stack: List[Dict[str, Any]] = []
-        self.imported_files: set = set()  # Track imported files to avoid circular imports
+        self.memo = MemoCache(self.memo_size)
+        self.purity: Dict[FunctionDef, bool] = {}
+        self.output = OutputSink()  # Where medallion writes
+        # Where imported grimoires are looked up and recorded
+        self.registry = GrimoireRegistry(parsed_grimoires)
+
+    @property
+    def memo_hits(self) -> int:
+        return self.memo.hits
+
+    @property
+    def memo_misses(self) -> int:
+        return self.memo.misses
 
     def error(self, message: str):
         raise RuntimeError(message)
@@ -806,7 +1154,26 @@ class Interpreter:
 
     def interpret(self, ast: List[ASTNode]):
         for node in ast:
-            self.evaluate(node)
+            self.execute_top_level(node)
+
+    def interpret_stream(self, statements: Iterable[ASTNode]):
+        """Execute each top-level statement as soon as it has been parsed"""
+        for node in statements:
+            self.execute_top_level(node)
+
+    def execute_top_level(self, node: ASTNode):
+        result = self.evaluate(node)
+        if result.__class__ is Return:
+            # `hunt` outside a function has no caller, so it escapes as an exception
+            raise ReturnValue(result.value)
+
+    def execute_block(self, statements: List[ASTNode]) -> Optional[Return]:
+        """Run statements in order, stopping at the first `hunt`"""
+        for stmt in statements:
+            result = self.evaluate(stmt)
+            if result.__class__ is Return:
+                return result
+        return None
 
     def evaluate(self, node: ASTNode) -> Any:
         if isinstance(node, Number):
@@ -822,50 +1189,59 @@ class Interpreter:
             return self.get_variable(node.name)
 
         elif isinstance(node, Array):
-            return [self.evaluate(elem) for elem in node.elements]
+            values = [self.evaluate(elem) for elem in node.elements]
+            if self.typed_bestiaries:
+                return from_literal(values)
+            return values
 
         elif isinstance(node, BinaryOp):
             left = self.evaluate(node.left)
             right = self.evaluate(node.right)
 
-            if node.op.type == TokenType.PLUS:
+            if node.op == TokenType.PLUS:
                 # Allow string concatenation with type conversion
                 if isinstance(left, str) or isinstance(right, str):
-                    return str(left) + str(right)
+                    if left.__class__ is str and len(left) < ROPE_MIN and self.budget is None:
+                        return left + str(right)
+                    return concat(left, right, self.budget)
+                if self.budget is not None:
+                    self.budget.check_join(left, right)
                 return left + right
-            elif node.op.type == TokenType.MINUS:
+            elif node.op == TokenType.MINUS:
                 return left - right
-            elif node.op.type == TokenType.STAR:
+            elif node.op == TokenType.STAR:
+                if self.budget is not None:
+                    self.budget.check_repeat(left, right)
                 return left * right
-            elif node.op.type == TokenType.SLASH:
+            elif node.op == TokenType.SLASH:
                 if right == 0:
                     self.error("Division by zero!")
-                return left / right
-            elif node.op.type == TokenType.PERCENT:
+                return divide(left, right)
+            elif node.op == TokenType.PERCENT:
                 return left % right
-            elif node.op.type == TokenType.EQEQ:
+            elif node.op == TokenType.EQEQ:
                 return left == right
-            elif node.op.type == TokenType.NEQ:
+            elif node.op == TokenType.NEQ:
                 return left != right
-            elif node.op.type == TokenType.LT:
+            elif node.op == TokenType.LT:
                 return left < right
-            elif node.op.type == TokenType.GT:
+            elif node.op == TokenType.GT:
                 return left > right
-            elif node.op.type == TokenType.LTEQ:
+            elif node.op == TokenType.LTEQ:
                 return left <= right
-            elif node.op.type == TokenType.GTEQ:
+            elif node.op == TokenType.GTEQ:
                 return left >= right
-            elif node.op.type == TokenType.AND:
+            elif node.op == TokenType.AND:
                 return left and right
-            elif node.op.type == TokenType.OR:
+            elif node.op == TokenType.OR:
                 return left or right
 
         elif isinstance(node, UnaryOp):
             operand = self.evaluate(node.operand)
 
-            if node.op.type == TokenType.MINUS:
+            if node.op == TokenType.MINUS:
                 return -operand
-            elif node.op.type == TokenType.NOT:
+            elif node.op == TokenType.NOT:
                 return not operand
 
         elif isinstance(node, VarDeclaration):
@@ -883,13 +1259,15 @@ class Interpreter:
             index = self.evaluate(node.index)
             value = self.evaluate(node.value)
             
-            if isinstance(index, float):
-                index = int(index)
-            
-            if isinstance(obj, list):
-                obj[index] = value
+            if isinstance(obj, BESTIARY_TYPES):
+                try:
+                    obj[index] = value
+                except TypeError:
+                    if not isinstance(index, float):
+                        raise
+                    obj[int(index)] = value
             else:
-                self.error(f"Cannot index {type(obj).__name__}")
+                self.error(f"Cannot index {type_name(obj)}")
             
             return value
 
@@ -897,29 +1275,39 @@ class Interpreter:
             condition = self.evaluate(node.condition)
 
             if condition:
-                for stmt in node.then_body:
-                    self.evaluate(stmt)
+                return self.execute_block(node.then_body)
             elif node.else_body:
-                for stmt in node.else_body:
-                    self.evaluate(stmt)
+                return self.execute_block(node.else_body)
 
         elif isinstance(node, WhileLoop):
+            budget = self.budget
             while self.evaluate(node.condition):
-                for stmt in node.body:
-                    self.evaluate(stmt)
+                result = self.execute_block(node.body)
+                if result is not None:
+                    return result
+                if budget is not None:
+                    budget.step()
 
         elif isinstance(node, ForLoop):
             iterable = self.evaluate(node.iterable)
 
-            if not isinstance(iterable, list):
-                self.error(f"Cannot iterate over {type(iterable).__name__}")
+            if not isinstance(iterable, BESTIARY_TYPES):
+                self.error(f"Cannot iterate over {type_name(iterable)}")
 
+            budget = self.budget
             for item in iterable:
                 self.set_variable(node.var, item)
-                for stmt in node.body:
-                    self.evaluate(stmt)
+                result = self.execute_block(node.body)
+                if result is not None:
+                    return result
+                if budget is not None:
+                    budget.step()
 
         elif isinstance(node, FunctionDef):
+            if node.name in BUILTINS and node.name not in LANGUAGE_BUILTINS:
+                # Calls by this name may have been judged pure as calls to the builtin
+                self.purity.clear()
+                self.memo.entries.clear()
             self.set_variable(node.name, node)
             return node
 
@@ -929,147 +1317,291 @@ class Interpreter:
         elif isinstance(node, ReturnStatement):
             value = None
             if node.value:
+                call = node.value
+                if (self.locals_stack and isinstance(call, FunctionCall)
+                        and self.find_builtin(call.name) is None):
+                    func_def, local_scope = self.bind_call(call.name, call.args)
+                    if func_def.__class__ is NativeFunction:
+                        return Return(func_def(self, local_scope))
+                    return Return(None, (func_def, local_scope))
                 value = self.evaluate(node.value)
-            raise ReturnValue(value)
+            return Return(value)
 
         elif isinstance(node, IndexAccess):
             obj = self.evaluate(node.obj)
             index = self.evaluate(node.index)
 
-            if isinstance(index, float):
-                index = int(index)
-
             try:
                 return obj[index]
             except (IndexError, KeyError, TypeError):
-                self.error(f"Invalid index access")
+                try:
+                    return float_index(obj, index)
+                except (IndexError, KeyError, TypeError):
+                    self.error(f"Invalid index access")
 
         elif isinstance(node, Grimoire):
             return self.import_grimoire(node.path)
 
-    def call_function(self, name: str, args: List[ASTNode]) -> Any:
-        # Built-in functions
-        if name == 'medallion':  # print
-            values = [str(self.evaluate(arg)) for arg in args]
-            print(' '.join(values))
-            return None
-
-        elif name == 'sigh':  # input
-            return input(self.evaluate(args[0]) if args else "")
-
-        elif name == 'witcher_speed':  # string repeat
-            text = str(self.evaluate(args[0]))
-            times = int(self.evaluate(args[1]))
-            return text * times
-
-        elif name == 'monster_count':  # length
-            obj = self.evaluate(args[0])
-            return len(obj)
-
-        elif name == 'add_to_bestiary':  # append
-            bestiary = self.evaluate(args[0])
-            value = self.evaluate(args[1])
-            bestiary.append(value)
-            return bestiary
-
-        elif name == 'hunter_instinct':  # type info
-            value = self.evaluate(args[0])
-            if isinstance(value, bool):
-                return "truth" if value else "falsehood"
-            elif isinstance(value, (int, float)):
-                return "number"
-            elif isinstance(value, str):
-                return "text"
-            elif isinstance(value, list):
-                return "bestiary"
-            else:
-                return "unknown"
-
-        elif name == 'potion_effect':  # special arithmetic
-            a = self.evaluate(args[0])
-            b = self.evaluate(args[1])
-            return a + b
-
-        else:
-            # User-defined function
-            func_def = self.get_variable(name)
-
-            if not isinstance(func_def, FunctionDef):
-                self.error(f"'{name}' is not a function")
-
-            if len(args) != len(func_def.params):
-                self.error(f"Function '{name}' expects {len(func_def.params)} arguments, got {len(args)}")
-
-            # Create new local scope
-            local_scope = {}
-            for i, param in enumerate(func_def.params):
-                local_scope[param] = self.evaluate(args[i])
-
-            self.locals_stack.append(local_scope)
+    def find_builtin(self, name: str) -> Optional[Builtin]:
+        """The builtin a call to `name` runs, or None when it calls a user binding"""
+        builtin = BUILTINS.get(name)
+        if builtin is None or name in LANGUAGE_BUILTINS:
+            return builtin
+        if name in self.globals or any(name in scope for scope in self.locals_stack):
+            return None  # A user definition shadows the builtin
+        return builtin
 
+    def call_function(self, name: str, args: List[ASTNode]) -> Any:
+        # Built-in functions, see witcher_builtins
+        builtin = self.find_builtin(name)
+        if builtin is not None:
+            if builtin.arity is not None:
+                args = args[:builtin.arity]
+            return builtin.function(self, [self.evaluate(arg) for arg in args])
+
+        # User-defined function
+        func_def, local_scope = self.bind_call(name, args)
+        if func_def.__class__ is NativeFunction:
+            return func_def(self, local_scope)
+
+        if self.memo.size and self.is_memoizable(func_def):
+            return self.call_memoized(func_def, local_scope)
+        return self.run_function(func_def, local_scope)
+
+    def run_function(self, func_def: 'FunctionDef', local_scope: Dict[str, Any]) -> Any:
+        """Execute a bound call to a user function and return its result"""
+        # Tail calls loop here instead of nesting another call_function
+        locals_stack = self.locals_stack
+        budget = self.budget
+        while True:
+            if budget is not None:
+                budget.enter(len(locals_stack) + 1)
+            locals_stack.append(local_scope)
             try:
                 result = None
                 for stmt in func_def.body:
-                    self.evaluate(stmt)
-                return result
-            except ReturnValue as ret:
-                return ret.value
+                    result = self.evaluate(stmt)
+                    if result.__class__ is Return:
+                        break
+                else:
+                    return None
             finally:
-                self.locals_stack.pop()
+                locals_stack.pop()
+
+            if result.call is None:
+                return result.value
+            func_def, callee_scope = result.call
+            # The finished caller's locals stay visible underneath, as on the stack
+            local_scope = {**local_scope, **callee_scope}
+
+    def is_memoizable(self, func_def: 'FunctionDef') -> bool:
+        pure = self.purity.get(func_def)
+        if pure is None:
+            from witcher_purity import is_pure
+            pure = self.purity[func_def] = is_pure(func_def, self.find_builtin)
+        return pure
+
+    def call_memoized(self, func_def: 'FunctionDef', local_scope: Dict[str, Any]) -> Any:
+        """Serve a pure function from the memo cache when its arguments allow it"""
+        args = tuple(local_scope.values())
+        for arg in args:
+            if arg.__class__ not in MEMO_TYPES:
+                # Bestiaries are unhashable and may change between calls
+                return self.run_function(func_def, local_scope)
+
+        # Types are part of the key: truth == 1, but "x" + truth is not "x" + 1
+        key = (func_def,) + args + tuple(arg.__class__ for arg in args)
+        result = self.memo.get(key)
+        if result is MemoCache.MISSING:
+            result = self.run_function(func_def, local_scope)
+            if result.__class__ in MEMO_TYPES:
+                self.memo.put(key, result)
+        return result
+
+    def bind_call(self, name: str, args: List[ASTNode]) -> Tuple[Any, Any]:
+        """Look up a user function and evaluate its arguments into a new local scope
+
+        A native function from the standard grimoire gets the argument list instead.
+        """
+        func_def = self.get_variable(name)
+
+        if not isinstance(func_def, FunctionDef):
+            if func_def.__class__ is NativeFunction:
+                return func_def, [self.evaluate(arg) for arg in args]
+            self.error(f"'{name}' is not a function")
+
+        if len(args) != len(func_def.params):
+            self.error(f"Function '{name}' expects {len(func_def.params)} arguments, got {len(args)}")
+
+        # Create new local scope
+        local_scope = {}
+        for i, param in enumerate(func_def.params):
+            local_scope[param] = self.evaluate(args[i])
+        return func_def, local_scope
 
     def import_grimoire(self, path: str):
         """Import functions and variables from another .witcher file"""
         import os
+
+        if path == STD_GRIMOIRE:
+            self.globals.update(STD_GLOBALS)
+            return
         
         # Resolve file path
         abs_path = os.path.abspath(path)
         
-        # Check for circular imports
-        if abs_path in self.imported_files:
-            self.error(f"Circular import detected: {path}")
-        
-        # Check if file exists
+        # Check if file exists; a deployment may ship only its compiled artifact
         if not os.path.exists(abs_path):
-            self.error(f"Grimoire file not found: {path}")
-        
-        # Mark as imported
-        self.imported_files.add(abs_path)
+            from witcher_artifact import artifact_path
+            abs_path = artifact_path(abs_path)
+            if not os.path.exists(abs_path):
+                self.error(f"Grimoire file not found: {path}")
         
-        # Read and execute the file
-        try:
+        # Loaded at most once per registry
+        self.adopt(self.registry.load(self, abs_path, path))
+
+    def adopt(self, module: 'Interpreter'):
+        """Copy the globals a grimoire defined into ours"""
+        self.globals.update(module.globals)
+
+    def create_module_interpreter(self) -> 'Interpreter':
+        """Create the interpreter a grimoire runs in, with this one's settings"""
+        module = type(self)()
+        module.lexer_mode = self.lexer_mode
+        module.grimoire_cache = self.grimoire_cache
+        module.registry = self.registry
+        module.optimize = self.optimize
+        module.output = self.output
+        module.typed_bestiaries = self.typed_bestiaries
+        module.budget = self.budget
+        return module
+
+    def parse_grimoire(self, abs_path: str) -> List[ASTNode]:
+        """Read and parse a grimoire file, using the on-disk cache when enabled
+
+        A matching compiled artifact (see witcher_artifact) is loaded
+        instead, without parsing.
+        """
+        from witcher_artifact import artifact_for, source_path
+        artifact = artifact_for(abs_path)
+        if artifact is not None:
+            if self.optimize and not artifact.optimized:
+                from witcher_optimizer import optimize
+                return optimize(artifact.ast)
+            return artifact.ast
+
+        abs_path = source_path(abs_path)
+        if self.grimoire_cache:
+            from witcher_cache import load_grimoire
+            ast = load_grimoire(abs_path, self.lexer_mode)
+        else:
             with open(abs_path, 'r') as f:
                 source = f.read()
-            
-            lexer = Lexer(source)
+
+            lexer = create_lexer(source, self.lexer_mode)
             tokens = lexer.tokenize()
             parser = Parser(tokens)
             ast = parser.parse()
-            
-            # Execute in current global scope (functions will be registered)
-            for node in ast:
-                self.evaluate(node)
-        
-        except (SyntaxError, RuntimeError) as e:
-            self.error(f"Error importing {path}: {e}")
 
-def run_witcher_script(source: str):
-    """Main entry point to run a Witcher script"""
+        if self.optimize:
+            from witcher_optimizer import optimize
+            ast = optimize(ast)
+        return ast
+
+ENGINES = ('tree', 'closure', 'vm')
+
+def create_interpreter(engine: str = 'tree') -> Interpreter:
+    """Create an interpreter for the given execution engine"""
+    if engine == 'tree':
+        return Interpreter()
+    elif engine == 'closure':
+        from witcher_closure import ClosureInterpreter
+        return ClosureInterpreter()
+    elif engine == 'vm':
+        from witcher_vm import VirtualMachine
+        return VirtualMachine()
+    raise ValueError(f"Unknown engine: {engine}")
+
+def run_witcher_script(source: Union[str, List[ASTNode]], engine: str = 'tree', lexer: str = 'char', stream: bool = False,
+                       cache: bool = True, optimize: bool = False, memo_size: Optional[int] = None,
+                       output: Optional[OutputSink] = None, typed_bestiaries: bool = False,
+                       profiler: Optional['Profiler'] = None, budget: Optional[Budget] = None):
+    """Main entry point to run a Witcher script
+
+    `source` is the script's text, or its statements already parsed, as
+    loaded from a compiled artifact (see witcher_artifact). With `stream`, tokens flow lazily into the parser and each top-level
+    statement runs as soon as it is parsed, so memory stays bounded by the
+    parser lookahead. A syntax error then stops the script at that point
+    instead of before anything runs. `cache` controls the on-disk cache
+    of parsed grimoires. `optimize` runs the program and its grimoires
+    through witcher_optimizer and reports the savings on stderr.
+    `memo_size` overrides how many pure function results are memoized.
+    `output` replaces the default sink, which line-buffers a terminal and
+    writes in large chunks otherwise. `typed_bestiaries` stores all-number
+    bestiary literals unboxed (see witcher_numeric). `profiler` runs the
+    program on a witcher_profiler.ProfilingInterpreter that records into
+    it; this needs the tree engine. `budget` limits the run (see
+    witcher_budget); exceeding it is reported like any runtime error.
+    """
+    optimizer = None
+    if profiler is not None:
+        if engine != 'tree':
+            raise ValueError("Profiling needs the tree engine")
+        from witcher_profiler import ProfilingInterpreter
+        interpreter = ProfilingInterpreter(profiler)
+    else:
+        interpreter = create_interpreter(engine)
+    if output is not None:
+        interpreter.output = output
+    interpreter.typed_bestiaries = typed_bestiaries
+    if budget is not None:
+        interpreter.budget = budget
+        budget.start()
     try:
-        lexer = Lexer(source)
-        tokens = lexer.tokenize()
+        interpreter.lexer_mode = lexer
+        interpreter.grimoire_cache = cache
+        interpreter.optimize = optimize
+        if memo_size is not None:
+            interpreter.memo.size = memo_size
+        if optimize:
+            from witcher_optimizer import Optimizer
+            optimizer = Optimizer()
+
+        if not isinstance(source, str):
+            interpreter.interpret(optimizer.optimize(source) if optimizer else source)
+            return
+
+        if stream:
+            parser = StreamingParser(create_lexer(source, lexer).iter_tokens())
+            statements = parser.parse_statements()
+            if optimizer:
+                statements = (stmt for node in statements for stmt in optimizer.optimize([node]))
+            interpreter.interpret_stream(statements)
+            return
+
+        tokens = create_lexer(source, lexer).tokenize()
 
         parser = Parser(tokens)
         ast = parser.parse()
+        if optimizer:
+            ast = optimizer.optimize(ast)
 
-        interpreter = Interpreter()
         interpreter.interpret(ast)
 
+    except RecursionError:
+        interpreter.output.flush()
+        print("Error: Recursion too deep for this engine; the vm engine keeps its call stack on the heap")
     except (SyntaxError, RuntimeError) as e:
+        interpreter.output.flush()
         print(f"Error: {e}")
+    finally:
+        interpreter.output.flush()
+        if optimizer:
+            print(optimizer.report(), file=sys.stderr)
+        if profiler is not None:
+            profiler.stop()
 
 if __name__ == "__main__":
-    import sys
-
     if len(sys.argv) > 1:
         # Read from file
         with open(sys.argv[1], 'r') as f:
@@ -1081,29 +1613,19 @@ if __name__ == "__main__":
         print("Type your Witcher code. Use 'quit' to exit.")
         print()
 
-        lines = []
+        from witcher_repl import ReplSession
+        session = ReplSession()
+        more = False
         while True:
             try:
-                line = input("witcher> " if not lines else "       > ")
+                line = input("       > " if more else "witcher> ")
                 if line.lower() == "quit":
                     break
 
-                lines.append(line)
-
-                # Try to parse and execute
-                source = '\n'.join(lines)
-
                 try:
-                    lexer = Lexer(source)
-                    tokens = lexer.tokenize()
-                    parser = Parser(tokens)
-                    ast = parser.parse()
-
-                    interpreter = Interpreter()
-                    interpreter.interpret(ast)
-
-                    lines = []
-                except SyntaxError as e:
+                    more = session.push(line)
+                except (SyntaxError, RuntimeError) as e:
+                    more = False
                     print(f"  {e}")
 
             except KeyboardInterrupt:
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Numbers and Numeric Bestiaries
+A number is an exact integer (a Python int, of any size) or a float.
+Integer literals are integers, and arithmetic on integers stays exact:
+`/` gives an integer when the division is exact and a float otherwise.
+Anything involving a float is a float. A float index selects by its
+integer part.
+
+A numeric bestiary stores its numbers unboxed in one contiguous
+array('d') buffer: 8 bytes per element instead of a pointer plus a
+float object. It indexes, assigns, iterates and prints like an ordinary
+bestiary, but only holds numbers, and holds them as floats.
+
+The vectorized builtins below work on ordinary and numeric bestiaries
+alike. On a numeric bestiary they run over the whole buffer in native
+code, through NumPy when it is installed and the array module otherwise.
+Sums of floats use math.fsum either way, so results do not depend on
+NumPy; sums of integers are exact.
+"""
+
+import math
+from array import array
+from typing import Any, Callable, Dict, List, Union
+
+from witcher_text import Text
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class NumericBestiary(array):
+    """array('d') that behaves like a bestiary"""
+
+    def __new__(cls, values: Any = ()):
+        return super().__new__(cls, 'd', values)
+
+    def __str__(self) -> str:
+        return str(self.tolist())
+
+    __repr__ = __str__
+
+    def __setitem__(self, index: Any, value: Any):
+        if index.__class__ is float:
+            index = int(index)
+        try:
+            array.__setitem__(self, index, value)
+        except TypeError:
+            raise RuntimeError("A numeric bestiary can only hold numbers")
+
+    def append(self, value: Any):
+        try:
+            array.append(self, value)
+        except TypeError:
+            raise RuntimeError("A numeric bestiary can only hold numbers")
+
+    def __add__(self, other: Any) -> 'NumericBestiary':
+        if other.__class__ is Text:
+            return NotImplemented  # Text.__radd__ joins them as text
+        if other.__class__ is list:
+            other = to_numeric(other)
+        return NumericBestiary(array.__add__(self, other))
+
+    def __radd__(self, other: Any) -> Any:
+        if other.__class__ is list:
+            return other + self.tolist()
+        return NotImplemented
+
+    def __mul__(self, count: Any) -> 'NumericBestiary':
+        return NumericBestiary(array.__mul__(self, count))
+
+    __rmul__ = __mul__
+
+def to_numeric(values: List[Any]) -> NumericBestiary:
+    try:
+        return NumericBestiary(values)
+    except TypeError:
+        raise RuntimeError("A numeric bestiary can only hold numbers")
+
+# Values `yrden` can loop over and `arr[i] = x` can write into
+BESTIARY_TYPES = (list, NumericBestiary)
+
+Bestiary = Union[List[Any], NumericBestiary]
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def divide(left: Any, right: Any) -> Any:
+    """`left / right` for a nonzero right"""
+    if left.__class__ is int and right.__class__ is int and not left % right:
+        return left // right
+    return left / right
+
+def float_index(obj: Any, index: Any) -> Any:
+    """obj[index] after it failed, in case index is a float
+
+    Engines index with the value as it is and call this only on error,
+    so integer indexes are never converted.
+    """
+    if index.__class__ is not float:
+        raise TypeError("not a float index")
+    return obj[int(index)]
+
+def from_literal(values: List[Any]) -> Bestiary:
+    """Store an evaluated bestiary literal unboxed when it holds only floats
+
+    Integers would read back as floats, so a literal with any stays a list.
+    """
+    if values and all(value.__class__ is float for value in values):
+        return NumericBestiary(values)
+    return values
+
+def check_bestiary(value: Any, builtin: str) -> Bestiary:
+    if not isinstance(value, BESTIARY_TYPES):
+        raise RuntimeError(f"{builtin} expects a bestiary")
+    return value
+
+def check_numbers(bestiary: Bestiary, builtin: str):
+    if not isinstance(bestiary, NumericBestiary) and not all(is_number(value) for value in bestiary):
+        raise RuntimeError(f"{builtin} expects a bestiary of numbers")
+
+def view(bestiary: NumericBestiary) -> Any:
+    """Zero-copy NumPy view of a numeric bestiary's buffer"""
+    return numpy.frombuffer(bestiary, dtype=numpy.float64)
+
+# Builtins
+
+def numeric_bestiary(source: Any, *, budget: Any = None) -> NumericBestiary:
+    """numeric_bestiary(n) is n zeros; numeric_bestiary(b) copies the numbers in b"""
+    if is_number(source):
+        if source < 0:
+            raise RuntimeError("numeric_bestiary size cannot be negative")
+        if budget is not None:
+            budget.check_length(int(source), False)
+        return NumericBestiary(bytes(8 * int(source)))
+    check_numbers(check_bestiary(source, 'numeric_bestiary'), 'numeric_bestiary')
+    return NumericBestiary(source)
+
+def bestiary_sum(bestiary: Any) -> Any:
+    check_numbers(check_bestiary(bestiary, 'bestiary_sum'), 'bestiary_sum')
+    if not isinstance(bestiary, NumericBestiary) and all(value.__class__ is int for value in bestiary):
+        return sum(bestiary)  # Exact
+    return math.fsum(bestiary)
+
+def bestiary_min(bestiary: Any) -> Any:
+    return extreme(bestiary, 'bestiary_min', min, 'min')
+
+def bestiary_max(bestiary: Any) -> Any:
+    return extreme(bestiary, 'bestiary_max', max, 'max')
+
+def extreme(bestiary: Any, builtin: str, pick: Callable, method: str) -> Any:
+    check_bestiary(bestiary, builtin)
+    if not bestiary:
+        raise RuntimeError(f"{builtin} of an empty bestiary")
+    if numpy is not None and isinstance(bestiary, NumericBestiary):
+        return float(getattr(view(bestiary), method)())
+    check_numbers(bestiary, builtin)
+    return pick(bestiary)
+
+def bestiary_scale(bestiary: Any, factor: Any) -> Bestiary:
+    """New bestiary with every element multiplied by factor"""
+    check_numbers(check_bestiary(bestiary, 'bestiary_scale'), 'bestiary_scale')
+    if not is_number(factor):
+        raise RuntimeError("bestiary_scale expects a number to scale by")
+    if not isinstance(bestiary, NumericBestiary):
+        return [value * factor for value in bestiary]
+    if numpy is not None:
+        return NumericBestiary((view(bestiary) * factor).tobytes())
+    return NumericBestiary([value * factor for value in bestiary])
+
+def bestiary_add(left: Any, right: Any) -> Bestiary:
+    """Elementwise sum of two bestiaries of the same length"""
+    check_numbers(check_bestiary(left, 'bestiary_add'), 'bestiary_add')
+    check_numbers(check_bestiary(right, 'bestiary_add'), 'bestiary_add')
+    if len(left) != len(right):
+        raise RuntimeError(f"bestiary_add needs equal lengths, got {len(left)} and {len(right)}")
+    if not isinstance(left, NumericBestiary) and not isinstance(right, NumericBestiary):
+        return [a + b for a, b in zip(left, right)]
+    if numpy is not None and isinstance(left, NumericBestiary) and isinstance(right, NumericBestiary):
+        return NumericBestiary((view(left) + view(right)).tobytes())
+    return NumericBestiary([a + b for a, b in zip(left, right)])
+
+def bestiary_sort(bestiary: Any) -> Bestiary:
+    """Sort a bestiary in place and return it"""
+    check_bestiary(bestiary, 'bestiary_sort')
+    if isinstance(bestiary, NumericBestiary):
+        if numpy is not None:
+            view(bestiary).sort()
+        else:
+            bestiary[:] = array('d', sorted(bestiary))
+        return bestiary
+    try:
+        bestiary.sort()
+    except TypeError:
+        raise RuntimeError("bestiary_sort cannot order numbers and text together")
+    return bestiary
+
+# Registered as builtins by witcher_builtins
+NUMERIC_BUILTINS: Dict[str, Callable[..., Any]] = {
+    'numeric_bestiary': numeric_bestiary,
+    'bestiary_sum': bestiary_sum,
+    'bestiary_min': bestiary_min,
+    'bestiary_max': bestiary_max,
+    'bestiary_scale': bestiary_scale,
+    'bestiary_add': bestiary_add,
+    'bestiary_sort': bestiary_sort,
+}
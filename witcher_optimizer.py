@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+WitcherScript AST Optimizer
+An optional pass between parsing and execution. It folds operators whose
+operands are all literals, replaces `igni` statements that have a
+constant condition with the branch that would run, and drops `quen`
+loops whose condition is constant-false.
+
+Folding applies the interpreter's own operator semantics. An operation
+that would fail at run time, such as division by zero or comparing a
+string with a number, is left in place so the error still happens when
+and where it did before. So is a repetition that would build a text
+longer than FOLD_MAX_LENGTH.
+"""
+
+import operator
+from typing import Any, Callable, Dict, List
+
+from witcher_interpreter import (
+    ASTNode, Number, String, Boolean, Identifier, BinaryOp, UnaryOp,
+    Assignment, ArrayAssignment, VarDeclaration, FunctionCall, IfStatement,
+    WhileLoop, ForLoop, FunctionDef, ReturnStatement, Array, IndexAccess,
+    Grimoire, TokenType,
+)
+from witcher_numeric import divide as exact_divide
+
+LITERALS = (Number, String, Boolean)
+
+# Longest text a fold may build; a longer repetition is left to run time,
+# where a size budget can refuse it before it is allocated
+FOLD_MAX_LENGTH = 4096
+
+def add(left: Any, right: Any) -> Any:
+    # Allow string concatenation with type conversion
+    if isinstance(left, str) or isinstance(right, str):
+        return str(left) + str(right)
+    return left + right
+
+def multiply(left: Any, right: Any) -> Any:
+    text, times = (left, right) if isinstance(left, str) else (right, left)
+    if isinstance(text, str) and isinstance(times, int) and len(text) * times > FOLD_MAX_LENGTH:
+        raise ValueError  # Not folded
+    return left * right
+
+def divide(left: Any, right: Any) -> Any:
+    if right == 0:
+        raise ZeroDivisionError  # Reported by the interpreter at run time
+    return exact_divide(left, right)
+
+BINARY_OPERATORS: Dict[TokenType, Callable[[Any, Any], Any]] = {
+    TokenType.PLUS: add,
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: multiply,
+    TokenType.SLASH: divide,
+    TokenType.PERCENT: operator.mod,
+    TokenType.EQEQ: operator.eq,
+    TokenType.NEQ: operator.ne,
+    TokenType.LT: operator.lt,
+    TokenType.GT: operator.gt,
+    TokenType.LTEQ: operator.le,
+    TokenType.GTEQ: operator.ge,
+    TokenType.AND: lambda left, right: left and right,
+    TokenType.OR: lambda left, right: left or right,
+}
+
+UNARY_OPERATORS: Dict[TokenType, Callable[[Any], Any]] = {
+    TokenType.MINUS: operator.neg,
+    TokenType.NOT: operator.not_,
+}
+
+def literal(value: Any) -> ASTNode:
+    """Wrap a folded value in the literal node that evaluates to it"""
+    if isinstance(value, bool):
+        return Boolean(value)
+    if isinstance(value, str):
+        return String(value)
+    return Number(value)
+
+def count_nodes(value: Any) -> int:
+    """Count the AST nodes in a node, a list of nodes, or a field value"""
+    if isinstance(value, ASTNode):
+        return 1 + sum(count_nodes(getattr(value, field)) for field in value.__slots__)
+    if isinstance(value, list):
+        return sum(count_nodes(item) for item in value)
+    return 0
+
+def keep_line(stmt: ASTNode, rewritten: List[ASTNode]):
+    """Give statements that replace `stmt` its source line, unless they have their own"""
+    if hasattr(stmt, 'line'):
+        for node in rewritten:
+            if not hasattr(node, 'line'):
+                node.line = stmt.line
+
+class Optimizer:
+    """Rewrites a parsed program into a simpler equivalent, leaving the input untouched"""
+
+    def __init__(self):
+        self.nodes_before = 0
+        self.nodes_after = 0
+        self.folded = 0    # Operators replaced by their value
+        self.branches = 0  # Constant `igni` and `quen` statements resolved
+        self.rewriters = {
+            Number: self.rewrite_leaf,
+            String: self.rewrite_leaf,
+            Boolean: self.rewrite_leaf,
+            Identifier: self.rewrite_leaf,
+            Grimoire: self.rewrite_leaf,
+            BinaryOp: self.rewrite_binary_op,
+            UnaryOp: self.rewrite_unary_op,
+            VarDeclaration: self.rewrite_var_declaration,
+            Assignment: self.rewrite_assignment,
+            ArrayAssignment: self.rewrite_array_assignment,
+            Array: self.rewrite_array,
+            IndexAccess: self.rewrite_index_access,
+            FunctionCall: self.rewrite_function_call,
+            FunctionDef: self.rewrite_function_def,
+            ReturnStatement: self.rewrite_return,
+            ForLoop: self.rewrite_for,
+        }
+
+    @property
+    def eliminated(self) -> int:
+        return self.nodes_before - self.nodes_after
+
+    def optimize(self, ast: List[ASTNode]) -> List[ASTNode]:
+        optimized = self.rewrite_block(ast)
+        self.nodes_before += count_nodes(ast)
+        self.nodes_after += count_nodes(optimized)
+        return optimized
+
+    def report(self) -> str:
+        return (f"Optimizer: eliminated {self.eliminated} of {self.nodes_before} AST nodes "
+                f"({self.folded} operators folded, {self.branches} constant branches removed)")
+
+    def rewrite(self, node: ASTNode) -> ASTNode:
+        return self.rewriters[type(node)](node)
+
+    def rewrite_block(self, statements: List[ASTNode]) -> List[ASTNode]:
+        block = []
+        for stmt in statements:
+            if isinstance(stmt, IfStatement):
+                rewritten = self.rewrite_if(stmt)
+            elif isinstance(stmt, WhileLoop):
+                rewritten = self.rewrite_while(stmt)
+            else:
+                rewritten = [self.rewrite(stmt)]
+            keep_line(stmt, rewritten)
+            block.extend(rewritten)
+        return block
+
+    # Expressions
+
+    def rewrite_leaf(self, node: ASTNode) -> ASTNode:
+        return node
+
+    def rewrite_binary_op(self, node: BinaryOp) -> ASTNode:
+        left = self.rewrite(node.left)
+        right = self.rewrite(node.right)
+        if isinstance(left, LITERALS) and isinstance(right, LITERALS):
+            try:
+                value = BINARY_OPERATORS[node.op](left.value, right.value)
+            except (ArithmeticError, TypeError, ValueError):
+                pass  # Leave the error to the interpreter
+            else:
+                self.folded += 1
+                return literal(value)
+        return BinaryOp(left, node.op, right)
+
+    def rewrite_unary_op(self, node: UnaryOp) -> ASTNode:
+        operand = self.rewrite(node.operand)
+        if isinstance(operand, LITERALS):
+            try:
+                value = UNARY_OPERATORS[node.op](operand.value)
+            except TypeError:
+                pass
+            else:
+                self.folded += 1
+                return literal(value)
+        return UnaryOp(node.op, operand)
+
+    def rewrite_var_declaration(self, node: VarDeclaration) -> ASTNode:
+        return VarDeclaration(node.name, self.rewrite(node.value), node.is_constant)
+
+    def rewrite_assignment(self, node: Assignment) -> ASTNode:
+        return Assignment(node.name, self.rewrite(node.value))
+
+    def rewrite_array_assignment(self, node: ArrayAssignment) -> ASTNode:
+        return ArrayAssignment(self.rewrite(node.obj), self.rewrite(node.index), self.rewrite(node.value))
+
+    def rewrite_array(self, node: Array) -> ASTNode:
+        return Array([self.rewrite(elem) for elem in node.elements])
+
+    def rewrite_index_access(self, node: IndexAccess) -> ASTNode:
+        return IndexAccess(self.rewrite(node.obj), self.rewrite(node.index))
+
+    def rewrite_function_call(self, node: FunctionCall) -> ASTNode:
+        return FunctionCall(node.name, [self.rewrite(arg) for arg in node.args])
+
+    # Statements
+
+    def rewrite_if(self, node: IfStatement) -> List[ASTNode]:
+        condition = self.rewrite(node.condition)
+        if isinstance(condition, LITERALS):
+            # Blocks have no scope of their own, so the taken branch is spliced in
+            self.branches += 1
+            if condition.value:
+                return self.rewrite_block(node.then_body)
+            return self.rewrite_block(node.else_body or [])
+
+        else_body = self.rewrite_block(node.else_body) if node.else_body else None
+        return [IfStatement(condition, self.rewrite_block(node.then_body), else_body)]
+
+    def rewrite_while(self, node: WhileLoop) -> List[ASTNode]:
+        condition = self.rewrite(node.condition)
+        if isinstance(condition, LITERALS) and not condition.value:
+            self.branches += 1
+            return []
+        return [WhileLoop(condition, self.rewrite_block(node.body))]
+
+    def rewrite_for(self, node: ForLoop) -> ASTNode:
+        return ForLoop(node.var, self.rewrite(node.iterable), self.rewrite_block(node.body))
+
+    def rewrite_function_def(self, node: FunctionDef) -> ASTNode:
+        return FunctionDef(node.name, node.params, self.rewrite_block(node.body))
+
+    def rewrite_return(self, node: ReturnStatement) -> ASTNode:
+        return ReturnStatement(self.rewrite(node.value) if node.value else None)
+
+def optimize(ast: List[ASTNode]) -> List[ASTNode]:
+    """Run the optimizer pass over a parsed program"""
+    return Optimizer().optimize(ast)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Output Sinks
+Every engine sends `medallion` output through an OutputSink instead of
+calling print. The sink collects lines and writes them in chunks
+according to its flush policy:
+
+- 'line'     write after every line, for interactive use
+- 'size'     write once `buffer_size` characters have accumulated
+- 'explicit' write only when flush() is called
+
+The default, 'auto', is 'line' when the target is a terminal and 'size'
+otherwise. A sink can target a text stream (sys.stdout by default), a
+binary stream, or a raw file descriptor; the last two receive encoded
+bytes.
+"""
+
+import io
+import os
+import sys
+from typing import Any, List, Union
+
+FLUSH_POLICIES = ('auto', 'line', 'size', 'explicit')
+
+class OutputSink:
+    """Buffered destination for program output"""
+
+    def __init__(self, target: Union[None, int, Any] = None, flush: str = 'auto',
+                 buffer_size: int = 1 << 16, encoding: str = 'utf-8'):
+        if flush not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown flush policy: {flush}")
+        self.target = target  # None follows whatever sys.stdout is at flush time
+        self.policy = flush
+        self.buffer_size = buffer_size
+        self.encoding = encoding
+        self.chunks: List[str] = []
+        self.pending = 0  # Characters buffered in chunks
+
+        if flush == 'auto':
+            self.policy = 'line' if self.is_terminal() else 'size'
+
+    def is_terminal(self) -> bool:
+        target = sys.stdout if self.target is None else self.target
+        try:
+            if isinstance(target, int):
+                return os.isatty(target)
+            return target.isatty()
+        except (AttributeError, ValueError, OSError):
+            return False
+
+    def write(self, text: str):
+        self.chunks.append(text)
+        self.pending += len(text)
+        if self.policy == 'line' and '\n' in text:
+            self.flush()
+        elif self.policy == 'size' and self.pending >= self.buffer_size:
+            self.flush()
+
+    def write_line(self, text: str):
+        self.write(text + '\n')
+
+    def flush(self):
+        """Write everything buffered so far to the target"""
+        if not self.chunks:
+            return
+        text = ''.join(self.chunks)
+        self.chunks = []
+        self.pending = 0
+
+        target = sys.stdout if self.target is None else self.target
+        if isinstance(target, int):
+            data = memoryview(text.encode(self.encoding))
+            while data:
+                data = data[os.write(target, data):]
+        elif isinstance(target, (io.RawIOBase, io.BufferedIOBase)):
+            target.write(text.encode(self.encoding))
+            target.flush()
+        else:
+            target.write(text)
+            target.flush()
+
+class MemorySink(OutputSink):
+    """Sink that keeps all output in memory, for batch jobs and embedding"""
+
+    def __init__(self):
+        super().__init__(io.StringIO(), flush='explicit')
+
+    def getvalue(self) -> str:
+        self.flush()
+        return self.target.getvalue()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Profiler
+ProfilingInterpreter is a tree-walking Interpreter that records, in a
+Profiler:
+
+- calls, self time and cumulative time for every user function
+- how many times each source line ran
+- bestiaries allocated, per function and in total
+- self time per call stack, written in the collapsed format that
+  flamegraph.pl, speedscope and inferno read
+
+Only ProfilingInterpreter pays for any of this; the ordinary engines are
+unchanged. Calls answered from the memo cache run no code and are not
+counted.
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from witcher_builtins import NativeFunction
+from witcher_interpreter import Interpreter, ASTNode, Array, FunctionDef, Return
+from witcher_numeric import BESTIARY_TYPES
+
+MAIN = '<main>'
+
+class FunctionStats:
+    __slots__ = ('name', 'source', 'line', 'calls', 'self_ns', 'total_ns', 'bestiaries', 'active')
+
+    def __init__(self, name: str, source: str, line: Optional[int]):
+        self.name = name
+        self.source = source
+        self.line = line
+        self.calls = 0
+        self.self_ns = 0
+        self.total_ns = 0  # Recursive calls count once, for the outermost call
+        self.bestiaries = 0
+        self.active = 0  # Calls currently on the stack
+
+    def label(self) -> str:
+        if self.line is None:
+            return self.name
+        return f"{self.name} ({self.source}:{self.line})"
+
+class Frame:
+    __slots__ = ('stats', 'path', 'start', 'child_ns')
+
+    def __init__(self, stats: FunctionStats, path: Tuple[str, ...]):
+        self.stats = stats
+        self.path = path
+        self.start = time.perf_counter_ns()
+        self.child_ns = 0
+
+class Profiler:
+    """Statistics collected while a program runs"""
+
+    def __init__(self, program: str = MAIN):
+        self.program = program  # Source name for the main program's lines
+        self.functions: Dict[FunctionDef, FunctionStats] = {}
+        self.sources: Dict[FunctionDef, str] = {}  # File each function was defined in
+        self.lines: Dict[Tuple[str, int], int] = {}
+        self.stacks: Dict[Tuple[str, ...], int] = {}
+        self.bestiaries = 0
+
+        self.main = FunctionStats(MAIN, program, None)
+        self.stack: List[Frame] = []
+        self.stopped = False
+
+    def start(self):
+        """Open the main program's frame; the clock starts here"""
+        self.main.calls = self.main.active = 1
+        self.stack.append(Frame(self.main, (MAIN,)))
+
+    def enter(self, func_def: FunctionDef):
+        stats = self.functions.get(func_def)
+        if stats is None:
+            stats = FunctionStats(func_def.name, self.sources.get(func_def, self.program),
+                                  getattr(func_def, 'line', None))
+            self.functions[func_def] = stats
+        stats.calls += 1
+        stats.active += 1
+        self.stack.append(Frame(stats, self.stack[-1].path + (func_def.name,)))
+
+    def exit(self):
+        frame = self.stack.pop()
+        self.stack[-1].child_ns += self.close(frame)
+
+    def close(self, frame: Frame) -> int:
+        """Record a finished frame and return how long it ran"""
+        elapsed = time.perf_counter_ns() - frame.start
+        stats = frame.stats
+        stats.active -= 1
+        stats.self_ns += elapsed - frame.child_ns
+        if not stats.active:
+            stats.total_ns += elapsed
+        self.stacks[frame.path] = self.stacks.get(frame.path, 0) + elapsed - frame.child_ns
+        return elapsed
+
+    def stop(self):
+        """Close the main program's frame; call once the program has finished"""
+        if self.stack and not self.stopped:
+            self.stopped = True
+            while len(self.stack) > 1:  # Left open by an error
+                self.exit()
+            self.close(self.stack[0])
+
+    def hit(self, source: str, line: int):
+        key = (source, line)
+        self.lines[key] = self.lines.get(key, 0) + 1
+
+    def allocated(self):
+        self.bestiaries += 1
+        self.stack[-1].stats.bestiaries += 1
+
+    def report(self, limit: int = 20) -> str:
+        """Functions by self time and the most executed lines, as text"""
+        functions = sorted([self.main, *self.functions.values()], key=lambda s: s.self_ns, reverse=True)
+        calls = sum(stats.calls for stats in self.functions.values())
+        out = [f"Profile of {self.program}: {self.main.total_ns / 1e6:.1f} ms, "
+               f"{calls} function calls, {self.bestiaries} bestiaries allocated",
+               "",
+               f"{'calls':>9} {'self ms':>10} {'total ms':>10} {'bestiaries':>10}  function"]
+        for stats in functions[:limit]:
+            out.append(f"{stats.calls:>9} {stats.self_ns / 1e6:>10.2f} {stats.total_ns / 1e6:>10.2f} "
+                       f"{stats.bestiaries:>10}  {stats.label()}")
+
+        out += ["", f"{'hits':>9}  line"]
+        lines = sorted(self.lines.items(), key=lambda item: (-item[1], item[0]))
+        for (source, line), hits in lines[:limit]:
+            out.append(f"{hits:>9}  {source}:{line}")
+        return '\n'.join(out)
+
+    def collapsed_stacks(self) -> str:
+        """One `frame;frame;frame microseconds` line per distinct call stack"""
+        return ''.join(f"{';'.join(path)} {ns // 1000}\n"
+                       for path, ns in sorted(self.stacks.items()) if ns >= 1000)
+
+class ProfilingInterpreter(Interpreter):
+    """Tree-walking interpreter that reports what it runs to a Profiler"""
+
+    def __init__(self, profiler: Optional[Profiler] = None):
+        super().__init__()
+        self.profiler = profiler or Profiler()
+        # File whose statements are running: a function's, or the program's
+        self.source = self.profiler.program
+
+    def interpret(self, ast: List[ASTNode]):
+        if not self.profiler.stack:
+            self.profiler.start()
+        super().interpret(ast)
+
+    def interpret_stream(self, statements: Iterable[ASTNode]):
+        if not self.profiler.stack:
+            self.profiler.start()
+        super().interpret_stream(statements)
+
+    def evaluate(self, node: ASTNode) -> Any:
+        line = getattr(node, 'line', None)
+        if line is not None:
+            self.profiler.hit(self.source, line)
+        if node.__class__ is Array:
+            self.profiler.allocated()
+        elif node.__class__ is FunctionDef:
+            self.profiler.sources.setdefault(node, self.source)
+        return super().evaluate(node)
+
+    def call_function(self, name: str, args: List[ASTNode]) -> Any:
+        # Interpreter.call_function, counting the bestiaries natives return
+        builtin = self.find_builtin(name)
+        if builtin is not None:
+            if builtin.arity is not None:
+                args = args[:builtin.arity]
+            function, values = builtin.function, [self.evaluate(arg) for arg in args]
+        else:
+            func_def, local_scope = self.bind_call(name, args)
+            if func_def.__class__ is not NativeFunction:
+                if self.memo.size and self.is_memoizable(func_def):
+                    return self.call_memoized(func_def, local_scope)
+                return self.run_function(func_def, local_scope)
+            function, values = func_def, local_scope
+
+        result = function(self, values)
+        if isinstance(result, BESTIARY_TYPES) and not any(result is value for value in values):
+            self.profiler.allocated()
+        return result
+
+    def run_function(self, func_def: FunctionDef, local_scope: Dict[str, Any]) -> Any:
+        # Interpreter.run_function with a profiler frame around each call;
+        # a tail call replaces its caller's frame
+        profiler = self.profiler
+        caller_source = self.source
+        locals_stack = self.locals_stack
+        budget = self.budget
+        while True:
+            if budget is not None:
+                budget.enter(len(locals_stack) + 1)
+            profiler.enter(func_def)
+            self.source = profiler.sources.get(func_def, caller_source)
+            locals_stack.append(local_scope)
+            try:
+                result = None
+                for stmt in func_def.body:
+                    result = self.evaluate(stmt)
+                    if result.__class__ is Return:
+                        break
+                else:
+                    return None
+            finally:
+                locals_stack.pop()
+                profiler.exit()
+                self.source = caller_source
+
+            if result.call is None:
+                return result.value
+            func_def, callee_scope = result.call
+            local_scope = {**local_scope, **callee_scope}
+
+    def create_module_interpreter(self) -> 'ProfilingInterpreter':
+        module = super().create_module_interpreter()
+        module.profiler = self.profiler
+        return module
+
+    def parse_grimoire(self, abs_path: str) -> List[ASTNode]:
+        # Only module interpreters parse grimoires, so this names their source
+        self.source = os.path.relpath(abs_path)
+        return super().parse_grimoire(abs_path)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Embedding API
+compile() lexes, parses and, for the compiled engines, compiles a script
+once. The Program it returns can then run any number of times, each time
+with its own global bindings:
+
+    from witcher_program import compile
+
+    rule = compile('''
+    igni price > limit {
+        medallion("over by", price - limit)
+    }
+    hunt price * 2
+    ''')
+    result = rule.run({'price': 120, 'limit': 100})
+    result.value   # 240, from the top-level `hunt`
+    result.output  # "over by 20\\n"
+
+Every run starts from fresh globals and captures medallion output instead
+of printing it. Runtime errors raise RuntimeError and syntax errors
+raise SyntaxError from compile(). A Program never changes after
+compile(), so one can be shared by threads and inherited by forked
+worker processes. Only the grimoires it imports are parsed lazily, once
+per Program.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+
+from witcher_budget import Budget
+from witcher_builtins import NativeFunction
+from witcher_interpreter import (
+    ENGINES, ASTNode, GrimoireRegistry, Interpreter, Parser, ReturnValue,
+    create_interpreter, create_lexer,
+)
+from witcher_numeric import NumericBestiary
+from witcher_output import MemorySink
+from witcher_text import Text
+
+class Result:
+    """What one run of a Program produced"""
+    __slots__ = ('value', 'output', 'globals')
+
+    def __init__(self, value: Any, output: str, globals_: Dict[str, Any]):
+        self.value = value  # Value of a top-level `hunt`, or None
+        self.output = output  # Everything medallion wrote
+        self.globals = globals_  # Globals when the program finished
+
+    def __repr__(self) -> str:
+        return f"Result(value={self.value!r}, output={self.output!r})"
+
+def to_witcher(value: Any, name: str) -> Any:
+    """Convert a Python value bound to `name` into a WitcherScript value"""
+    if isinstance(value, (bool, int, str, float, NumericBestiary)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [to_witcher(element, name) for element in value]
+    if isinstance(value, NativeFunction):
+        return value
+    if callable(value):
+        return NativeFunction(name, value)
+    raise TypeError(f"Cannot bind {name!r}: {type(value).__name__} is not a WitcherScript value")
+
+def to_python(value: Any) -> Any:
+    """A WitcherScript value as the host sees it: texts are plain strings"""
+    if value.__class__ is Text:
+        return str(value)
+    if value.__class__ is list:
+        elements = [to_python(element) for element in value]
+        # A list without texts is returned as it is
+        if any(new is not old for new, old in zip(elements, value)):
+            return elements
+    return value
+
+class Program:
+    """A parsed script that can run many times; see compile()"""
+
+    def __init__(self, ast: List[ASTNode], engine: str = 'tree', lexer: str = 'char',
+                 cache: bool = True, optimize: bool = False, memo_size: Optional[int] = None,
+                 typed_bestiaries: bool = False):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        self.ast = tuple(ast)
+        self.engine = engine
+        self.lexer = lexer
+        self.cache = cache
+        self.optimize = optimize
+        self.memo_size = memo_size
+        self.typed_bestiaries = typed_bestiaries
+        # Imported grimoires, parsed by whichever run imports them first
+        self.parsed: Dict = {}
+
+        self.code = None
+        if engine == 'vm':
+            # Bytecode doesn't refer to the machine that runs it, so every run shares it
+            from witcher_vm import BytecodeCompiler
+            self.code = BytecodeCompiler().compile_program(list(self.ast))
+        # Closure-compiled code is bound to its interpreter: idle ones are
+        # reused, and a run that finds none compiles another. Code compiled
+        # with budget checks is kept apart from code without.
+        self.idle: Dict[bool, List[Any]] = {False: [], True: []}
+
+    def create_interpreter(self) -> Interpreter:
+        interpreter = create_interpreter(self.engine)
+        interpreter.lexer_mode = self.lexer
+        interpreter.grimoire_cache = self.cache
+        interpreter.optimize = self.optimize
+        interpreter.typed_bestiaries = self.typed_bestiaries
+        if self.memo_size is not None:
+            interpreter.memo.size = self.memo_size
+        return interpreter
+
+    def compile_closures(self, interpreter: Interpreter) -> Callable[[], None]:
+        program = interpreter.compiler.compile_program(list(self.ast))
+        return lambda: interpreter.run(program)
+
+    def run(self, bindings: Optional[Dict[str, Any]] = None, budget: Optional[Budget] = None) -> Result:
+        """Run with `bindings` as the initial globals
+
+        Numbers, text, booleans and lists convert to WitcherScript values;
+        Python functions become callable from the script. `budget` limits
+        this run (see witcher_budget) and raises BudgetExceeded when spent.
+        """
+        idle = self.idle[budget is not None]
+        if self.engine == 'closure':
+            try:
+                interpreter, start = idle.pop()
+            except IndexError:
+                interpreter = self.create_interpreter()
+                interpreter.budget = budget
+                start = self.compile_closures(interpreter)
+        elif self.engine == 'vm':
+            interpreter = self.create_interpreter()
+            start = lambda: interpreter.execute(self.code)
+        else:
+            interpreter = self.create_interpreter()
+            start = lambda: interpreter.interpret(self.ast)
+
+        # Compiled closures hold on to this dict, so it is refilled, never replaced
+        interpreter.globals.clear()
+        for name, value in (bindings or {}).items():
+            interpreter.globals[name] = to_witcher(value, name)
+        interpreter.registry = GrimoireRegistry(self.parsed)
+        interpreter.output = output = MemorySink()
+        interpreter.budget = budget
+        if budget is not None:
+            budget.start()
+
+        value = None
+        try:
+            start()
+        except ReturnValue as e:
+            value = e.value
+        finally:
+            if self.engine == 'closure':
+                idle.append((interpreter, start))
+        globals_ = {name: to_python(value) for name, value in interpreter.globals.items()}
+        return Result(to_python(value), output.getvalue(), globals_)
+
+def compile(source: str, engine: str = 'tree', lexer: str = 'char', cache: bool = True,
+            optimize: bool = False, memo_size: Optional[int] = None,
+            typed_bestiaries: bool = False) -> Program:
+    """Parse `source` once into a Program; raises SyntaxError
+
+    The options match run_witcher_script's. `optimize` folds constants in
+    the program and in the grimoires it imports.
+    """
+    ast = Parser(create_lexer(source, lexer).tokenize()).parse()
+    if optimize:
+        from witcher_optimizer import optimize as optimize_ast
+        ast = optimize_ast(ast)
+    return Program(ast, engine, lexer, cache, optimize, memo_size, typed_bestiaries)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Purity Analysis
+Decides whether a user function can be memoized: given the same
+arguments it must always produce the same result and have no other
+effect.
+
+The analysis is deliberately conservative. A function qualifies when its
+body only reads its parameters and locals it has already assigned, calls
+nothing but itself and the side-effect-free builtins, never writes into
+a bestiary, and defines no nested functions or grimoire imports. A
+function can also opt in by starting its body with the directive string
+"pure", for cases the analysis cannot prove.
+"""
+
+from typing import Callable, Iterable, List, Optional, Set
+
+from witcher_interpreter import (
+    ASTNode, Number, String, Boolean, Identifier, BinaryOp, UnaryOp,
+    Assignment, VarDeclaration, FunctionCall, IfStatement, WhileLoop,
+    ForLoop, FunctionDef, ReturnStatement, Array, IndexAccess,
+)
+from witcher_builtins import BUILTINS, Builtin
+
+# Directive string that marks a function as pure without analysis
+PURE_DIRECTIVE = 'pure'
+
+class NotPure(Exception):
+    pass
+
+class PurityChecker:
+    """Walks one function body, raising NotPure at the first disqualifying node"""
+
+    def __init__(self, func_def: FunctionDef, find_builtin: Callable[[str], Optional[Builtin]]):
+        self.name = func_def.name
+        self.find_builtin = find_builtin
+
+    def check_block(self, statements: Iterable[ASTNode], bound: Set[str]):
+        # Names bound inside a nested block count only within that block
+        for stmt in statements:
+            self.check(stmt, bound)
+
+    def check(self, node: ASTNode, bound: Set[str]):
+        if isinstance(node, (Number, String, Boolean)):
+            return
+
+        if isinstance(node, Identifier):
+            # Anything else would be read from the caller or the globals
+            if node.name not in bound:
+                raise NotPure
+        elif isinstance(node, (VarDeclaration, Assignment)):
+            if node.name == self.name:
+                raise NotPure  # Rebinding its own name changes what recursion calls
+            self.check(node.value, bound)
+            bound.add(node.name)
+        elif isinstance(node, BinaryOp):
+            self.check(node.left, bound)
+            self.check(node.right, bound)
+        elif isinstance(node, UnaryOp):
+            self.check(node.operand, bound)
+        elif isinstance(node, Array):
+            self.check_block(node.elements, bound)
+        elif isinstance(node, IndexAccess):
+            self.check(node.obj, bound)
+            self.check(node.index, bound)
+        elif isinstance(node, FunctionCall):
+            if node.name != self.name:
+                builtin = self.find_builtin(node.name)
+                if builtin is None or not builtin.pure:
+                    raise NotPure
+            self.check_block(node.args, bound)
+        elif isinstance(node, IfStatement):
+            self.check(node.condition, bound)
+            self.check_block(node.then_body, set(bound))
+            self.check_block(node.else_body or [], set(bound))
+        elif isinstance(node, WhileLoop):
+            self.check(node.condition, bound)
+            self.check_block(node.body, set(bound))
+        elif isinstance(node, ForLoop):
+            self.check(node.iterable, bound)
+            if node.var == self.name:
+                raise NotPure
+            self.check_block(node.body, bound | {node.var})
+        elif isinstance(node, ReturnStatement):
+            if node.value:
+                self.check(node.value, bound)
+        else:
+            # Bestiary writes, nested functions and grimoire imports
+            raise NotPure
+
+def has_pure_directive(body: List[ASTNode]) -> bool:
+    return bool(body) and isinstance(body[0], String) and body[0].value == PURE_DIRECTIVE
+
+def is_pure(func_def: FunctionDef,
+            find_builtin: Callable[[str], Optional[Builtin]] = BUILTINS.get) -> bool:
+    """Whether calls to `func_def` can be served from a memo cache
+
+    `find_builtin` gives the builtin a call by a name runs, if any; a
+    user function that shadows a builtin is not one.
+    """
+    if has_pure_directive(func_def.body):
+        return True
+    if func_def.name in func_def.params:
+        return False
+
+    try:
+        PurityChecker(func_def, find_builtin).check_block(func_def.body, set(func_def.params))
+    except NotPure:
+        return False
+    return True
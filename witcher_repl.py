@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+WitcherScript REPL Session
+A ReplSession keeps one interpreter for the whole session, so variables,
+functions and imported grimoires persist from one entry to the next.
+
+Each line typed is scanned once, for open brackets, braces and strings,
+to decide whether the entry is complete. Only a complete entry is lexed
+and parsed, and only that entry: earlier entries have already run and
+are never tokenized again. A syntax error in a complete entry is
+reported at once instead of waiting for more input.
+
+An `igni` block may be followed by `elixir` on the next line, so after
+its closing brace the session waits for one more line: an empty line
+runs it, and anything else continues the same entry.
+"""
+
+from typing import List, Optional
+
+from witcher_interpreter import Parser, create_interpreter, create_lexer
+from witcher_output import OutputSink
+
+OPENERS = '({['
+CLOSERS = ')}]'
+
+class InputScanner:
+    """Tracks, line by line, whether the text so far is a complete entry"""
+
+    def __init__(self):
+        self.depth = 0  # Brackets and braces still open
+        self.quote: Optional[str] = None  # Quote of the string still open
+        self.word: Optional[str] = None  # First word of the current top-level statement
+        self.block: Optional[str] = None  # That word, for the top-level block now open
+        self.open_if = False  # An `igni` block just closed and `elixir` may follow
+
+    def feed(self, line: str):
+        i = 0
+        while i < len(line):
+            char = line[i]
+            if self.quote:
+                if char == '\\':
+                    i += 1  # The escaped character can't close the string
+                elif char == self.quote:
+                    self.quote = None
+            elif char == '#':
+                break
+            elif char in '"\'':
+                self.quote = char
+                self.open_if = False
+            elif char in OPENERS:
+                if self.depth == 0 and char == '{':
+                    self.block = self.word
+                self.depth += 1
+            elif char in CLOSERS:
+                self.depth -= 1
+                if self.depth == 0 and char == '}':
+                    self.open_if = self.block == 'igni'
+                    self.word = None
+            elif not char.isspace() and self.depth == 0:
+                start = i
+                while i + 1 < len(line) and (line[i + 1].isalnum() or line[i + 1] == '_'):
+                    i += 1
+                word = line[start:i + 1]
+                if self.open_if and word != 'elixir':
+                    self.open_if = False
+                if self.word is None:
+                    self.word = word
+            i += 1
+
+        if self.depth == 0 and not self.quote and not self.open_if:
+            self.word = None  # A newline ends a top-level statement
+
+    def complete(self) -> bool:
+        # Unbalanced closers are complete too: the parser reports them
+        return self.depth <= 0 and self.quote is None and not self.open_if
+
+    def blank_line(self):
+        """An empty line ends a pending `igni` without `elixir`"""
+        self.open_if = False
+
+class ReplSession:
+    """One interpreter, fed one line at a time"""
+
+    def __init__(self, engine: str = 'tree', lexer_mode: str = 'char', cache: bool = True,
+                 output: Optional[OutputSink] = None):
+        self.lexer_mode = lexer_mode
+        self.interpreter = create_interpreter(engine)
+        self.interpreter.lexer_mode = lexer_mode
+        self.interpreter.grimoire_cache = cache
+        if output is not None:
+            self.interpreter.output = output
+        self.lines: List[str] = []
+        self.scanner = InputScanner()
+
+    def push(self, line: str) -> bool:
+        """Add a line of input; return True while the entry needs more lines
+
+        A complete entry runs before push returns. Its SyntaxError or
+        RuntimeError propagates, and the session is ready for a new entry.
+        """
+        if not line.strip():
+            if not self.lines:
+                return False
+            self.scanner.blank_line()
+        else:
+            self.scanner.feed(line)
+        self.lines.append(line)
+        if not self.scanner.complete():
+            return True
+
+        source = '\n'.join(self.lines)
+        self.reset()
+        self.run(source)
+        return False
+
+    def run(self, source: str):
+        """Lex, parse and run one complete entry in the session's interpreter"""
+        tokens = create_lexer(source, self.lexer_mode).tokenize()
+        ast = Parser(tokens).parse()
+        try:
+            self.interpreter.interpret(ast)
+        finally:
+            self.interpreter.output.flush()
+
+    def reset(self):
+        """Discard a partly typed entry"""
+        self.lines = []
+        self.scanner = InputScanner()
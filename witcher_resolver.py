@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Scope Resolver
+Classifies every variable reference as a local frame slot, a global or a
+builtin before execution, so the closure and vm engines index a
+fixed-size frame array instead of searching a stack of scope dicts. The
+tree-walker keeps its scope dicts: it is the reference the other engines
+are tested against, and the profiler and the memoization of pure
+functions work on its unresolved AST.
+
+A function's locals are its parameters plus every name it binds
+(`contract`, `mutation`, assignment, `yrden` variable or nested `aard`),
+and get slots. Scoping is dynamic, as in the tree-walker: any other name
+a function reads, or a local read before its first assignment, is looked
+up in the functions that called it, innermost first, and then in the
+globals. So a nested `aard` sees the locals of the function that defined
+it while that function is running, and a callee sees its caller's.
+
+Each frame therefore ends with two extra entries: its function's slot
+map and the frame of its caller. A tail call reuses nothing of the
+finished caller's frame but its locals, which stay visible underneath
+the callee (see TailScope). Only names some function binds as a local
+can be found in a frame, so a read of any other name goes straight to
+the globals. resolve() returns those names with the program; an engine
+gathers them from every program and grimoire it runs, since functions
+of any of them may be on the call stack. Grimoires always import into
+the global scope.
+"""
+
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from witcher_interpreter import (
+    ASTNode, Number, String, Boolean, Identifier, BinaryOp, UnaryOp,
+    Assignment, ArrayAssignment, VarDeclaration, FunctionCall, IfStatement,
+    WhileLoop, ForLoop, FunctionDef, ReturnStatement, Array, IndexAccess,
+    Grimoire,
+)
+from witcher_builtins import BUILTINS, LANGUAGE_BUILTINS
+
+# Marks a frame slot whose local has not been assigned yet
+UNSET = object()
+
+# Resolved nodes
+
+class LocalVariable(ASTNode):
+    __slots__ = ('name', 'slot')
+
+    def __init__(self, name: str, slot: int):
+        self.name = name
+        self.slot = slot
+
+class GlobalVariable(ASTNode):
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+class FreeVariable(ASTNode):
+    """A name a function reads without binding it: a caller's local or a global"""
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+class LocalStore(ASTNode):
+    __slots__ = ('name', 'slot', 'value')
+
+    def __init__(self, name: str, slot: int, value: ASTNode):
+        self.name = name
+        self.slot = slot
+        self.value = value
+
+class GlobalStore(ASTNode):
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name: str, value: ASTNode):
+        self.name = name
+        self.value = value
+
+class BuiltinCall(ASTNode):
+    __slots__ = ('name', 'args')
+
+    def __init__(self, name: str, args: List[ASTNode]):
+        self.name = name
+        self.args = args
+
+class ResolvedCall(ASTNode):
+    __slots__ = ('function', 'name', 'args')
+
+    def __init__(self, function: Union[LocalVariable, FreeVariable, GlobalVariable], args: List[ASTNode]):
+        self.function = function
+        self.name = function.name
+        self.args = args
+
+class ResolvedForLoop(ASTNode):
+    __slots__ = ('var', 'iterable', 'body')
+
+    def __init__(self, var: Union[LocalVariable, GlobalVariable], iterable: ASTNode, body: List[ASTNode]):
+        self.var = var
+        self.iterable = iterable
+        self.body = body
+
+class ResolvedFunctionDef(ASTNode):
+    __slots__ = ('name', 'params', 'body', 'frame_size', 'slots', 'target')
+
+    def __init__(self, name: str, params: List[str], body: List[ASTNode], frame_size: int,
+                 slots: Dict[str, int], target: Union[LocalVariable, GlobalVariable]):
+        self.name = name
+        self.params = params
+        self.body = body
+        self.frame_size = frame_size
+        self.slots = slots  # Slot of each local, by name
+        self.target = target
+
+class Scope:
+    """Slot numbers for the names bound in one function body"""
+
+    def __init__(self, params: List[str]):
+        self.slots: Dict[str, int] = {}
+        for i, param in enumerate(params):
+            self.slots[param] = i
+        self.size = len(params)
+
+    def declare(self, name: str):
+        if name not in self.slots:
+            self.slots[name] = self.size
+            self.size += 1
+
+class Resolver:
+    """Rewrites a parsed program into resolved nodes, leaving the input untouched"""
+
+    def __init__(self):
+        self.scope: Optional[Scope] = None  # None at the top level
+        # Every name a function binds as a local; no other name can be in a frame
+        self.bound_names: Set[str] = set()
+        self.rewriters = {
+            Number: self.rewrite_literal,
+            String: self.rewrite_literal,
+            Boolean: self.rewrite_literal,
+            Grimoire: self.rewrite_literal,
+            Identifier: self.rewrite_identifier,
+            VarDeclaration: self.rewrite_assignment,
+            Assignment: self.rewrite_assignment,
+            BinaryOp: self.rewrite_binary_op,
+            UnaryOp: self.rewrite_unary_op,
+            Array: self.rewrite_array,
+            IndexAccess: self.rewrite_index_access,
+            ArrayAssignment: self.rewrite_array_assignment,
+            FunctionCall: self.rewrite_function_call,
+            IfStatement: self.rewrite_if,
+            WhileLoop: self.rewrite_while,
+            ForLoop: self.rewrite_for,
+            FunctionDef: self.rewrite_function_def,
+            ReturnStatement: self.rewrite_return,
+        }
+
+    def resolve(self, ast: List[ASTNode]) -> List[ASTNode]:
+        return self.rewrite_block(ast)
+
+    def rewrite(self, node: ASTNode) -> ASTNode:
+        return self.rewriters[type(node)](node)
+
+    def rewrite_block(self, statements: List[ASTNode]) -> List[ASTNode]:
+        return [self.rewrite(stmt) for stmt in statements]
+
+    def variable(self, name: str) -> Union[LocalVariable, FreeVariable, GlobalVariable]:
+        if self.scope is None:
+            return GlobalVariable(name)
+        if name in self.scope.slots:
+            return LocalVariable(name, self.scope.slots[name])
+        return FreeVariable(name)
+
+    # Binding collection
+
+    def collect(self, node: Optional[ASTNode], scope: Scope):
+        """Declare every name `node` binds, without entering nested functions"""
+        if node is None:
+            return
+        if isinstance(node, (VarDeclaration, Assignment)):
+            scope.declare(node.name)
+            self.collect(node.value, scope)
+        elif isinstance(node, FunctionDef):
+            scope.declare(node.name)
+        elif isinstance(node, ForLoop):
+            scope.declare(node.var)
+            self.collect(node.iterable, scope)
+            self.collect_block(node.body, scope)
+        elif isinstance(node, IfStatement):
+            self.collect(node.condition, scope)
+            self.collect_block(node.then_body, scope)
+            self.collect_block(node.else_body or [], scope)
+        elif isinstance(node, WhileLoop):
+            self.collect(node.condition, scope)
+            self.collect_block(node.body, scope)
+        elif isinstance(node, BinaryOp):
+            self.collect(node.left, scope)
+            self.collect(node.right, scope)
+        elif isinstance(node, UnaryOp):
+            self.collect(node.operand, scope)
+        elif isinstance(node, Array):
+            self.collect_block(node.elements, scope)
+        elif isinstance(node, FunctionCall):
+            self.collect_block(node.args, scope)
+        elif isinstance(node, IndexAccess):
+            self.collect(node.obj, scope)
+            self.collect(node.index, scope)
+        elif isinstance(node, ArrayAssignment):
+            self.collect(node.obj, scope)
+            self.collect(node.index, scope)
+            self.collect(node.value, scope)
+        elif isinstance(node, ReturnStatement):
+            self.collect(node.value, scope)
+
+    def collect_block(self, statements: List[ASTNode], scope: Scope):
+        for stmt in statements:
+            self.collect(stmt, scope)
+
+    # Rewriting
+
+    def rewrite_literal(self, node: ASTNode) -> ASTNode:
+        return node
+
+    def rewrite_identifier(self, node: Identifier) -> ASTNode:
+        return self.variable(node.name)
+
+    def rewrite_assignment(self, node: ASTNode) -> ASTNode:
+        value = self.rewrite(node.value)
+        if self.scope is not None:
+            return LocalStore(node.name, self.scope.slots[node.name], value)
+        return GlobalStore(node.name, value)
+
+    def rewrite_binary_op(self, node: BinaryOp) -> ASTNode:
+        return BinaryOp(self.rewrite(node.left), node.op, self.rewrite(node.right))
+
+    def rewrite_unary_op(self, node: UnaryOp) -> ASTNode:
+        return UnaryOp(node.op, self.rewrite(node.operand))
+
+    def rewrite_array(self, node: Array) -> ASTNode:
+        return Array(self.rewrite_block(node.elements))
+
+    def rewrite_index_access(self, node: IndexAccess) -> ASTNode:
+        return IndexAccess(self.rewrite(node.obj), self.rewrite(node.index))
+
+    def rewrite_array_assignment(self, node: ArrayAssignment) -> ASTNode:
+        return ArrayAssignment(self.rewrite(node.obj), self.rewrite(node.index), self.rewrite(node.value))
+
+    def rewrite_function_call(self, node: FunctionCall) -> ASTNode:
+        args = self.rewrite_block(node.args)
+        if node.name in LANGUAGE_BUILTINS and node.name in BUILTINS:
+            return BuiltinCall(node.name, args)
+        # Other builtins give way to a user binding of their name, so the
+        # engines call one only when its name is unbound
+        return ResolvedCall(self.variable(node.name), args)
+
+    def rewrite_if(self, node: IfStatement) -> ASTNode:
+        else_body = self.rewrite_block(node.else_body) if node.else_body else None
+        return IfStatement(self.rewrite(node.condition), self.rewrite_block(node.then_body), else_body)
+
+    def rewrite_while(self, node: WhileLoop) -> ASTNode:
+        return WhileLoop(self.rewrite(node.condition), self.rewrite_block(node.body))
+
+    def rewrite_for(self, node: ForLoop) -> ASTNode:
+        return ResolvedForLoop(self.variable(node.var), self.rewrite(node.iterable), self.rewrite_block(node.body))
+
+    def rewrite_function_def(self, node: FunctionDef) -> ASTNode:
+        target = self.variable(node.name)
+
+        outer = self.scope
+        self.scope = Scope(node.params)
+        self.collect_block(node.body, self.scope)
+        body = self.rewrite_block(node.body)
+        scope = self.scope
+        self.scope = outer
+
+        self.bound_names.update(scope.slots)
+        return ResolvedFunctionDef(node.name, list(node.params), body, scope.size, scope.slots, target)
+
+    def rewrite_return(self, node: ReturnStatement) -> ASTNode:
+        return ReturnStatement(self.rewrite(node.value) if node.value else None)
+
+def resolve(ast: List[ASTNode]) -> Tuple[List[ASTNode], Set[str]]:
+    """Run the resolver pass over a parsed program
+
+    Returns the resolved statements and the names its functions bind as locals.
+    """
+    resolver = Resolver()
+    return resolver.resolve(ast), resolver.bound_names
+
+# Frames at run time
+
+class TailScope:
+    """The locals of callers that finished with a tail call
+
+    The tree-walker merges a tail-calling function's locals into its
+    callee's scope, so the callee, and everything it calls, still sees
+    them. This holds those locals in place of the discarded frame; a
+    chain of tail calls keeps adding to one TailScope rather than growing
+    a chain of them.
+    """
+    __slots__ = ('values', 'link')
+
+    def __init__(self, values: Dict[str, Any], link: Any):
+        self.values = values
+        self.link = link  # The frame below, as a frame's last entry
+
+def frame_padding(params: List[str], frame_size: int, slots: Dict[str, int]) -> List[Any]:
+    """What follows the arguments in a new frame: unset locals, the slot map and the caller"""
+    return [UNSET] * (frame_size - len(params)) + [slots, None]
+
+def tail_scope(frame: List[Any]) -> TailScope:
+    """The link for the callee of a tail call made from `frame`"""
+    link = frame[-1]
+    if link.__class__ is not TailScope:
+        link = TailScope({}, link)
+    # The finished caller's locals override those of earlier tail callers
+    values = link.values
+    for name, slot in frame[-2].items():
+        value = frame[slot]
+        if value is not UNSET:
+            values[name] = value
+    return link
+
+def lookup(link: Any, name: str) -> Any:
+    """`name` in the nearest caller that has it assigned, starting at `link`; UNSET if none"""
+    while link is not None:
+        if link.__class__ is TailScope:
+            value = link.values.get(name, UNSET)
+            link = link.link
+        else:
+            slot = link[-2].get(name)
+            value = UNSET if slot is None else link[slot]
+            link = link[-1]
+        if value is not UNSET:
+            return value
+    return UNSET
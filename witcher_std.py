@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Standard Grimoire
+`grimoire "std"` imports the functions below instead of reading a file.
+They are written in Python, so a single call such as sort(arr) replaces
+a whole interpreted loop like lib/quicksort.witcher. Once imported they
+are called like any other function and work in every engine.
+
+Functions that build a bestiary return a new one and leave their
+argument unchanged; a numeric bestiary stays numeric.
+"""
+
+import bisect
+import math
+from typing import Any, Callable, Dict, List
+
+from witcher_builtins import NativeFunction
+from witcher_numeric import NumericBestiary, check_bestiary, divide, is_number
+
+# Name a grimoire statement uses for this module
+STD_GRIMOIRE = 'std'
+
+# Largest integer pow computes, in bits; integer arithmetic is exact, so
+# a larger result would only exhaust memory
+POW_MAX_BITS = 1 << 20
+
+def check_number(value: Any, function: str) -> Any:
+    if not is_number(value):
+        raise RuntimeError(f"{function} expects a number")
+    return value
+
+def check_text(value: Any, function: str) -> str:
+    if not isinstance(value, str):
+        raise RuntimeError(f"{function} expects text")
+    return value
+
+def like(bestiary: Any, values: Any) -> Any:
+    """Bestiary of the same kind as `bestiary` holding `values`"""
+    if isinstance(bestiary, NumericBestiary):
+        return NumericBestiary(values)
+    return list(values)
+
+# Bestiaries
+
+def std_sort(bestiary: Any) -> Any:
+    """Sorted copy of a bestiary"""
+    check_bestiary(bestiary, 'sort')
+    try:
+        return like(bestiary, sorted(bestiary))
+    except TypeError:
+        raise RuntimeError("sort cannot order numbers and text together")
+
+def std_reverse(bestiary: Any) -> Any:
+    check_bestiary(bestiary, 'reverse')
+    return like(bestiary, reversed(bestiary))
+
+def std_binary_search(bestiary: Any, value: Any) -> int:
+    """Index of value in a sorted bestiary, or -1"""
+    check_bestiary(bestiary, 'binary_search')
+    try:
+        index = bisect.bisect_left(bestiary, value)
+    except TypeError:
+        raise RuntimeError("binary_search cannot compare numbers and text")
+    if index < len(bestiary) and bestiary[index] == value:
+        return index
+    return -1
+
+def std_slice(value: Any, start: Any, end: Any) -> Any:
+    """Elements or characters from start up to, not including, end"""
+    start = int(check_number(start, 'slice'))
+    end = int(check_number(end, 'slice'))
+    if isinstance(value, str):
+        return value[start:end]
+    check_bestiary(value, 'slice')
+    return like(value, value[start:end])
+
+def std_min(bestiary: Any) -> Any:
+    return extreme(bestiary, 'min', min)
+
+def std_max(bestiary: Any) -> Any:
+    return extreme(bestiary, 'max', max)
+
+def extreme(bestiary: Any, function: str, pick: Callable) -> Any:
+    check_bestiary(bestiary, function)
+    if not bestiary:
+        raise RuntimeError(f"{function} of an empty bestiary")
+    try:
+        return pick(bestiary)
+    except TypeError:
+        raise RuntimeError(f"{function} cannot compare numbers and text")
+
+def std_range(start: Any, stop: Any, step: Any = 1, *, budget: Any = None) -> List[Any]:
+    """Numbers from start up to, not including, stop"""
+    for value in (start, stop, step):
+        check_number(value, 'range')
+    if step == 0:
+        raise RuntimeError("range step cannot be zero")
+    count = max(0, math.ceil(divide(stop - start, step)))
+    if budget is not None:
+        budget.check_length(count, False)
+    return [start + i * step for i in range(count)]
+
+# Text
+
+def std_join(bestiary: Any, separator: Any, *, budget: Any = None) -> str:
+    check_bestiary(bestiary, 'join')
+    if budget is not None and bestiary:
+        # The separators alone; the elements already exist
+        budget.check_length(len(check_text(separator, 'join')) * (len(bestiary) - 1), True)
+    return check_text(separator, 'join').join(str(value) for value in bestiary)
+
+def std_split(text: Any, separator: Any) -> List[str]:
+    check_text(text, 'split')
+    if check_text(separator, 'split') == "":
+        return list(text)
+    return text.split(separator)
+
+# Math
+
+def std_abs(x: Any) -> Any:
+    return abs(check_number(x, 'abs'))
+
+def std_sqrt(x: Any) -> float:
+    if check_number(x, 'sqrt') < 0:
+        raise RuntimeError("sqrt of a negative number")
+    return math.sqrt(x)
+
+def std_pow(base: Any, exponent: Any) -> Any:
+    check_number(base, 'pow')
+    check_number(exponent, 'pow')
+    if (base.__class__ is int and exponent.__class__ is int and exponent > 0
+            and abs(base) > 1 and exponent * base.bit_length() > POW_MAX_BITS):
+        raise RuntimeError("pow result is too large")
+    if (base < 0 and isinstance(exponent, float) and math.isfinite(exponent)
+            and not exponent.is_integer()):
+        # Python would return a complex number, which WitcherScript doesn't have
+        raise RuntimeError("pow of a negative number to a fractional power")
+    if base == 0 and exponent < 0:
+        raise RuntimeError("pow of zero to a negative power")
+    try:
+        return base ** exponent
+    except OverflowError:
+        raise RuntimeError("pow result is too large")
+
+def std_floor(x: Any) -> int:
+    return math.floor(check_number(x, 'floor'))
+
+def std_ceil(x: Any) -> int:
+    return math.ceil(check_number(x, 'ceil'))
+
+def std_round(x: Any, digits: Any = 0) -> Any:
+    """x rounded to an integer, or to a float with `digits` decimal places"""
+    digits = int(check_number(digits, 'round'))
+    if digits:
+        return round(check_number(x, 'round'), digits)
+    return round(check_number(x, 'round'))
+
+def std_log(x: Any) -> float:
+    if check_number(x, 'log') <= 0:
+        raise RuntimeError("log of a number that is not positive")
+    return math.log(x)
+
+def std_exp(x: Any) -> float:
+    return math.exp(check_number(x, 'exp'))
+
+def std_sin(x: Any) -> float:
+    return math.sin(check_number(x, 'sin'))
+
+def std_cos(x: Any) -> float:
+    return math.cos(check_number(x, 'cos'))
+
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    'sort': std_sort,
+    'reverse': std_reverse,
+    'binary_search': std_binary_search,
+    'slice': std_slice,
+    'min': std_min,
+    'max': std_max,
+    'range': std_range,
+    'join': std_join,
+    'split': std_split,
+    'abs': std_abs,
+    'sqrt': std_sqrt,
+    'pow': std_pow,
+    'floor': std_floor,
+    'ceil': std_ceil,
+    'round': std_round,
+    'log': std_log,
+    'exp': std_exp,
+    'sin': std_sin,
+    'cos': std_cos,
+}
+
+# Everything `grimoire "std"` adds to the importer's globals
+STD_GLOBALS: Dict[str, Any] = {name: NativeFunction(name, function) for name, function in FUNCTIONS.items()}
+STD_GLOBALS['pi'] = math.pi
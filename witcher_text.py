@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Text Values
+`report = report + line` copies the whole report each time when texts
+are Python strings, so building a text in a loop costs time quadratic in
+its length. Once a text reaches ROPE_MIN characters, `+` makes a Text
+instead: a list of pieces, extended in place, that is joined into one
+string only when something reads it - printing, comparing, indexing,
+hashing or passing it to a builtin. The joined string is kept, so a Text
+is joined at most once.
+
+Texts sharing a piece list never see each other's pieces: each knows how
+many pieces are its own, and one that finds the list already extended
+past its end copies it before appending.
+
+A Text behaves like the string it stands for, down to the TypeErrors of
+operators that don't apply to text, so scripts can't tell the two apart.
+Python functions called from a script receive plain strings.
+"""
+
+from typing import Any, List, Optional
+
+# Shortest left operand of `+` worth turning into a Text; shorter texts
+# are cheaper to copy
+ROPE_MIN = 256
+
+class Text:
+    """A text built by `+`, kept as pieces until it is read"""
+    __slots__ = ('parts', 'count', 'length', 'budget', 'text')
+
+    def __init__(self, parts: List[str], count: int, length: int, budget: Any = None):
+        self.parts = parts  # May be shared with other Texts; only the first `count` are ours
+        self.count = count
+        self.length = length
+        self.budget = budget  # Budget of the run that built it, checked as it grows
+        self.text: Optional[str] = None
+
+    def append(self, piece: str) -> 'Text':
+        """A new Text with `piece` added to the end"""
+        length = self.length + len(piece)
+        if self.budget is not None:
+            self.budget.check_length(length, True)
+        parts = self.parts
+        if len(parts) != self.count:
+            parts = parts[:self.count]
+        parts.append(piece)
+        return Text(parts, self.count + 1, length, self.budget)
+
+    def __str__(self) -> str:
+        if self.text is None:
+            parts = self.parts
+            self.text = ''.join(parts if len(parts) == self.count else parts[:self.count])
+            # Later appends start from the joined string, in a list of our own
+            self.parts = [self.text]
+            self.count = 1
+        return self.text
+
+    # The language's `+`, for operands the engines didn't route to concat
+
+    def __add__(self, other: Any) -> Any:
+        return self.append(other if other.__class__ is str else str(other))
+
+    def __radd__(self, other: Any) -> Any:
+        return concat(other, str(self), self.budget)
+
+    # Everything else reads the joined string
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __bool__(self) -> bool:
+        return self.length > 0
+
+    def __hash__(self) -> int:
+        return hash(str(self))
+
+    def __eq__(self, other: Any) -> bool:
+        return str(self) == plain(other)
+
+    def __ne__(self, other: Any) -> bool:
+        return str(self) != plain(other)
+
+    def __lt__(self, other: Any) -> bool:
+        return str(self) < plain(other)
+
+    def __le__(self, other: Any) -> bool:
+        return str(self) <= plain(other)
+
+    def __gt__(self, other: Any) -> bool:
+        return str(self) > plain(other)
+
+    def __ge__(self, other: Any) -> bool:
+        return str(self) >= plain(other)
+
+    def __getitem__(self, index: Any) -> str:
+        return str(self)[index]
+
+    def __setitem__(self, index: Any, value: Any):
+        str(self)[index] = value  # Raises the same TypeError a string would
+
+    def __iter__(self):
+        return iter(str(self))
+
+    def __contains__(self, item: Any) -> bool:
+        return plain(item) in str(self)
+
+    def __sub__(self, other: Any) -> Any:
+        return str(self) - other
+
+    def __rsub__(self, other: Any) -> Any:
+        return other - str(self)
+
+    def __mul__(self, other: Any) -> Any:
+        return str(self) * other
+
+    def __rmul__(self, other: Any) -> Any:
+        return other * str(self)
+
+    def __truediv__(self, other: Any) -> Any:
+        return str(self) / other
+
+    def __rtruediv__(self, other: Any) -> Any:
+        return other / str(self)
+
+    def __mod__(self, other: Any) -> Any:
+        return str(self) % other
+
+    def __rmod__(self, other: Any) -> Any:
+        return other % str(self)
+
+    def __neg__(self) -> Any:
+        return -str(self)
+
+# Values that are text to a script
+TEXT_TYPES = (str, Text)
+
+def concat(left: Any, right: Any, budget: Any = None) -> Any:
+    """The language's `left + right` when either operand is text
+
+    Both operands convert to text. A long enough left operand is extended
+    as a Text rather than copied. `budget`, if any, limits the length.
+    Engines join a short plain-string left operand themselves and call
+    this for everything else.
+    """
+    if left.__class__ is Text:
+        return left.append(right if right.__class__ is str else str(right))
+    if left.__class__ is not str:
+        left = str(left)
+    if right.__class__ is not str:
+        right = str(right)
+    if len(left) < ROPE_MIN:
+        text = left + right
+        if budget is not None:
+            budget.check_length(len(text), True)
+        return text
+    length = len(left) + len(right)
+    if budget is not None:
+        budget.check_length(length, True)
+    return Text([left, right], 2, length, budget)
+
+def plain(value: Any) -> Any:
+    """`value`, with a Text replaced by its string"""
+    return str(value) if value.__class__ is Text else value
+
+def type_name(value: Any) -> str:
+    """Name of a value's type in error messages; a Text is a str"""
+    return type(plain(value)).__name__
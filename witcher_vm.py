@@ -0,0 +1,786 @@
+#!/usr/bin/env python3
+"""
+WitcherScript Bytecode VM
+Lowers the resolved AST to flat bytecode and runs it on a stack-based
+virtual machine. Locals live in a per-call frame array indexed by the
+slots assigned in witcher_resolver and ending with the entries that link
+it to its caller's.
+"""
+
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from witcher_interpreter import (
+    ASTNode, Number, String, Boolean, BinaryOp, UnaryOp, ArrayAssignment,
+    IfStatement, WhileLoop, ReturnStatement, Array, IndexAccess, Grimoire,
+    TokenType, Interpreter, ReturnValue,
+)
+from witcher_builtins import BUILTINS, NativeFunction
+from witcher_numeric import BESTIARY_TYPES, divide, float_index, from_literal
+from witcher_resolver import (
+    LocalVariable, FreeVariable, GlobalVariable, LocalStore, GlobalStore, BuiltinCall,
+    ResolvedCall, ResolvedForLoop, ResolvedFunctionDef, UNSET,
+    frame_padding, lookup, resolve, tail_scope,
+)
+from witcher_text import ROPE_MIN, concat, type_name
+
+class Opcode(IntEnum):
+    # Stack and variables
+    LOAD_CONST = 0
+    LOAD_GLOBAL = 1
+    STORE_GLOBAL = 2
+    POP = 3
+    DUP = 4
+    LOAD_FAST = 5
+    STORE_FAST = 6
+    LOAD_FREE = 7
+
+    # Operators
+    BINARY_ADD = 10
+    BINARY_SUB = 11
+    BINARY_MUL = 12
+    BINARY_DIV = 13
+    BINARY_MOD = 14
+    COMPARE_EQ = 15
+    COMPARE_NE = 16
+    COMPARE_LT = 17
+    COMPARE_GT = 18
+    COMPARE_LE = 19
+    COMPARE_GE = 20
+    LOGICAL_AND = 21
+    LOGICAL_OR = 22
+    UNARY_NEG = 23
+    UNARY_NOT = 24
+
+    # Bestiaries
+    BUILD_LIST = 30
+    INDEX = 31
+    STORE_INDEX = 32
+
+    # Control flow
+    JUMP = 40
+    JUMP_IF_FALSE = 41
+    GET_ITER = 42
+    FOR_ITER = 43
+
+    # Functions and modules
+    LOAD_FUNCTION = 50
+    LOAD_BUILTIN = 51
+    CALL = 52
+    RETURN = 53
+    MAKE_FUNCTION = 54
+    IMPORT = 55
+    HALT = 56
+    CHECK_FUNCTION = 57
+    TAIL_CALL = 58
+
+BINARY_OPCODES = {
+    TokenType.PLUS: Opcode.BINARY_ADD,
+    TokenType.MINUS: Opcode.BINARY_SUB,
+    TokenType.STAR: Opcode.BINARY_MUL,
+    TokenType.SLASH: Opcode.BINARY_DIV,
+    TokenType.PERCENT: Opcode.BINARY_MOD,
+    TokenType.EQEQ: Opcode.COMPARE_EQ,
+    TokenType.NEQ: Opcode.COMPARE_NE,
+    TokenType.LT: Opcode.COMPARE_LT,
+    TokenType.GT: Opcode.COMPARE_GT,
+    TokenType.LTEQ: Opcode.COMPARE_LE,
+    TokenType.GTEQ: Opcode.COMPARE_GE,
+    TokenType.AND: Opcode.LOGICAL_AND,
+    TokenType.OR: Opcode.LOGICAL_OR,
+}
+
+UNARY_OPCODES = {
+    TokenType.MINUS: Opcode.UNARY_NEG,
+    TokenType.NOT: Opcode.UNARY_NOT,
+}
+
+class CodeObject:
+    """Flat bytecode for a function body or top-level program.
+
+    `code` alternates opcode and operand; operands index into `consts`,
+    `names`, the frame (`varnames` gives each slot's name) or the code
+    itself (jump targets). A program's `bound_names` are the names its
+    functions bind as locals (see witcher_resolver).
+    """
+    __slots__ = ('name', 'code', 'consts', 'names', 'varnames', 'bound_names')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.code: List[int] = []
+        self.consts: List[Any] = []
+        self.names: List[str] = []
+        self.varnames: List[str] = []
+        self.bound_names: Set[str] = set()
+
+class VMFunction:
+    """A user function compiled to its own code object"""
+    __slots__ = ('name', 'params', 'code', 'padding')
+
+    def __init__(self, name: str, params: List[str], code: CodeObject, frame_size: int,
+                 slots: Dict[str, int]):
+        self.name = name
+        self.params = params
+        self.code = code
+        # Appended to the arguments to make a fresh frame
+        self.padding = frame_padding(params, frame_size, slots)
+
+class BytecodeCompiler:
+    """Lowers AST nodes into CodeObjects"""
+
+    def __init__(self):
+        self.code_object: Optional[CodeObject] = None
+        self.const_index: Dict[tuple, int] = {}
+        self.name_index: Dict[str, int] = {}
+        self.in_function = False  # `hunt f(...)` only becomes TAIL_CALL inside a function
+        self.compilers: Dict[type, Callable[[Any, bool], None]] = {
+            Number: self.compile_literal,
+            String: self.compile_literal,
+            Boolean: self.compile_literal,
+            LocalVariable: self.compile_local,
+            FreeVariable: self.compile_free,
+            GlobalVariable: self.compile_global,
+            Array: self.compile_array,
+            BinaryOp: self.compile_binary_op,
+            UnaryOp: self.compile_unary_op,
+            LocalStore: self.compile_store,
+            GlobalStore: self.compile_store,
+            ArrayAssignment: self.compile_array_assignment,
+            BuiltinCall: self.compile_builtin_call,
+            ResolvedCall: self.compile_user_call,
+            IndexAccess: self.compile_index_access,
+            IfStatement: self.compile_if,
+            WhileLoop: self.compile_while,
+            ResolvedForLoop: self.compile_for,
+            ResolvedFunctionDef: self.compile_function_def,
+            ReturnStatement: self.compile_return,
+            Grimoire: self.compile_grimoire,
+        }
+
+    def compile_program(self, ast: List[ASTNode], name: str = '<program>') -> CodeObject:
+        code_object = self.enter(name)
+        statements, code_object.bound_names = resolve(ast)
+        for stmt in statements:
+            self.compile_node(stmt, False)
+        self.emit(Opcode.HALT)
+        self.code_object = None
+        return code_object
+
+    def compile_function(self, node: ResolvedFunctionDef) -> CodeObject:
+        outer = (self.code_object, self.const_index, self.name_index, self.in_function)
+        code_object = self.enter(node.name)
+        code_object.varnames = list(node.params) + [''] * (node.frame_size - len(node.params))
+        self.in_function = True
+        for stmt in node.body:
+            self.compile_node(stmt, False)
+        self.emit(Opcode.LOAD_CONST, self.const(None))
+        self.emit(Opcode.RETURN)
+        self.code_object, self.const_index, self.name_index, self.in_function = outer
+        return code_object
+
+    def enter(self, name: str) -> CodeObject:
+        self.code_object = CodeObject(name)
+        self.const_index = {}
+        self.name_index = {}
+        return self.code_object
+
+    # Emission helpers
+
+    def emit(self, opcode: Opcode, operand: int = 0) -> int:
+        """Append an instruction and return its position"""
+        code = self.code_object.code
+        code.append(int(opcode))
+        code.append(operand)
+        return len(code) - 2
+
+    def label(self) -> int:
+        return len(self.code_object.code)
+
+    def patch(self, position: int, target: int):
+        self.code_object.code[position + 1] = target
+
+    def const(self, value: Any) -> int:
+        # Key on the type too, so 1.0, 1 and truth stay distinct
+        key = (type(value), value)
+        if key not in self.const_index:
+            self.const_index[key] = len(self.code_object.consts)
+            self.code_object.consts.append(value)
+        return self.const_index[key]
+
+    def name(self, name: str) -> int:
+        if name not in self.name_index:
+            self.name_index[name] = len(self.code_object.names)
+            self.code_object.names.append(name)
+        return self.name_index[name]
+
+    # Nodes
+
+    def compile_node(self, node: ASTNode, keep: bool):
+        """Compile `node`; when `keep` is set its value is left on the stack"""
+        self.compilers[type(node)](node, keep)
+
+    def compile_literal(self, node: ASTNode, keep: bool):
+        if keep:
+            self.emit(Opcode.LOAD_CONST, self.const(node.value))
+
+    def compile_local(self, node: LocalVariable, keep: bool):
+        self.code_object.varnames[node.slot] = node.name
+        self.emit(Opcode.LOAD_FAST, node.slot)
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_global(self, node: GlobalVariable, keep: bool):
+        self.emit(Opcode.LOAD_GLOBAL, self.name(node.name))
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_free(self, node: FreeVariable, keep: bool):
+        self.emit(Opcode.LOAD_FREE, self.name(node.name))
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_binding(self, target: ASTNode):
+        """Store the top of the stack into a resolved variable"""
+        if isinstance(target, (LocalVariable, LocalStore)):
+            self.code_object.varnames[target.slot] = target.name
+            self.emit(Opcode.STORE_FAST, target.slot)
+        else:
+            self.emit(Opcode.STORE_GLOBAL, self.name(target.name))
+
+    def compile_array(self, node: Array, keep: bool):
+        for elem in node.elements:
+            self.compile_node(elem, True)
+        self.emit(Opcode.BUILD_LIST, len(node.elements))
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_binary_op(self, node: BinaryOp, keep: bool):
+        self.compile_node(node.left, True)
+        self.compile_node(node.right, True)
+        self.emit(BINARY_OPCODES[node.op])
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_unary_op(self, node: UnaryOp, keep: bool):
+        self.compile_node(node.operand, True)
+        self.emit(UNARY_OPCODES[node.op])
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_store(self, node: ASTNode, keep: bool):
+        self.compile_node(node.value, True)
+        if keep:
+            self.emit(Opcode.DUP)
+        self.compile_binding(node)
+
+    def compile_array_assignment(self, node: ArrayAssignment, keep: bool):
+        self.compile_node(node.obj, True)
+        self.compile_node(node.index, True)
+        self.compile_node(node.value, True)
+        self.emit(Opcode.STORE_INDEX)
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_index_access(self, node: IndexAccess, keep: bool):
+        self.compile_node(node.obj, True)
+        self.compile_node(node.index, True)
+        self.emit(Opcode.INDEX)
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_builtin_call(self, node: BuiltinCall, keep: bool):
+        # Builtins only evaluate the arguments they read
+        read = BUILTINS[node.name].arity
+        args = node.args if read is None else node.args[:read]
+        self.emit(Opcode.LOAD_BUILTIN, self.name(node.name))
+        self.compile_call(args, keep)
+
+    def compile_user_call(self, node: ResolvedCall, keep: bool):
+        self.compile_callee(node)
+        self.compile_call(node.args, keep)
+
+    def compile_callee(self, node: ResolvedCall):
+        # LOAD_FUNCTION falls back to a builtin of the name, so a call to a
+        # builtin's name loads it that way even when it is a local
+        if not isinstance(node.function, LocalVariable) or node.name in BUILTINS:
+            self.emit(Opcode.LOAD_FUNCTION, self.name(node.name))
+        else:
+            self.compile_local(node.function, True)
+            self.emit(Opcode.CHECK_FUNCTION, self.name(node.name))
+
+    def compile_call(self, args: List[ASTNode], keep: bool):
+        for arg in args:
+            self.compile_node(arg, True)
+        self.emit(Opcode.CALL, len(args))
+        if not keep:
+            self.emit(Opcode.POP)
+
+    def compile_if(self, node: IfStatement, keep: bool):
+        self.compile_node(node.condition, True)
+        jump_to_else = self.emit(Opcode.JUMP_IF_FALSE)
+        for stmt in node.then_body:
+            self.compile_node(stmt, False)
+
+        if node.else_body:
+            jump_to_end = self.emit(Opcode.JUMP)
+            self.patch(jump_to_else, self.label())
+            for stmt in node.else_body:
+                self.compile_node(stmt, False)
+            self.patch(jump_to_end, self.label())
+        else:
+            self.patch(jump_to_else, self.label())
+        self.compile_no_value(keep)
+
+    def compile_while(self, node: WhileLoop, keep: bool):
+        start = self.label()
+        self.compile_node(node.condition, True)
+        jump_to_end = self.emit(Opcode.JUMP_IF_FALSE)
+        for stmt in node.body:
+            self.compile_node(stmt, False)
+        self.emit(Opcode.JUMP, start)
+        self.patch(jump_to_end, self.label())
+        self.compile_no_value(keep)
+
+    def compile_for(self, node: ResolvedForLoop, keep: bool):
+        self.compile_node(node.iterable, True)
+        self.emit(Opcode.GET_ITER)
+        start = self.label()
+        jump_to_end = self.emit(Opcode.FOR_ITER)
+        self.compile_binding(node.var)
+        for stmt in node.body:
+            self.compile_node(stmt, False)
+        self.emit(Opcode.JUMP, start)
+        self.patch(jump_to_end, self.label())
+        self.compile_no_value(keep)
+
+    def compile_function_def(self, node: ResolvedFunctionDef, keep: bool):
+        function = VMFunction(node.name, node.params, self.compile_function(node), node.frame_size,
+                              node.slots)
+        self.emit(Opcode.MAKE_FUNCTION, self.const(function))
+        if keep:
+            self.emit(Opcode.DUP)
+        self.compile_binding(node.target)
+
+    def compile_return(self, node: ReturnStatement, keep: bool):
+        if self.in_function and isinstance(node.value, ResolvedCall):
+            # `hunt f(...)` replaces the current frame instead of stacking one
+            self.compile_callee(node.value)
+            for arg in node.value.args:
+                self.compile_node(arg, True)
+            self.emit(Opcode.TAIL_CALL, len(node.value.args))
+            return
+        if node.value:
+            self.compile_node(node.value, True)
+        else:
+            self.emit(Opcode.LOAD_CONST, self.const(None))
+        self.emit(Opcode.RETURN)
+
+    def compile_grimoire(self, node: Grimoire, keep: bool):
+        self.emit(Opcode.IMPORT, self.const(node.path))
+        self.compile_no_value(keep)
+
+    def compile_no_value(self, keep: bool):
+        # Statements evaluate to nothing
+        if keep:
+            self.emit(Opcode.LOAD_CONST, self.const(None))
+
+def disassemble(code_object: CodeObject) -> str:
+    """Render a code object as readable text, one instruction per line"""
+    lines = [f"<code {code_object.name}>"]
+    code = code_object.code
+    for pc in range(0, len(code), 2):
+        opcode = Opcode(code[pc])
+        operand = code[pc + 1]
+        detail = ''
+        if opcode in (Opcode.LOAD_CONST, Opcode.MAKE_FUNCTION, Opcode.IMPORT):
+            detail = f" ({code_object.consts[operand]!r})"
+        elif opcode in (Opcode.LOAD_GLOBAL, Opcode.LOAD_FREE, Opcode.STORE_GLOBAL,
+                        Opcode.LOAD_FUNCTION, Opcode.LOAD_BUILTIN, Opcode.CHECK_FUNCTION):
+            detail = f" ({code_object.names[operand]})"
+        elif opcode in (Opcode.LOAD_FAST, Opcode.STORE_FAST):
+            detail = f" ({code_object.varnames[operand]})"
+        lines.append(f"{pc:6d} {opcode.name:<16} {operand}{detail}")
+    return '\n'.join(lines)
+
+class VirtualMachine(Interpreter):
+    """Interpreter that runs bytecode with an explicit value stack and call frames"""
+
+    def __init__(self):
+        super().__init__()
+        # Names a function of any program run here binds as a local
+        self.bound_names: Set[str] = set()
+        self.compiler = BytecodeCompiler()
+
+    def interpret(self, ast: List[ASTNode]):
+        self.execute(self.compiler.compile_program(ast))
+
+    def evaluate(self, node: ASTNode) -> Any:
+        # Streamed statements arrive one at a time through here
+        self.execute(self.compiler.compile_program([node], '<grimoire>'))
+
+    def adopt(self, module: Interpreter):
+        # The grimoire's functions can now be on this machine's call stack
+        self.bound_names.update(module.bound_names)
+        super().adopt(module)
+
+    def execute(self, code_object: CodeObject):
+        LOAD_CONST = int(Opcode.LOAD_CONST)
+        LOAD_FAST = int(Opcode.LOAD_FAST)
+        STORE_FAST = int(Opcode.STORE_FAST)
+        LOAD_GLOBAL = int(Opcode.LOAD_GLOBAL)
+        STORE_GLOBAL = int(Opcode.STORE_GLOBAL)
+        LOAD_FREE = int(Opcode.LOAD_FREE)
+        POP = int(Opcode.POP)
+        DUP = int(Opcode.DUP)
+        BINARY_ADD = int(Opcode.BINARY_ADD)
+        BINARY_SUB = int(Opcode.BINARY_SUB)
+        BINARY_MUL = int(Opcode.BINARY_MUL)
+        BINARY_DIV = int(Opcode.BINARY_DIV)
+        BINARY_MOD = int(Opcode.BINARY_MOD)
+        COMPARE_EQ = int(Opcode.COMPARE_EQ)
+        COMPARE_NE = int(Opcode.COMPARE_NE)
+        COMPARE_LT = int(Opcode.COMPARE_LT)
+        COMPARE_GT = int(Opcode.COMPARE_GT)
+        COMPARE_LE = int(Opcode.COMPARE_LE)
+        COMPARE_GE = int(Opcode.COMPARE_GE)
+        LOGICAL_AND = int(Opcode.LOGICAL_AND)
+        LOGICAL_OR = int(Opcode.LOGICAL_OR)
+        UNARY_NEG = int(Opcode.UNARY_NEG)
+        UNARY_NOT = int(Opcode.UNARY_NOT)
+        BUILD_LIST = int(Opcode.BUILD_LIST)
+        INDEX = int(Opcode.INDEX)
+        STORE_INDEX = int(Opcode.STORE_INDEX)
+        JUMP = int(Opcode.JUMP)
+        JUMP_IF_FALSE = int(Opcode.JUMP_IF_FALSE)
+        GET_ITER = int(Opcode.GET_ITER)
+        FOR_ITER = int(Opcode.FOR_ITER)
+        LOAD_FUNCTION = int(Opcode.LOAD_FUNCTION)
+        LOAD_BUILTIN = int(Opcode.LOAD_BUILTIN)
+        CALL = int(Opcode.CALL)
+        RETURN = int(Opcode.RETURN)
+        MAKE_FUNCTION = int(Opcode.MAKE_FUNCTION)
+        IMPORT = int(Opcode.IMPORT)
+        HALT = int(Opcode.HALT)
+        CHECK_FUNCTION = int(Opcode.CHECK_FUNCTION)
+        TAIL_CALL = int(Opcode.TAIL_CALL)
+
+        globals_ = self.globals
+        bound_names = self.bound_names
+        bound_names.update(code_object.bound_names)
+        error = self.error
+        typed_bestiaries = self.typed_bestiaries
+        budget = self.budget
+
+        # Saved (code object, frame, pc, stack) of every suspended caller
+        frames = []
+        code = code_object.code
+        consts = code_object.consts
+        names = code_object.names
+        fast = None  # The top level has no locals
+        pc = 0
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == LOAD_FAST:
+                value = fast[arg]
+                if value is UNSET:
+                    # Not assigned yet in this call: read it from the callers or the globals
+                    name = code_object.varnames[arg]
+                    value = lookup(fast[-1], name)
+                    if value is UNSET:
+                        if name not in globals_:
+                            error(f"Undefined variable: {name}")
+                        value = globals_[name]
+                push(value)
+
+            elif op == LOAD_CONST:
+                push(consts[arg])
+
+            elif op == STORE_FAST:
+                fast[arg] = pop()
+
+            elif op == LOAD_GLOBAL:
+                name = names[arg]
+                if name in globals_:
+                    push(globals_[name])
+                else:
+                    error(f"Undefined variable: {name}")
+
+            elif op == LOAD_FREE:
+                name = names[arg]
+                if name in bound_names:
+                    value = lookup(fast[-1], name)
+                    if value is not UNSET:
+                        push(value)
+                        continue
+                if name in globals_:
+                    push(globals_[name])
+                else:
+                    error(f"Undefined variable: {name}")
+
+            elif op == STORE_GLOBAL:
+                globals_[names[arg]] = pop()
+
+            elif op == JUMP_IF_FALSE:
+                if not pop():
+                    pc = arg
+
+            elif op == JUMP:
+                if budget is not None and arg < pc:
+                    # A loop going round again
+                    budget.steps += 1
+                    if budget.steps >= budget.checkpoint:
+                        budget.check()
+                pc = arg
+
+            elif op == BINARY_ADD:
+                right = pop()
+                left = stack[-1]
+                # Allow string concatenation with type conversion
+                if isinstance(left, str) or isinstance(right, str):
+                    if left.__class__ is str and len(left) < ROPE_MIN and budget is None:
+                        stack[-1] = left + str(right)
+                    else:
+                        stack[-1] = concat(left, right, budget)
+                else:
+                    if budget is not None:
+                        budget.check_join(left, right)
+                    stack[-1] = left + right
+
+            elif op == BINARY_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+
+            elif op == COMPARE_LT:
+                right = pop()
+                stack[-1] = stack[-1] < right
+
+            elif op == COMPARE_LE:
+                right = pop()
+                stack[-1] = stack[-1] <= right
+
+            elif op == COMPARE_GT:
+                right = pop()
+                stack[-1] = stack[-1] > right
+
+            elif op == COMPARE_GE:
+                right = pop()
+                stack[-1] = stack[-1] >= right
+
+            elif op == COMPARE_EQ:
+                right = pop()
+                stack[-1] = stack[-1] == right
+
+            elif op == COMPARE_NE:
+                right = pop()
+                stack[-1] = stack[-1] != right
+
+            elif op == INDEX:
+                index = pop()
+                obj = stack[-1]
+                try:
+                    stack[-1] = obj[index]
+                except (IndexError, KeyError, TypeError):
+                    try:
+                        stack[-1] = float_index(obj, index)
+                    except (IndexError, KeyError, TypeError):
+                        error("Invalid index access")
+
+            elif op == STORE_INDEX:
+                value = pop()
+                index = pop()
+                obj = stack[-1]
+                if isinstance(obj, BESTIARY_TYPES):
+                    try:
+                        obj[index] = value
+                    except TypeError:
+                        if not isinstance(index, float):
+                            raise
+                        obj[int(index)] = value
+                else:
+                    error(f"Cannot index {type_name(obj)}")
+                stack[-1] = value
+
+            elif op == LOAD_FUNCTION:
+                name = names[arg]
+                # Inside a function, a local of that name, its own or a caller's, comes first
+                if fast is not None and name in bound_names:
+                    function = lookup(fast, name)
+                else:
+                    function = UNSET
+                if function is UNSET:
+                    if name in globals_:
+                        function = globals_[name]
+                    elif name in BUILTINS:
+                        # Unbound, so the builtin of that name
+                        function = BUILTINS[name].function
+                    else:
+                        error(f"Undefined variable: {name}")
+                if function.__class__ is not VMFunction and function.__class__ is not NativeFunction:
+                    error(f"'{name}' is not a function")
+                push(function)
+
+            elif op == CHECK_FUNCTION:
+                if stack[-1].__class__ is not VMFunction and stack[-1].__class__ is not NativeFunction:
+                    error(f"'{names[arg]}' is not a function")
+
+            elif op == LOAD_BUILTIN:
+                push(BUILTINS[names[arg]].function)
+
+            elif op == CALL:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+                function = pop()
+
+                if function.__class__ is VMFunction:
+                    params = function.params
+                    if len(params) != arg:
+                        error(f"Function '{function.name}' expects {len(params)} arguments, got {arg}")
+                    if budget is not None:
+                        budget.enter(len(frames) + 1)
+
+                    frames.append((code_object, fast, pc, stack))
+                    # Arguments fill the first slots of the new frame
+                    caller = fast
+                    fast = args + function.padding
+                    fast[-1] = caller
+                    code_object = function.code
+                    code = code_object.code
+                    consts = code_object.consts
+                    names = code_object.names
+                    pc = 0
+                    stack = []
+                    push = stack.append
+                    pop = stack.pop
+                else:
+                    push(function(self, args))
+
+            elif op == TAIL_CALL:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+                function = pop()
+                if function.__class__ is NativeFunction:
+                    # Nothing to hand the frame to: return the result right away
+                    value = function(self, args)
+                    code_object, fast, pc, stack = frames.pop()
+                    code = code_object.code
+                    consts = code_object.consts
+                    names = code_object.names
+                    push = stack.append
+                    pop = stack.pop
+                    push(value)
+                    continue
+
+                params = function.params
+                if len(params) != arg:
+                    error(f"Function '{function.name}' expects {len(params)} arguments, got {arg}")
+                if budget is not None:
+                    budget.enter(len(frames))
+
+                # The caller is done, so the callee takes over its frame
+                link = tail_scope(fast)
+                fast = args + function.padding
+                fast[-1] = link
+                code_object = function.code
+                code = code_object.code
+                consts = code_object.consts
+                names = code_object.names
+                pc = 0
+                stack = []
+                push = stack.append
+                pop = stack.pop
+
+            elif op == RETURN:
+                value = pop()
+                if not frames:
+                    # `hunt` outside a function behaves as in the tree-walker
+                    raise ReturnValue(value)
+                code_object, fast, pc, stack = frames.pop()
+                code = code_object.code
+                consts = code_object.consts
+                names = code_object.names
+                push = stack.append
+                pop = stack.pop
+                push(value)
+
+            elif op == POP:
+                pop()
+
+            elif op == DUP:
+                push(stack[-1])
+
+            elif op == BINARY_MUL:
+                right = pop()
+                if budget is not None:
+                    budget.check_repeat(stack[-1], right)
+                stack[-1] = stack[-1] * right
+
+            elif op == BINARY_DIV:
+                right = pop()
+                if right == 0:
+                    error("Division by zero!")
+                stack[-1] = divide(stack[-1], right)
+
+            elif op == BINARY_MOD:
+                right = pop()
+                stack[-1] = stack[-1] % right
+
+            elif op == LOGICAL_AND:
+                right = pop()
+                stack[-1] = stack[-1] and right
+
+            elif op == LOGICAL_OR:
+                right = pop()
+                stack[-1] = stack[-1] or right
+
+            elif op == UNARY_NEG:
+                stack[-1] = -stack[-1]
+
+            elif op == UNARY_NOT:
+                stack[-1] = not stack[-1]
+
+            elif op == BUILD_LIST:
+                if arg:
+                    elements = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    elements = []
+                push(from_literal(elements) if typed_bestiaries else elements)
+
+            elif op == GET_ITER:
+                iterable = stack[-1]
+                if not isinstance(iterable, BESTIARY_TYPES):
+                    error(f"Cannot iterate over {type_name(iterable)}")
+                stack[-1] = iter(iterable)
+
+            elif op == FOR_ITER:
+                for item in stack[-1]:
+                    push(item)
+                    break
+                else:
+                    pop()
+                    pc = arg
+
+            elif op == MAKE_FUNCTION:
+                push(consts[arg])
+
+            elif op == IMPORT:
+                self.import_grimoire(consts[arg])
+
+            elif op == HALT:
+                return
+
+            else:
+                error(f"Unknown opcode: {op}")